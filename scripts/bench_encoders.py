@@ -0,0 +1,58 @@
+# scripts/bench_encoders.py
+"""
+Trigger payload encoding cost and size: stdlib json.dumps vs the
+mqtt.encoders JSON (orjson when installed) and binary encoders.
+
+    python scripts/bench_encoders.py [--context 2] [--tags 4] [--events 50000]
+"""
+import argparse
+import json
+import time
+
+from mqtt.encoders import BinaryEncoder, JsonEncoder, TriggerLayout, orjson
+from app_logging import log_info
+
+
+def _per_event(fn, events):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(events):
+        fn()
+    return (time.perf_counter() - t0) / events * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--context", type=int, default=2, help="include-regs per trigger")
+    ap.add_argument("--tags", type=int, default=4, help="float tags per trigger")
+    ap.add_argument("--events", type=int, default=50000)
+    args = ap.parse_args()
+
+    context = {str(200 + i): 1000 + i for i in range(args.context)}
+    tags = {f"t{i}": i * 1.25 for i in range(args.tags)}
+    payload = {"ts": "2025-01-01T00:00:00.000000+00:00", "src": "10.0.0.71", "dst": "10.0.0.1",
+               "fc": 3, "reg": 100, "value": 3, "context": context, "unit": 1}
+    if tags:
+        payload["tags"] = tags
+    binary_payload = dict(payload, ts=1735689600000000000)
+    fast = JsonEncoder()
+    binary = BinaryEncoder([TriggerLayout(context, [(name, 1) for name in tags])])
+
+    rows = [
+        ("stdlib json.dumps", lambda: json.dumps(payload), json.dumps(payload).encode()),
+        (f"JsonEncoder ({'orjson' if orjson else 'stdlib'})", lambda: fast.encode(payload),
+         fast.encode(payload)),
+        ("BinaryEncoder", lambda: binary.encode(binary_payload), binary.encode(binary_payload)),
+    ]
+    log_info(f"trigger payload: {args.context} context registers, {args.tags} tags")
+    base = None
+    for name, fn, data in rows:
+        us = _per_event(fn, args.events)
+        base = base or (us, len(data))
+        log_info(f"{name:22s}: {us:6.2f} us/event ({base[0] / us:4.1f}x)  "
+                 f"{len(data):4d} bytes ({len(data) / base[1]:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+# scripts/bench_parallel_replay.py
+"""
+Wall-clock time of a sharded native replay vs a single process.
+
+    python scripts/bench_parallel_replay.py [--pcap big.pcap] [--workers 1 2 4 8]
+
+Without --pcap a synthetic capture of FC3 polls is written to a temp file
+(--polls request/response pairs).
+"""
+import argparse
+import os
+import struct
+import tempfile
+import time
+
+from capture.native_packet import LINKTYPE_ETHERNET
+from capture.parallel_replay import ParallelPcapSource
+from capture.pcap_native import NativePcapPacketSource
+from modbus.frame import frame_values
+from app_logging import log_info
+
+
+def _write_polls(path, polls):
+    master, slave = bytes((10, 0, 0, 1)), bytes((10, 0, 0, 71))
+    seq = {40000: 1, 502: 1}
+    ts = 1_700_000_000_000_000
+
+    with open(path, "wb") as fh:
+        fh.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for i in range(polls):
+            tid = i & 0xFFFF
+            for src, dst, sport, dport, pdu in (
+                (master, slave, 40000, 502, [0x03, 0x00, 0x64, 0x00, 0x0A]),
+                (slave, master, 502, 40000, [0x03, 0x14] + [0, i & 0xFF] * 10),
+            ):
+                adu = struct.pack(">HHHB", tid, 0, len(pdu) + 1, 1) + bytes(pdu)
+                tcp = struct.pack(">HHIIBBHHH", sport, dport, seq[sport], 0, 5 << 4, 0x18, 8192, 0, 0)
+                ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 40 + len(adu), 0, 0x4000, 64, 6, 0, src, dst)
+                frame = b"\x00" * 12 + b"\x08\x00" + ip + tcp + adu
+                seq[sport] += len(adu)
+                ts += 1000
+                sec, usec = divmod(ts, 1_000_000)
+                fh.write(struct.pack("<IIII", sec, usec, len(frame), len(frame)) + frame)
+
+
+def _time(make_frames):
+    """Drain frames, decoding values the way the watch loop does."""
+    t0 = time.perf_counter()
+    n = 0
+    for frame in make_frames():
+        frame_values(frame)
+        n += 1
+    return n, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--pcap")
+    ap.add_argument("--polls", type=int, default=200_000)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pcap
+        if not path:
+            path = os.path.join(tmp, "polls.pcap")
+            _write_polls(path, args.polls)
+        log_info(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+
+        n, base = _time(lambda: NativePcapPacketSource(path).frames())
+        log_info(f"  serial: {n} frames in {base:.2f}s")
+        for workers in sorted(set(args.workers)):
+            if workers <= 1:
+                continue
+            n, dt = _time(lambda: ParallelPcapSource(path, workers).frames())
+            log_info(f"{workers:>2} procs: {n} frames in {dt:.2f}s -> {base / dt:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
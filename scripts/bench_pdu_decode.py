@@ -0,0 +1,113 @@
+# scripts/bench_pdu_decode.py
+"""
+Per-frame allocation and time: legacy hex-string PDU decoding vs the
+bytes/memoryview path in modbus.pdu, and dict vs packed coil handling.
+
+    python scripts/bench_pdu_decode.py [--frames 2000]
+
+"legacy" reproduces the old get_modbus_pdu_bytes (str.split(":") + int(x, 16)
+per byte) and per-register Python shifts.
+"""
+import argparse
+import struct
+import time
+import tracemalloc
+import types
+
+from modbus.bitmap import CoilState
+from modbus.coils import parse_fc15
+from modbus.pdu import decode_registers, payload_bytes, pdu_from_adu
+from app_logging import log_info
+
+
+def _adu(pdu):
+    return struct.pack(">HHHB", 1, 0, len(pdu) + 1, 1) + bytes(pdu)
+
+
+FC3_PDU = bytes([0x03, 250]) + bytes(range(250))                    # 125 registers
+FC15_PDU = bytes([0x0F, 0x01, 0xF4, 0x07, 0xD0, 250]) + b"\xa5" * 250  # 2000 coils
+
+
+def _legacy_pdu(raw):
+    b = [int(x, 16) for x in str(raw).split(":")]
+    return b[7:]
+
+
+def _legacy_fc3(raw):
+    pdu = _legacy_pdu(raw)
+    n = pdu[1] // 2
+    return [(pdu[2 + 2 * i] << 8) | pdu[3 + 2 * i] for i in range(n)]
+
+
+def _new_fc3(raw):
+    return decode_registers(pdu_from_adu(payload_bytes(raw)), 2)
+
+
+def _legacy_fc15(pkt):
+    pdu = _legacy_pdu(pkt.tcp.payload)
+    addr, qty = (pdu[1] << 8) | pdu[2], (pdu[3] << 8) | pdu[4]
+    bits = []
+    for b in pdu[6:]:
+        for i in range(8):
+            bits.append((b >> i) & 1)
+    bits = bits[:qty]
+    return {addr + i: bits[i] for i in range(len(bits))}
+
+
+def _legacy_deltas(coils, state):
+    changed = {a: b for a, b in coils.items() if state.get(a) != b}
+    state.update(coils)
+    return changed
+
+
+def _measure(name, fn, arg, frames):
+    """Log us/frame and the peak bytes allocated while decoding one frame."""
+    fn(arg)  # warm up
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        fn(arg)
+    dt = time.perf_counter() - t0
+
+    tracemalloc.start()
+    fn(arg)
+    _cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    log_info(f"{name:>22}: {dt / frames * 1e6:8.2f} us/frame, peak {peak:6d} bytes/frame")
+    return peak
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--frames", type=int, default=2000)
+    args = ap.parse_args()
+
+    hex_fc3 = _adu(FC3_PDU).hex(":")
+    hex_fc15 = types.SimpleNamespace(tcp=types.SimpleNamespace(payload=_adu(FC15_PDU).hex(":")))
+    raw_fc15 = types.SimpleNamespace(tcp=types.SimpleNamespace(payload=_adu(FC15_PDU)))
+    m = types.SimpleNamespace()
+
+    log_info("FC3 response, 125 registers")
+    old = _measure("legacy hex list", _legacy_fc3, hex_fc3, args.frames)
+    new = _measure("pyshark hex -> bytes", _new_fc3, hex_fc3, args.frames)
+    raw = _measure("native bytes", _new_fc3, _adu(FC3_PDU), args.frames)
+    log_info(f"peak allocation reduction: {old / max(new, 1):.1f}x (pyshark), {old / max(raw, 1):.1f}x (native)")
+
+    log_info("FC15 request, 2000 coils")
+    _measure("legacy bit loop", _legacy_fc15, hex_fc15, args.frames // 10)
+    _measure("pyshark hex payload", lambda p: parse_fc15(p, m), hex_fc15, args.frames // 10)
+    _measure("native bytes payload", lambda p: parse_fc15(p, m), raw_fc15, args.frames // 10)
+    _measure("native packed bitmap", lambda p: parse_fc15(p, m, packed=True), raw_fc15, args.frames // 10)
+
+    log_info("FC15 deltas-only, 2000 coils, unchanged frame")
+    coils = parse_fc15(raw_fc15, m)
+    dict_state = dict(coils)
+    _measure("dict state", lambda c: _legacy_deltas(c, dict_state), coils, args.frames // 10)
+    bitmap = parse_fc15(raw_fc15, m, packed=True)
+    coil_state = CoilState()
+    coil_state.update(bitmap)
+    _measure("CoilState xor", coil_state.update, bitmap, args.frames // 10)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
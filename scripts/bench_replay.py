@@ -0,0 +1,105 @@
+# scripts/bench_replay.py
+"""
+Compare PCAP replay throughput (frames/sec) of the packet source backends.
+
+    python scripts/bench_replay.py tests/pcaps/sample.pcapng [--repeat 5]
+
+The pyshark and tshark-fields backends are skipped when pyshark/tshark are
+not installed. "fields-parse" times only the tshark-fields line parser, on
+lines synthesised from the native decode of the same capture.
+"""
+import argparse
+import time
+
+from capture.pcap_native import NativePcapPacketSource
+from capture.tshark_fields import FIELDS, TsharkFieldsSource, parse_fields_line
+from modbus.correlation import TransactionTable
+from modbus.frame import frame_values, ip_str
+from app_logging import log_info, log_err
+
+
+def _drain(frames):
+    """Consume frames the way the watch loop does (fc + register map)."""
+    n = 0
+    for frame in frames:
+        if frame.fc in (3, 4):
+            frame_values(frame)
+        n += 1
+    return n
+
+
+def _bench(name, make_frames, repeat):
+    best = None
+    frames = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        frames = _drain(make_frames())
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    rate = frames / best if best else 0.0
+    log_info(f"{name:>13}: {frames} frames in {best:.4f}s -> {rate:,.0f} frames/sec")
+    return rate
+
+
+def _fields_lines(pcap):
+    """tshark -T fields style lines for every frame of pcap (one ADU per line)."""
+    lines = []
+    for f in NativePcapPacketSource(pcap).frames():
+        secs, ns = divmod(f.ts_ns, 1_000_000_000)
+        adu = bytes([f.tid >> 8, f.tid & 0xFF, 0, 0, 0, len(f.payload) + 1, f.unit]) + bytes(f.payload)
+        regs = sorted(frame_values(f).items()) if f.fc in (3, 4) else []
+        row = {
+            "frame.time_epoch": f"{secs}.{ns:09d}",
+            "ip.src": ip_str(f.src),
+            "ip.dst": ip_str(f.dst),
+            "tcp.srcport": str(f.sport),
+            "tcp.dstport": str(f.dport),
+            "mbtcp.trans_id": str(f.tid),
+            "mbtcp.unit_id": str(f.unit),
+            "modbus.func_code": str(f.fc),
+            "modbus.regnum16": ",".join(str(r) for r, _ in regs),
+            "modbus.regval_uint16": ",".join(str(v) for _, v in regs),
+            "tcp.payload": adu.hex(),
+        }
+        lines.append("\t".join(row[name] for name in FIELDS) + "\n")
+    return lines
+
+
+def _parse_lines(lines):
+    transactions = TransactionTable()
+    for line in lines:
+        yield from parse_fields_line(line, transactions)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("pcap")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    native = _bench("native", lambda: NativePcapPacketSource(args.pcap).frames(), args.repeat)
+    lines = _fields_lines(args.pcap)
+    _bench("fields-parse", lambda: _parse_lines(lines), args.repeat)
+
+    fields = None
+    try:
+        fields = _bench("tshark-fields", lambda: TsharkFieldsSource(pcap_path=args.pcap).frames(), 1)
+    except FileNotFoundError as e:
+        log_err(f"tshark-fields backend skipped: {e}")
+
+    try:
+        from capture.pcap_replay import PcapPacketSource
+        shark = _bench("pyshark", lambda: PcapPacketSource(args.pcap).frames(), 1)
+    except Exception as e:  # ImportError or tshark missing
+        log_err(f"pyshark backend skipped: {e}")
+        return 0
+
+    if shark:
+        log_info(f"speedup vs pyshark: native {native / shark:.1f}x")
+        if fields:
+            log_info(f"speedup vs pyshark: tshark-fields {fields / shark:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
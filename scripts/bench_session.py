@@ -0,0 +1,55 @@
+# scripts/bench_session.py
+"""
+Session logging cost on the capture thread: write() + flush() per line
+vs the buffered background pipeline.session_writer.SessionWriter.
+
+    python scripts/bench_session.py [--lines 100000] [--compress gzip] [--dir /tmp]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from pipeline.session_writer import SessionWriter
+from app_logging import log_info
+
+LINE = ("[2026-01-23T16:24:41.137Z] [10.55.66.71->10.2.13.53] FC=3 "
+        + ", ".join(f"{200 + i}={i * 7}" for i in range(11)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--lines", type=int, default=100000)
+    ap.add_argument("--compress", choices=["gzip", "zstd"])
+    ap.add_argument("--dir", help="Where to write (default: a temporary directory)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        n = args.lines
+        path = Path(tmp) / "flush.txt"
+        t0 = time.perf_counter()
+        with path.open("w", encoding="utf-8") as f:
+            for _ in range(n):
+                f.write(LINE + "\n")
+                f.flush()
+        per_line = (time.perf_counter() - t0) / n * 1e6
+        plain = path.stat().st_size
+
+        w = SessionWriter(tmp, "buffered", compress=args.compress)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            w.write(LINE)
+        capture = (time.perf_counter() - t0) / n * 1e6
+        w.close()
+        total = (time.perf_counter() - t0) / n * 1e6
+        size = sum(p.stat().st_size for p in w.paths)
+
+    log_info(f"{n} session lines of {len(LINE)} chars")
+    log_info(f"write+flush per line : {per_line:6.2f} us/line  {plain / 1e6:7.2f} MB")
+    log_info(f"SessionWriter        : {capture:6.2f} us/line on the capture thread, "
+             f"{total:6.2f} us/line until closed  {size / 1e6:7.2f} MB ({args.compress or 'text'})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+# src/capture/af_packet.py
+"""
+Linux AF_PACKET live capture with a kernel BPF filter (no tshark).
+
+The socket gets a classic BPF program for "tcp port 502" (plus optional
+src/dst host) so the kernel only copies Modbus traffic to user space.
+Frames are read from a PACKET_MMAP TPACKET_V3 ring one block at a time;
+if the ring cannot be set up we fall back to recv_into() batches over a
+single reusable buffer. Frames longer than what was captured of them
+(GRO/TSO-coalesced or jumbo frames beyond a recv slot or the ring's frame
+limit) are dropped and counted as truncated: a cut-off segment would
+desync the per-flow ADU reassembly, whereas a missing one is a gap it
+resyncs from.
+"""
+import ctypes
+import mmap
+import select
+import socket
+import struct
+import sys
+import time
+
+from capture.base import PacketSource
+from capture.native_packet import LINKTYPE_ETHERNET, MODBUS_TCP_PORT, NativeModbusDecoder
+
+__all__ = ["compile_bpf", "AfPacketSource"]
+
+# <linux/if_ether.h>, <linux/if_packet.h>, <asm-generic/socket.h>
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+SO_ATTACH_FILTER = 26
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+PACKET_OUTGOING = 4
+ARPHRD_LOOPBACK = 772
+
+# Classic BPF opcodes (<linux/bpf_common.h>)
+_LD_W_ABS = 0x20
+_LD_H_ABS = 0x28
+_LD_B_ABS = 0x30
+_LD_H_IND = 0x48
+_LDX_B_MSH = 0xB1
+_JEQ_K = 0x15
+_JSET_K = 0x45
+_RET_K = 0x06
+
+_ACCEPT = "accept"
+_REJECT = "reject"
+
+_tpacket_req3 = struct.Struct("7I")
+_tpacket_stats_v3 = struct.Struct("3I")
+# tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1
+_BLK_STATUS = 8
+_blk_hdr = struct.Struct("III")  # block_status, num_pkts, offset_to_first_pkt
+# tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net
+_pkt_hdr = struct.Struct("IIIIIIHH")
+# sockaddr_ll (hatype, pkttype) follows the 48-byte tpacket3_hdr
+_SLL_HATYPE = 48 + 8
+_sll_type = struct.Struct("HB")
+
+
+def _ip_to_int(addr):
+    return struct.unpack(">I", socket.inet_aton(addr))[0]
+
+
+def compile_bpf(port=MODBUS_TCP_PORT, src=None, dst=None, snaplen=0xFFFF):
+    """
+    Compile "ip and tcp port <port> [and src host <src>] [and dst host <dst>]"
+    for Ethernet frames into a list of (code, jt, jf, k) tuples, the same
+    program tcpdump -dd would emit. Non-first IP fragments are rejected.
+    """
+    # (code, jt, jf, k) with jt/jf given as labels and resolved below
+    prog = [
+        ("", _LD_H_ABS, None, None, 12),
+        ("", _JEQ_K, None, _REJECT, 0x0800),      # IPv4
+        ("", _LD_B_ABS, None, None, 23),
+        ("", _JEQ_K, None, _REJECT, 6),           # TCP
+    ]
+    if src:
+        prog += [("", _LD_W_ABS, None, None, 26), ("", _JEQ_K, None, _REJECT, _ip_to_int(src))]
+    if dst:
+        prog += [("", _LD_W_ABS, None, None, 30), ("", _JEQ_K, None, _REJECT, _ip_to_int(dst))]
+    prog += [
+        ("", _LD_H_ABS, None, None, 20),
+        ("", _JSET_K, _REJECT, None, 0x1FFF),     # fragment offset != 0
+        ("", _LDX_B_MSH, None, None, 14),         # X = IP header length
+        ("", _LD_H_IND, None, None, 14),          # TCP source port
+        ("", _JEQ_K, _ACCEPT, None, port),
+        ("", _LD_H_IND, None, None, 16),          # TCP destination port
+        ("", _JEQ_K, _ACCEPT, _REJECT, port),
+        (_ACCEPT, _RET_K, None, None, snaplen),
+        (_REJECT, _RET_K, None, None, 0),
+    ]
+    labels = {label: i for i, (label, *_rest) in enumerate(prog) if label}
+
+    def _jump(i, target):
+        return 0 if target is None else labels[target] - i - 1
+
+    return [(code, _jump(i, jt), _jump(i, jf), k) for i, (_l, code, jt, jf, k) in enumerate(prog)]
+
+
+def _attach_filter(sock, program):
+    insns = b"".join(struct.pack("HBBI", *insn) for insn in program)
+    buf = ctypes.create_string_buffer(insns)
+    fprog = struct.pack("HL", len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def _is_loopback_echo(hatype, pkttype):
+    # Loopback delivers every frame twice (outgoing + incoming); keep one copy
+    return hatype == ARPHRD_LOOPBACK and pkttype == PACKET_OUTGOING
+
+
+def iter_ring_block(ring, offset, on_truncated=None):
+    """
+    Yield (ts_ns, frame) for every packet in the TPACKET_V3 block at offset.
+    Packets the kernel cut short (tp_snaplen < tp_len) are skipped and
+    reported through on_truncated().
+    """
+    _status, num_pkts, pkt = _blk_hdr.unpack_from(ring, offset + _BLK_STATUS)
+    pkt += offset
+    for _ in range(num_pkts):
+        nxt, sec, nsec, snaplen, length, _st, mac, _net = _pkt_hdr.unpack_from(ring, pkt)
+        if not _is_loopback_echo(*_sll_type.unpack_from(ring, pkt + _SLL_HATYPE)):
+            if snaplen < length:
+                if on_truncated is not None:
+                    on_truncated()
+            else:
+                yield sec * 1_000_000_000 + nsec, ring[pkt + mac : pkt + mac + snaplen]
+        pkt += nxt
+
+
+class AfPacketSource(PacketSource):
+    """
+    Live Modbus/TCP capture on a Linux interface via AF_PACKET.
+
+    stats() reports frames received from the kernel, ModbusFrames yielded,
+    frames dropped as truncated (longer than frame_size in recv mode, or
+    than the ring's frame limit), and the kernel's own packet/drop counters
+    (PACKET_STATISTICS).
+    """
+
+    def __init__(self, iface, src=None, dst=None, port=MODBUS_TCP_PORT,
+                 use_ring=True, block_size=1 << 20, block_nr=16,
+                 frame_size=2048, block_timeout_ms=100, batch=64):
+        self.iface = iface
+        self.src = src
+        self.dst = dst
+        self.port = port
+        self.use_ring = use_ring
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.frame_size = frame_size
+        self.block_timeout_ms = block_timeout_ms
+        self.batch = batch
+        self.decoder = NativeModbusDecoder(src=src, dst=dst, port=port)
+
+        self.received = 0
+        self.processed = 0
+        self.truncated = 0
+        self.kernel_packets = 0
+        self.kernel_drops = 0
+
+        self._sock = None
+        self._ring = None
+        self._closed = False
+
+    # ---- setup / teardown ----
+    def _open(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("AF_PACKET capture is only available on Linux")
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        _attach_filter(sock, compile_bpf(self.port, self.src, self.dst))
+        if self.use_ring:
+            try:
+                sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+                req = _tpacket_req3.pack(
+                    self.block_size, self.block_nr, self.frame_size,
+                    (self.block_size // self.frame_size) * self.block_nr,
+                    self.block_timeout_ms, 0, 0,
+                )
+                sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+                self._ring = mmap.mmap(sock.fileno(), self.block_size * self.block_nr,
+                                       mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            except OSError:
+                self._ring = None  # fall back to recv_into batches
+        sock.bind((self.iface, 0))
+        self._sock = sock
+
+    def stop(self):
+        """Ask raw_frames() to return (within one poll/recv timeout) without
+        releasing the socket, e.g. from another thread."""
+        self._closed = True
+
+    def close(self):
+        self._closed = True
+        self._update_kernel_stats()
+        if self._ring is not None:
+            try:
+                self._ring.close()
+            except BufferError:
+                pass
+            self._ring = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _update_kernel_stats(self):
+        if self._sock is None:
+            return
+        try:
+            raw = self._sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _tpacket_stats_v3.size)
+        except OSError:
+            return
+        # The kernel resets these counters on every read
+        packets, drops = struct.unpack_from("II", raw)
+        self.kernel_packets += packets
+        self.kernel_drops += drops
+
+    def stats(self):
+        self._update_kernel_stats()
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "truncated": self.truncated,
+            "kernel_packets": self.kernel_packets,
+            "kernel_drops": self.kernel_drops,
+        }
+
+    # ---- frame readers ----
+    def raw_frames(self):
+        """Yield (ts_ns, frame) for every frame that passed the BPF filter."""
+        if self._sock is None:
+            self._open()
+        if self._ring is not None:
+            yield from self._ring_frames()
+        else:
+            yield from self._recv_frames()
+
+    def _ring_frames(self):
+        ring, sock = self._ring, self._sock
+        poller = select.poll()
+        poller.register(sock.fileno(), select.POLLIN | select.POLLERR)
+        block = 0
+        while not self._closed:
+            offset = block * self.block_size
+            if not (struct.unpack_from("I", ring, offset + _BLK_STATUS)[0] & TP_STATUS_USER):
+                poller.poll(1000)
+                continue
+            for ts_ns, frame in iter_ring_block(ring, offset, self._count_truncated):
+                self.received += 1
+                yield ts_ns, frame
+                if self._closed:
+                    return
+            # Hand the block back to the kernel
+            struct.pack_into("I", ring, offset + _BLK_STATUS, TP_STATUS_KERNEL)
+            block = (block + 1) % self.block_nr
+
+    def _count_truncated(self):
+        self.truncated += 1
+
+    def _recv_frames(self):
+        sock = self._sock
+        size = self.frame_size
+        # One reusable buffer split into `batch` fixed-size slots
+        view = memoryview(bytearray(size * self.batch))
+        slots = [view[i * size : (i + 1) * size] for i in range(self.batch)]
+        sock.settimeout(1.0)
+        while not self._closed:
+            batch = []
+            flags = socket.MSG_TRUNC  # n is the frame's real length, even past the slot
+            # Block for the first frame, then drain whatever else is queued
+            while len(batch) < self.batch:
+                slot = slots[len(batch)]
+                try:
+                    n, addr = sock.recvfrom_into(slot, 0, flags)
+                except (socket.timeout, BlockingIOError, InterruptedError):
+                    break
+                flags = socket.MSG_TRUNC | socket.MSG_DONTWAIT
+                if n > size:
+                    self.truncated += 1
+                elif not _is_loopback_echo(addr[3], addr[2]):
+                    batch.append((time.time_ns(), slot[:n]))
+            for item in batch:
+                self.received += 1
+                yield item
+
+    def frames(self):
+        decode = self.decoder.decode
+        for ts_ns, raw in self.raw_frames():
+            for frame in decode(ts_ns, LINKTYPE_ETHERNET, raw):
+                self.processed += 1
+                yield frame
@@ -2,6 +2,6 @@ from abc import ABC, abstractmethod
 
 class PacketSource(ABC):
     @abstractmethod
-    def packets(self):
-        """Yield pyshark packets"""
+    def frames(self):
+        """Yield modbus.frame.ModbusFrame records"""
         pass
@@ -1,6 +1,7 @@
 import pyshark
 from config import NIC_ADDRESS
 from capture.base import PacketSource
+from capture.pyshark_frames import pyshark_frames
 
 class LivePacketSource(PacketSource):
     def packets(self):
@@ -9,3 +10,6 @@ class LivePacketSource(PacketSource):
             display_filter='modbus && tcp.port == 502'
         )
         yield from cap.sniff_continuously()
+
+    def frames(self):
+        yield from pyshark_frames(self.packets())
@@ -0,0 +1,161 @@
+# src/capture/native_packet.py
+"""
+Header walking for native (tshark-free) capture backends.
+
+parse_l2_frame() strips link/IPv4/TCP headers from a raw captured frame and
+returns the TCP payload. NativeModbusDecoder turns Modbus/TCP payloads into
+ModbusFrame records.
+"""
+import socket
+import struct
+
+from modbus.correlation import TransactionTable, resolve_span
+from modbus.frame import ModbusFrame
+from modbus.reassembly import AduReassembler
+
+__all__ = [
+    "MODBUS_TCP_PORT",
+    "parse_l2_frame",
+    "NativeModbusDecoder",
+]
+
+MODBUS_TCP_PORT = 502
+
+# Link-layer header types (https://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_P_IP = 0x0800
+_VLAN_TPIDS = (0x8100, 0x88A8, 0x9100)
+
+_u16 = struct.Struct(">H")
+_u32 = struct.Struct(">I")
+_mbap = struct.Struct(">HHHB")
+
+
+def _ipv4_offset(linktype, buf):
+    """Return the offset of the IPv4 header in buf, or -1 if not IPv4."""
+    n = len(buf)
+    if linktype == LINKTYPE_ETHERNET:
+        if n < 14:
+            return -1
+        off = 12
+        etype = _u16.unpack_from(buf, off)[0]
+        while etype in _VLAN_TPIDS and n >= off + 6:
+            off += 4
+            etype = _u16.unpack_from(buf, off)[0]
+        return off + 2 if etype == ETH_P_IP else -1
+    if linktype == LINKTYPE_LINUX_SLL:
+        if n < 16:
+            return -1
+        return 16 if _u16.unpack_from(buf, 14)[0] == ETH_P_IP else -1
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if n < 20:
+            return -1
+        return 20 if _u16.unpack_from(buf, 0)[0] == ETH_P_IP else -1
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return 0 if n and (buf[0] >> 4) == 4 else -1
+    if linktype == LINKTYPE_NULL:
+        # 4-byte address family in the capturing host's byte order; AF_INET == 2
+        if n < 4:
+            return -1
+        return 4 if buf[0] == 2 or buf[3] == 2 else -1
+    return -1
+
+
+def parse_l2_frame(linktype, buf):
+    """
+    Walk link/IPv4/TCP headers of a captured frame.
+
+    Returns (src_ip, dst_ip, sport, dport, seq, payload) where the IPs are
+    packed 4-byte values and payload is a memoryview slice of buf, or None
+    if the frame is not an unfragmented IPv4/TCP segment.
+    """
+    ip = _ipv4_offset(linktype, buf)
+    if ip < 0 or len(buf) < ip + 20:
+        return None
+    vihl = buf[ip]
+    if vihl >> 4 != 4 or buf[ip + 9] != 6:  # IPv4 / TCP only
+        return None
+    ihl = (vihl & 0x0F) * 4
+    total_len = _u16.unpack_from(buf, ip + 2)[0]
+    if _u16.unpack_from(buf, ip + 6)[0] & 0x3FFF:  # MF flag or fragment offset
+        return None
+    tcp = ip + ihl
+    # Trust the IP total length over the capture length (Ethernet padding)
+    end = min(len(buf), ip + total_len)
+    if end < tcp + 20:
+        return None
+    sport, dport = struct.unpack_from(">HH", buf, tcp)
+    seq = _u32.unpack_from(buf, tcp + 4)[0]
+    data = tcp + (buf[tcp + 12] >> 4) * 4
+    if data > end:
+        return None
+    mv = memoryview(buf)
+    return (
+        bytes(mv[ip + 12 : ip + 16]),
+        bytes(mv[ip + 16 : ip + 20]),
+        sport,
+        dport,
+        seq,
+        mv[data:end],
+    )
+
+
+class NativeModbusDecoder:
+    """
+    Turns TCP segments on port 502 into ModbusFrame records.
+
+    Segments go through a per-flow AduReassembler first, so pipelined
+    requests and responses split across segments come out as whole ADUs.
+
+    Read responses carry no start address, so read requests go into a
+    TransactionTable and are paired with their response to recover the
+    start address and quantity (as tshark does) and the response time.
+    """
+
+    def __init__(self, src=None, dst=None, port=MODBUS_TCP_PORT,
+                 reassembler=None, transactions=None):
+        self.src = socket.inet_aton(src) if src else None
+        self.dst = socket.inet_aton(dst) if dst else None
+        self.port = port
+        self.reassembler = reassembler or AduReassembler()
+        self.transactions = transactions or TransactionTable()
+
+    def stats(self):
+        return {
+            "reassembly": self.reassembler.stats(),
+            "transactions": self.transactions.stats(),
+        }
+
+    def decode(self, ts_ns, linktype, buf):
+        """Return the list of ModbusFrames (one per whole ADU) in a captured frame."""
+        seg = parse_l2_frame(linktype, buf)
+        if seg is None:
+            return []
+        src, dst, sport, dport, seq, payload = seg
+        if sport != self.port and dport != self.port:
+            return []
+        if (self.src and src != self.src) or (self.dst and dst != self.dst):
+            return []
+        if not payload:
+            return []
+        adus = self.reassembler.feed((src, sport, dst, dport), payload, seq, ts_ns)
+        if not adus:
+            return []
+        return [self._frame(ts_ns, src, dst, sport, dport, adu) for adu in adus]
+
+    def _frame(self, ts_ns, src, dst, sport, dport, adu):
+        adu = bytes(adu)  # may alias the capture buffer; this is the one copy
+        tid, _proto, _length, unit = _mbap.unpack_from(adu, 0)
+        pdu = memoryview(adu)[7:]
+        fc = pdu[0]
+        is_response = sport == self.port
+        flow = (dst, dport, src, sport) if is_response else (src, sport, dst, dport)
+        address, quantity = resolve_span(self.transactions, flow, unit, tid, pdu, is_response, ts_ns)
+        return ModbusFrame(ts_ns, src, dst, sport, dport, unit, tid, fc,
+                           address, quantity, pdu, is_response)
@@ -0,0 +1,293 @@
+# src/capture/parallel_replay.py
+"""
+Sharded native replay of large pcap/pcapng files across processes.
+
+The file is cut into byte ranges that are snapped to record (pcap) or
+block (pcapng) boundaries. Each range is decoded in a worker process
+(L2/TCP parsing, ADU reassembly, request/response correlation, register
+decoding) and the parent chains the chunks back in file order, so frames
+come out in exactly the order a serial replay yields them, including
+captures whose timestamps go backwards.
+
+Workers start decoding warmup_bytes before their range and throw that
+output away, so ADUs split across the cut are reassembled. Read responses
+whose request is not in the worker's window at all are handed back as
+orphans together with the worker's outstanding requests; the parent
+resolves them against the requests carried over from earlier chunks, so
+correlation is the same as in a serial replay however far apart the two
+are. Everything order-dependent beyond that (deltas, trigger edges,
+session start/stop) stays in the consumer, which sees one ordered stream.
+"""
+import mmap
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from capture.base import PacketSource
+from capture.native_packet import MODBUS_TCP_PORT, NativeModbusDecoder
+from capture.pcap_native import (
+    _EPB, _IDB, _OPB, _PCAP_MAGIC, _SHB, _SPB,
+    NativePcapPacketSource, PcapFormatError, _iter_pcap, _iter_pcapng, _pcapng_section,
+)
+from modbus.correlation import READ_FCS
+from modbus.decoders import REGISTER_FCS
+from modbus.frame import frame_values
+
+__all__ = ["plan_chunks", "resolve_chunks", "merge_chunks", "ParallelPcapSource"]
+
+# SHB, IDB, EPB, SPB, OPB plus name resolution, interface statistics,
+# decryption secrets and custom blocks
+_PCAPNG_BLOCKS = (_SHB, _IDB, _EPB, _SPB, _OPB, 0x04, 0x05, 0x0A, 0x0BAD, 0x40000BAD)
+_MAX_SNAP = 262144
+_SYNC_CHAIN = 3  # consecutive valid records/blocks required to accept a boundary
+
+
+def _pcap_record_end(buf, off, rec, frac_max, end):
+    """End offset of a plausible pcap record header at off, or -1."""
+    if off + 16 > end:
+        return -1
+    _sec, frac, incl, orig = rec.unpack_from(buf, off)
+    if frac >= frac_max or incl > _MAX_SNAP or orig < incl:
+        return -1
+    nxt = off + 16 + incl
+    return nxt if nxt <= end else -1
+
+
+def _sync_pcap(buf, off, endian, ts_mult):
+    """First record boundary at or after off."""
+    rec = struct.Struct(endian + "IIII")
+    frac_max = 1_000_000 if ts_mult == 1000 else 1_000_000_000
+    end = len(buf)
+    while off < end:
+        pos, ok = off, 0
+        while ok < _SYNC_CHAIN:
+            nxt = _pcap_record_end(buf, pos, rec, frac_max, end)
+            if nxt < 0:
+                break
+            ok += 1
+            pos = nxt
+            if pos == end:
+                return off
+        if ok == _SYNC_CHAIN:
+            return off
+        off += 1
+    return end
+
+
+def _pcapng_block_end(buf, off, endian, end):
+    """End offset of a plausible pcapng block at off, or -1."""
+    if off + 12 > end:
+        return -1
+    btype, blen = struct.unpack_from(endian + "II", buf, off)
+    if btype not in _PCAPNG_BLOCKS or blen < 12 or blen & 3 or off + blen > end:
+        return -1
+    if struct.unpack_from(endian + "I", buf, off + blen - 4)[0] != blen:
+        return -1
+    return off + blen
+
+
+def _sync_pcapng(buf, off, endian):
+    """First block boundary at or after off (blocks are 32-bit aligned)."""
+    end = len(buf)
+    off = (off + 3) & ~3
+    while off < end:
+        pos, ok = off, 0
+        while ok < _SYNC_CHAIN:
+            nxt = _pcapng_block_end(buf, pos, endian, end)
+            if nxt < 0:
+                break
+            ok += 1
+            pos = nxt
+            if pos == end:
+                return off
+        if ok == _SYNC_CHAIN:
+            return off
+        off += 4
+    return end
+
+
+def plan_chunks(path, chunks, warmup_bytes=1 << 20):
+    """
+    Split a capture into up to `chunks` packet-aligned byte ranges.
+
+    Returns (kind, section, ranges): kind is "pcap" or "pcapng", section
+    the pcapng (endian, interfaces) of the leading section, and ranges a
+    list of (warm_start, start, stop) byte offsets.
+    """
+    with open(path, "rb") as fh:
+        buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(buf) < 4:
+                raise PcapFormatError(f"not a pcap/pcapng file: {path}")
+            magic = struct.unpack_from(">I", buf, 0)[0]
+            if magic in _PCAP_MAGIC:
+                kind, section, first = "pcap", None, 24
+                endian, ts_mult = _PCAP_MAGIC[magic]
+
+                def sync(off):
+                    return _sync_pcap(buf, off, endian, ts_mult)
+            elif magic == _SHB:
+                kind = "pcapng"
+                endian, interfaces, first = _pcapng_section(buf)
+                section = (endian, interfaces)
+
+                def sync(off):
+                    return _sync_pcapng(buf, off, endian)
+            else:
+                raise PcapFormatError(f"not a pcap/pcapng file: {path}")
+
+            end = len(buf)
+            step = max((end - first) // max(chunks, 1), 1)
+            cuts = [first]
+            for i in range(1, chunks):
+                cut = sync(first + i * step)
+                if cut > cuts[-1] and cut < end:
+                    cuts.append(cut)
+            cuts.append(end)
+
+            # Warm up over at most the previous chunk
+            ranges = []
+            for prev, start, stop in zip([first] + cuts, cuts, cuts[1:]):
+                warm = start if start == first else sync(max(start - warmup_bytes, prev))
+                ranges.append((min(warm, start), start, stop))
+            return kind, section, ranges
+        finally:
+            buf.close()
+
+
+def _txn_key(frame):
+    """TransactionTable key of a frame: (client->server flow, unit, tid)."""
+    if frame.is_response:
+        flow = (frame.dst, frame.dport, frame.src, frame.sport)
+    else:
+        flow = (frame.src, frame.sport, frame.dst, frame.dport)
+    return flow, frame.unit, frame.tid
+
+
+def _decode_chunk(task):
+    """
+    Worker: decode one range. Returns (frames, orphans, pending, touched):
+    picklable ModbusFrames (payload as bytes); indexes of read responses
+    whose transaction never appeared in this worker; the requests still
+    outstanding at the end; and the transaction keys of every request seen.
+    """
+    path, kind, section, warm, start, stop, src, dst, port = task
+    decoder = NativeModbusDecoder(src=src, dst=dst, port=port)
+    decode = decoder.decode
+    out = []
+    orphans = []
+    touched = set()
+    with open(path, "rb") as fh:
+        buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if kind == "pcap":
+                warmup, records = _iter_pcap(buf, warm, start), _iter_pcap(buf, start, stop)
+            else:
+                warmup = _iter_pcapng(buf, warm, start, section)
+                records = _iter_pcapng(buf, start, stop, section)
+            for ts_ns, linktype, raw in warmup:
+                for frame in decode(ts_ns, linktype, raw):
+                    if not frame.is_response and frame.fc in READ_FCS:
+                        touched.add(_txn_key(frame))
+            for ts_ns, linktype, raw in records:
+                for frame in decode(ts_ns, linktype, raw):
+                    if (frame.fc & 0x7F) in READ_FCS:
+                        key = _txn_key(frame)
+                        if not frame.is_response:
+                            touched.add(key)
+                        elif key not in touched:
+                            orphans.append(len(out))
+                    values = frame_values(frame) if frame.fc in REGISTER_FCS else None
+                    out.append(frame._replace(payload=bytes(frame.payload), values=values))
+        finally:
+            try:
+                buf.close()
+            except BufferError:
+                pass
+    return out, orphans, decoder.transactions.pending(), touched
+
+
+def _resolve_orphans(chunk, carry, ttl_ns):
+    """
+    Give a chunk's orphan responses the span of the matching request from
+    earlier chunks, the way TransactionTable.match_response would, and
+    return (frames, carry for the next chunk).
+    """
+    frames, orphans, pending, touched = chunk
+    for i in orphans:
+        frame = frames[i]
+        req = carry.pop(_txn_key(frame), None)
+        if req is None or req.fc != (frame.fc & 0x7F) or frame.ts_ns - req.ts_ns > ttl_ns:
+            continue
+        frame = frame._replace(address=req.address, quantity=req.quantity, values=None)
+        if frame.fc in REGISTER_FCS:
+            frame = frame._replace(values=frame_values(frame))
+        frames[i] = frame
+    nxt = {k: v for k, v in carry.items() if k not in touched}
+    nxt.update(pending)
+    return frames, nxt
+
+
+def resolve_chunks(chunks, ttl=5.0):
+    """
+    _decode_chunk results in file order -> per-chunk frame lists with
+    orphans resolved. ttl is the TransactionTable ttl (seconds).
+    """
+    carry = {}
+    ttl_ns = int(ttl * 1e9)
+    for chunk in chunks:
+        frames, carry = _resolve_orphans(chunk, carry, ttl_ns)
+        yield frames
+
+
+def merge_chunks(chunks):
+    """
+    Chain per-chunk frame lists (in file order) into one stream in packet
+    order. Timestamps are not re-sorted: a serial replay does not sort
+    them either, and deltas, trigger edges and sessions follow that order.
+    """
+    for frames in chunks:
+        yield from frames
+
+
+class ParallelPcapSource(PacketSource):
+    """Native pcap/pcapng replay decoded by a pool of `workers` processes."""
+
+    def __init__(self, pcap_path, workers, src=None, dst=None, port=MODBUS_TCP_PORT,
+                 chunks_per_worker=4, warmup_bytes=1 << 20):
+        self.pcap_path = pcap_path
+        self.workers = workers
+        self.src = src
+        self.dst = dst
+        self.port = port
+        self.chunks_per_worker = chunks_per_worker
+        self.warmup_bytes = warmup_bytes
+
+    def frames(self):
+        if self.workers <= 1:
+            yield from NativePcapPacketSource(self.pcap_path, src=self.src, dst=self.dst,
+                                              port=self.port).frames()
+            return
+        kind, section, ranges = plan_chunks(self.pcap_path, self.workers * self.chunks_per_worker,
+                                            self.warmup_bytes)
+        tasks = iter([(self.pcap_path, kind, section, warm, start, stop, self.src, self.dst, self.port)
+                      for warm, start, stop in ranges])
+        ex = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            # Bounded read-ahead: at most two chunks per worker in flight
+            pending = deque(ex.submit(_decode_chunk, t) for t in islice(tasks, self.workers * 2))
+
+            def results():
+                while pending:
+                    fut = pending.popleft()
+                    nxt = next(tasks, None)
+                    if nxt is not None:
+                        pending.append(ex.submit(_decode_chunk, nxt))
+                    yield fut.result()
+
+            # payload stays bytes (it crossed a process boundary); every
+            # consumer only indexes/slices it, like the memoryview it replaces
+            yield from merge_chunks(resolve_chunks(results()))
+        finally:
+            ex.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,218 @@
+# src/capture/pcap_native.py
+"""
+Pure-Python pcap/pcapng reader (struct + mmap), no tshark involved.
+
+iter_pcap_records() yields (ts_ns, linktype, frame) for every captured frame;
+NativePcapPacketSource decodes them straight into ModbusFrame records.
+"""
+import mmap
+import struct
+import time
+
+from capture.base import PacketSource
+from capture.native_packet import MODBUS_TCP_PORT, NativeModbusDecoder
+
+__all__ = ["PcapFormatError", "iter_pcap_records", "NativePcapPacketSource"]
+
+# Classic pcap magic numbers (as read big-endian from the first 4 bytes)
+_PCAP_MAGIC = {
+    0xA1B2C3D4: (">", 1000),  # big-endian, microseconds
+    0xD4C3B2A1: ("<", 1000),  # little-endian, microseconds
+    0xA1B23C4D: (">", 1),     # big-endian, nanoseconds
+    0x4D3CB2A1: ("<", 1),     # little-endian, nanoseconds
+}
+
+# pcapng block types
+_SHB = 0x0A0D0D0A
+_IDB = 0x00000001
+_OPB = 0x00000002  # obsolete packet block
+_SPB = 0x00000003
+_EPB = 0x00000006
+_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+_IF_TSRESOL = 9
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+def _tsresol_to_ns(v):
+    """Return (multiplier, divisor) converting a raw timestamp unit to ns."""
+    if v & 0x80:
+        return 10**9, 1 << (v & 0x7F)
+    exp = v & 0x7F
+    if exp <= 9:
+        return 10 ** (9 - exp), 1
+    return 1, 10 ** (exp - 9)
+
+
+def _iter_pcap(buf, start=24, stop=None):
+    """Records whose header starts in [start, stop); start must be a record boundary."""
+    endian, ts_mult = _PCAP_MAGIC[struct.unpack_from(">I", buf, 0)[0]]
+    if len(buf) < 24:
+        raise PcapFormatError("truncated pcap header")
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+    rec = struct.Struct(endian + "IIII")
+    mv = memoryview(buf)
+    off, end = start, len(buf)
+    stop = end if stop is None else min(stop, end)
+    try:
+        while off + 16 <= end and off < stop:
+            sec, frac, incl, _orig = rec.unpack_from(buf, off)
+            off += 16
+            if off + incl > end:
+                break  # truncated final record
+            yield sec * 1_000_000_000 + frac * ts_mult, linktype, mv[off : off + incl]
+            off += incl
+    finally:
+        mv.release()
+
+
+def _iter_pcapng(buf, start=0, stop=None, section=None):
+    """
+    Packets of blocks starting in [start, stop). start must be a block
+    boundary; section is the (endian, interfaces) in effect there (see
+    _pcapng_section), required when start is past the first SHB.
+    """
+    mv = memoryview(buf)
+    off, end = start, len(buf)
+    stop = end if stop is None else min(stop, end)
+    endian, interfaces = section if section else ("<", [])  # interfaces: [(linktype, ts_mult, ts_div)]
+    interfaces = list(interfaces)
+    try:
+        while off + 12 <= end and off < stop:
+            btype = struct.unpack_from(endian + "I", buf, off)[0]
+            if btype == _SHB:
+                bom = struct.unpack_from("<I", buf, off + 8)[0]
+                endian = "<" if bom == _BYTE_ORDER_MAGIC else ">"
+                interfaces = []  # interface ids are scoped to a section
+            blen = struct.unpack_from(endian + "I", buf, off + 4)[0]
+            if blen < 12 or off + blen > end:
+                break  # corrupt or truncated block
+            body = off + 8
+
+            if btype == _EPB:
+                iface, ts_hi, ts_lo, caplen, _orig = struct.unpack_from(endian + "IIIII", buf, body)
+                if iface < len(interfaces):
+                    linktype, mult, div = interfaces[iface]
+                    ts = (ts_hi << 32) | ts_lo
+                    data = body + 20
+                    yield ts * mult // div, linktype, mv[data : data + caplen]
+            elif btype == _SPB:
+                if interfaces:
+                    linktype = interfaces[0][0]
+                    orig = struct.unpack_from(endian + "I", buf, body)[0]
+                    caplen = min(orig, blen - 16)
+                    yield 0, linktype, mv[body + 4 : body + 4 + caplen]
+            elif btype == _OPB:
+                iface, _drops, ts_hi, ts_lo, caplen, _orig = struct.unpack_from(endian + "HHIIII", buf, body)
+                if iface < len(interfaces):
+                    linktype, mult, div = interfaces[iface]
+                    ts = (ts_hi << 32) | ts_lo
+                    data = body + 20
+                    yield ts * mult // div, linktype, mv[data : data + caplen]
+            elif btype == _IDB:
+                interfaces.append(_parse_idb(buf, endian, off, blen))
+
+            off += blen
+    finally:
+        mv.release()
+
+
+def _parse_idb(buf, endian, off, blen):
+    """Interface Description Block -> (linktype, ts_mult, ts_div)."""
+    body = off + 8
+    linktype = struct.unpack_from(endian + "H", buf, body)[0]
+    tsresol = 6
+    opt, opt_end = body + 8, off + blen - 4
+    while opt + 4 <= opt_end:
+        code, olen = struct.unpack_from(endian + "HH", buf, opt)
+        if code == 0:
+            break
+        if code == _IF_TSRESOL and olen >= 1:
+            tsresol = buf[opt + 4]
+        opt += 4 + ((olen + 3) & ~3)
+    return (linktype, *_tsresol_to_ns(tsresol))
+
+
+def _pcapng_section(buf):
+    """
+    (endian, interfaces, first_packet_offset) of the leading section: the
+    header blocks are walked up to the first packet block.
+    """
+    off, end = 0, len(buf)
+    endian = "<"
+    interfaces = []
+    while off + 12 <= end:
+        btype = struct.unpack_from(endian + "I", buf, off)[0]
+        if btype == _SHB:
+            bom = struct.unpack_from("<I", buf, off + 8)[0]
+            endian = "<" if bom == _BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        elif btype in (_EPB, _SPB, _OPB):
+            break
+        blen = struct.unpack_from(endian + "I", buf, off + 4)[0]
+        if blen < 12 or off + blen > end:
+            break
+        if btype == _IDB:
+            interfaces.append(_parse_idb(buf, endian, off, blen))
+        off += blen
+    return endian, interfaces, off
+
+
+def iter_pcap_records(path):
+    """
+    Yield (ts_ns, linktype, frame) for each packet in a pcap or pcapng file.
+    frame is a memoryview into a read-only mmap; copy it if you keep it
+    beyond the next iteration.
+    """
+    with open(path, "rb") as fh:
+        try:
+            buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+        try:
+            if len(buf) < 4:
+                raise PcapFormatError(f"not a pcap/pcapng file: {path}")
+            magic = struct.unpack_from(">I", buf, 0)[0]
+            if magic in _PCAP_MAGIC:
+                yield from _iter_pcap(buf)
+            elif magic == _SHB:
+                yield from _iter_pcapng(buf)
+            else:
+                raise PcapFormatError(f"not a pcap/pcapng file: {path}")
+        finally:
+            try:
+                buf.close()
+            except BufferError:
+                # A consumer still holds a frame view; the map is released
+                # when that view is garbage collected.
+                pass
+
+
+class NativePcapPacketSource(PacketSource):
+    def __init__(self, pcap_path, realtime=False, speed=1.0,
+                 src=None, dst=None, port=MODBUS_TCP_PORT):
+        """
+        pcap_path : path to .pcap or .pcapng
+        realtime  : replay packets with original timing
+        speed     : timing multiplier (2.0 = 2x faster)
+        src/dst   : optional IPv4 address filters
+        """
+        self.pcap_path = pcap_path
+        self.realtime = realtime
+        self.speed = speed
+        self.decoder = NativeModbusDecoder(src=src, dst=dst, port=port)
+
+    def frames(self):
+        decode = self.decoder.decode
+        prev_ts = None
+        for ts_ns, linktype, raw in iter_pcap_records(self.pcap_path):
+            frames = decode(ts_ns, linktype, raw)
+            if not frames:
+                continue
+            if self.realtime:
+                if prev_ts is not None and ts_ns > prev_ts:
+                    time.sleep((ts_ns - prev_ts) / 1e9 / self.speed)
+                prev_ts = ts_ns
+            yield from frames
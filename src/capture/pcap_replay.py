@@ -1,6 +1,7 @@
 import time
 import pyshark
 from capture.base import PacketSource
+from capture.pyshark_frames import pyshark_frames
 
 class PcapPacketSource(PacketSource):
     def __init__(self, pcap_path, realtime=False, speed=1.0):
@@ -30,3 +31,6 @@ class PcapPacketSource(PacketSource):
                 prev_ts = pkt.sniff_time
 
             yield pkt
+
+    def frames(self):
+        yield from pyshark_frames(self.packets())
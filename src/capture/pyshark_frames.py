@@ -0,0 +1,90 @@
+# src/capture/pyshark_frames.py
+"""
+Adapter from pyshark packets to ModbusFrame records.
+
+For FC3/4/5/15 tshark has already dissected the packet (including
+request/response tracking for register numbers), so the decoded values
+travel with the frame in frame.values. Other function codes are decoded
+from the payload like native frames, with read responses correlated
+through a TransactionTable.
+"""
+from modbus.direction import normalize_func_code, get_packet_endpoints
+from modbus.registers import parse_register_map
+from modbus.coils import parse_fc5, parse_fc15
+from modbus.correlation import TransactionTable, resolve_span
+from modbus.frame import ModbusFrame, pack_ip
+from capture.native_packet import MODBUS_TCP_PORT
+from modbus.pdu import get_modbus_pdu_bytes
+from modbus.utils import intify
+
+__all__ = ["frame_from_packet", "pyshark_frames"]
+
+_EMPTY = memoryview(b"")
+_DISSECTED_FCS = (3, 4, 5, 15)
+
+
+def _sniff_ns(pkt):
+    ts = getattr(pkt, "sniff_time", None)
+    if ts is None:
+        return 0
+    # sniff_time is naive local time from pyshark; timestamp() handles both
+    return round(ts.timestamp() * 1_000_000) * 1000
+
+
+def frame_from_packet(pkt, transactions=None):
+    """Build a ModbusFrame from a pyshark packet; None if it has no modbus layer."""
+    if not hasattr(pkt, "modbus"):
+        return None
+    m = pkt.modbus
+    fc = normalize_func_code(m)
+    src, dst, sport, dport = get_packet_endpoints(pkt)
+    sport = intify(sport, default=0)
+    dport = intify(dport, default=0)
+    is_response = sport == MODBUS_TCP_PORT
+    mbtcp = getattr(pkt, "mbtcp", None)  # MBAP header fields live in tshark's mbtcp layer
+    unit = intify(getattr(mbtcp, "unit_id", None), default=0)
+    tid = intify(getattr(mbtcp, "trans_id", None), default=0)
+    pdu = get_modbus_pdu_bytes(pkt) or _EMPTY
+    ts_ns = _sniff_ns(pkt)
+    packed_src, packed_dst = pack_ip(src), pack_ip(dst)
+
+    if fc in _DISSECTED_FCS:
+        if fc in (3, 4):
+            values = parse_register_map(m, fc=fc) or {}
+        elif fc == 5:
+            values = parse_fc5(pkt, m) or {}
+        else:
+            values = parse_fc15(pkt, m) or {}
+        address, quantity = (min(values), len(values)) if values else (-1, 0)
+    else:
+        values = None
+        if transactions is None:
+            transactions = TransactionTable()
+        flow = ((packed_dst, dport, packed_src, sport) if is_response
+                else (packed_src, sport, packed_dst, dport))
+        address, quantity = resolve_span(transactions, flow, unit, tid, pdu, is_response, ts_ns)
+
+    return ModbusFrame(
+        ts_ns,
+        packed_src,
+        packed_dst,
+        sport,
+        dport,
+        unit,
+        tid,
+        fc,
+        address,
+        quantity,
+        pdu,
+        is_response,
+        values,
+    )
+
+
+def pyshark_frames(packets):
+    """Yield ModbusFrames for the Modbus packets of a pyshark capture iterator."""
+    transactions = TransactionTable()
+    for pkt in packets:
+        frame = frame_from_packet(pkt, transactions)
+        if frame is not None:
+            yield frame
@@ -0,0 +1,195 @@
+# src/capture/ring.py
+"""
+Capture thread + preallocated frame ring.
+
+A live reader (AfPacketSource.raw_frames()) must keep being pulled or the
+kernel/tshark buffers overflow silently while the consumer is stuck on an
+MQTT reconnect or a slow disk. ThreadedCaptureSource runs the reader on
+its own thread and copies every raw frame into a FrameRing: fixed-size
+byte slots plus a timestamp and length per slot, allocated once. The
+consumer drains it in batches and decodes there, so a stalled consumer
+costs frames dropped at the ring - counted exactly - instead of frames
+lost somewhere nobody can see.
+
+The ring is single-producer/single-consumer: the producer only advances
+head, the consumer only advances tail, and each index is published by a
+single attribute store after the slot is written/read, so no lock is
+taken per frame.
+"""
+import threading
+from array import array
+
+from capture.base import PacketSource
+from capture.native_packet import LINKTYPE_ETHERNET, NativeModbusDecoder
+
+__all__ = ["FrameRing", "ThreadedCaptureSource"]
+
+
+class FrameRing:
+    """
+    slots      : frames held at once; a push into a full ring is dropped
+    slot_size  : bytes per slot; longer frames are truncated (counted)
+    """
+
+    def __init__(self, slots=8192, slot_size=2048):
+        if slots < 1 or slot_size < 1:
+            raise ValueError("slots and slot_size must be >= 1")
+        self.slots = slots
+        self.slot_size = slot_size
+        self._buf = memoryview(bytearray(slots * slot_size))
+        self._len = array("I", bytes(4 * slots))
+        self._ts = array("q", bytes(8 * slots))
+        self._head = 0  # frames ever pushed (producer-owned)
+        self._tail = 0  # frames ever drained (consumer-owned)
+        self._waiting = False
+        self._ready = threading.Event()
+
+        self.dropped = 0
+        self.truncated = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, ts_ns, frame):
+        """Producer: copy one frame in. False (and counted) when the ring is full."""
+        head = self._head
+        depth = head - self._tail
+        if depth >= self.slots:
+            self.dropped += 1
+            return False
+        i = head % self.slots
+        n = len(frame)
+        if n > self.slot_size:
+            n = self.slot_size
+            self.truncated += 1
+        off = i * self.slot_size
+        self._buf[off : off + n] = frame[:n]
+        self._len[i] = n
+        self._ts[i] = ts_ns
+        self._head = head + 1  # publish the slot
+        if depth >= self.high_water:
+            self.high_water = depth + 1
+        if self._waiting:
+            self._ready.set()
+        return True
+
+    def drain(self, max_batch=256):
+        """Consumer: up to max_batch (ts_ns, bytes) frames, oldest first."""
+        tail = self._tail
+        n = min(self._head - tail, max_batch)
+        if n <= 0:
+            return []
+        buf, lens, tss = self._buf, self._len, self._ts
+        size, slots = self.slot_size, self.slots
+        out = []
+        for k in range(tail, tail + n):
+            i = k % slots
+            off = i * size
+            out.append((tss[i], bytes(buf[off : off + lens[i]])))
+        self._tail = tail + n  # release the slots
+        return out
+
+    def wait(self, timeout):
+        """Consumer: block until a frame is pushed or timeout (seconds) passes."""
+        self._ready.clear()
+        self._waiting = True
+        try:
+            if self._head == self._tail:
+                self._ready.wait(timeout)
+        finally:
+            self._waiting = False
+
+    @property
+    def pushed(self):
+        return self._head
+
+    @property
+    def drained(self):
+        return self._tail
+
+
+class ThreadedCaptureSource(PacketSource):
+    """
+    Run raw_source.raw_frames() on a capture thread into a FrameRing and
+    decode drained batches with raw_source.decoder (or a fresh
+    NativeModbusDecoder) on the consumer side.
+
+    stats() adds to raw_source.stats(): received (frames the capture thread
+    saw), ring_dropped, ring_truncated, ring_depth, ring_high_water and
+    drained; processed counts ModbusFrames yielded. At any point
+    received == drained + ring_dropped + ring_depth.
+    """
+
+    def __init__(self, raw_source, linktype=LINKTYPE_ETHERNET, slots=8192,
+                 slot_size=2048, batch=256):
+        self.raw_source = raw_source
+        self.linktype = linktype
+        self.ring = FrameRing(slots, slot_size)
+        self.batch = batch
+        self.decoder = getattr(raw_source, "decoder", None) or NativeModbusDecoder()
+        self.processed = 0
+        self._thread = None
+        self._error = None
+        self._stop = threading.Event()
+
+    def _capture(self):
+        push = self.ring.push
+        stop = self._stop
+        try:
+            for ts_ns, frame in self.raw_source.raw_frames():
+                push(ts_ns, frame)
+                if stop.is_set():
+                    break
+        except Exception as e:  # re-raised on the consumer side
+            if not stop.is_set():
+                self._error = e
+        finally:
+            self.ring._ready.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._capture, name="modbus-capture", daemon=True)
+            self._thread.start()
+
+    def frames(self):
+        self.start()
+        ring, decode, linktype = self.ring, self.decoder.decode, self.linktype
+        thread = self._thread
+        while True:
+            batch = ring.drain(self.batch)
+            if not batch:
+                if not thread.is_alive() and not len(ring):
+                    break
+                ring.wait(0.1)
+                continue
+            for ts_ns, raw in batch:
+                for frame in decode(ts_ns, linktype, raw):
+                    self.processed += 1
+                    yield frame
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        self._stop.set()
+        stop = getattr(self.raw_source, "stop", None)
+        if stop is not None:
+            stop()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self.raw_source.close()
+
+    def stats(self):
+        inner = getattr(self.raw_source, "stats", None)
+        st = dict(inner()) if inner is not None else {}
+        ring = self.ring
+        st.update(
+            received=ring.pushed + ring.dropped,
+            processed=self.processed,
+            drained=ring.drained,
+            ring_dropped=ring.dropped,
+            ring_truncated=ring.truncated,
+            ring_depth=len(ring),
+            ring_high_water=ring.high_water,
+        )
+        return st
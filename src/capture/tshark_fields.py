@@ -0,0 +1,198 @@
+# src/capture/tshark_fields.py
+"""
+tshark fields-mode backend: one `tshark -T fields` process, parsed line by
+line, instead of pyshark's per-packet PDML/XML parsing.
+
+tshark still does the dissecting (FC3/4 register numbers come from its
+request/response tracking, as with pyshark); each output line is one
+frame of tab-separated fields, multiple occurrences joined by ",".
+
+When tshark reassembles an ADU across TCP segments, tcp.payload of the
+frame it reports it on holds only that segment's part, so the ADU cannot
+be rebuilt from the fields output. Such lines are counted as "partial"
+in stats() rather than dropped silently.
+"""
+import subprocess
+import tempfile
+
+from capture.base import PacketSource
+from capture.native_packet import MODBUS_TCP_PORT
+from modbus.coils import decode_fc5_pdu, decode_fc15_pdu
+from modbus.bitmap import CoilBitmap
+from modbus.correlation import TransactionTable, resolve_span
+from modbus.frame import ModbusFrame, pack_ip
+from modbus.pdu import payload_bytes, split_adus
+
+__all__ = ["FIELDS", "TsharkError", "TsharkNotFoundError", "parse_epoch_ns", "parse_fields_line",
+           "TsharkFieldsSource"]
+
+FIELDS = (
+    "frame.time_epoch",
+    "ip.src",
+    "ip.dst",
+    "tcp.srcport",
+    "tcp.dstport",
+    "mbtcp.trans_id",
+    "mbtcp.unit_id",
+    "modbus.func_code",
+    "modbus.regnum16",
+    "modbus.regval_uint16",
+    "tcp.payload",
+)
+_NFIELDS = len(FIELDS)
+_EMPTY = memoryview(b"")
+
+
+class TsharkNotFoundError(FileNotFoundError):
+    pass
+
+
+class TsharkError(RuntimeError):
+    """tshark exited with an error."""
+
+
+def parse_epoch_ns(s):
+    """"1700000000.500000000" -> ns, without going through float."""
+    sec, _, frac = s.partition(".")
+    return int(sec) * 1_000_000_000 + int((frac + "000000000")[:9])
+
+
+def _ints(s):
+    return [int(x) for x in s.split(",")] if s else []
+
+
+def _dissected_values(fc, regnums, regvals, pdu):
+    """{addr: value} as parse_register_map/parse_fc5/parse_fc15 return it."""
+    if fc in (3, 4):
+        return dict(zip(_ints(regnums), _ints(regvals)))
+    if fc == 5:
+        hit = decode_fc5_pdu(pdu)
+        return {hit[0]: hit[1]} if hit else {}
+    hit = decode_fc15_pdu(pdu)
+    return CoilBitmap(*hit).to_dict() if hit else {}
+
+
+def parse_fields_line(line, transactions, on_partial=None):
+    """
+    One tshark fields line -> list of ModbusFrames (one per ADU in the
+    frame). Lines that do not carry a Modbus PDU yield []. on_partial() is
+    called for a Modbus line whose payload ends in (or is only) part of
+    an ADU, which is lost.
+    """
+    f = line.rstrip("\r\n").split("\t")
+    if len(f) < _NFIELDS or not f[7]:
+        return []
+    ts_ns = parse_epoch_ns(f[0])
+    src, dst = pack_ip(f[1]), pack_ip(f[2])
+    sport = int(f[3]) if f[3] else 0
+    dport = int(f[4]) if f[4] else 0
+    is_response = sport == MODBUS_TCP_PORT
+    flow = (dst, dport, src, sport) if is_response else (src, sport, dst, dport)
+
+    payload = payload_bytes(f[10]) if f[10] else b""
+    adus = split_adus(payload)
+    if on_partial is not None and sum(map(len, adus)) < len(payload):
+        on_partial()
+    if not adus:
+        return []
+    single = len(adus) == 1
+
+    out = []
+    for adu in adus:
+        adu = bytes(adu)
+        pdu = memoryview(adu)[7:]
+        tid = (adu[0] << 8) | adu[1]
+        unit = adu[6]
+        fc = pdu[0]
+        if single and fc in (3, 4, 5, 15):
+            # tshark's register numbers only map 1:1 onto a lone ADU
+            values = _dissected_values(fc, f[8], f[9], pdu)
+            address, quantity = (min(values), len(values)) if values else (-1, 0)
+        else:
+            values = None
+            address, quantity = resolve_span(transactions, flow, unit, tid, pdu, is_response, ts_ns)
+        out.append(ModbusFrame(ts_ns, src, dst, sport, dport, unit, tid, fc,
+                               address, quantity, pdu, is_response, values))
+    return out
+
+
+class TsharkFieldsSource(PacketSource):
+    """
+    Replay a capture file (pcap_path) or sniff an interface (iface) through
+    a single tshark process in fields mode.
+    """
+
+    def __init__(self, pcap_path=None, iface=None, src=None, dst=None,
+                 port=MODBUS_TCP_PORT, tshark_path="tshark"):
+        if bool(pcap_path) == bool(iface):
+            raise ValueError("exactly one of pcap_path or iface is required")
+        self.pcap_path = pcap_path
+        self.iface = iface
+        self.src = src
+        self.dst = dst
+        self.port = port
+        self.tshark_path = tshark_path
+        self.lines = 0
+        self.frames_out = 0
+        self.partial = 0
+        self._proc = None
+
+    def command(self):
+        dfilter = f"modbus && tcp.port == {self.port}"
+        if self.src:
+            dfilter += f" && ip.src == {self.src}"
+        if self.dst:
+            dfilter += f" && ip.dst == {self.dst}"
+        cmd = [self.tshark_path, "-n", "-l"]
+        if self.pcap_path:
+            cmd += ["-r", str(self.pcap_path)]
+        else:
+            cmd += ["-i", self.iface, "-f", f"tcp port {self.port}"]
+        cmd += ["-Y", dfilter, "-T", "fields", "-E", "separator=/t",
+                "-E", "occurrence=a", "-E", "aggregator=,"]
+        for name in FIELDS:
+            cmd += ["-e", name]
+        return cmd
+
+    def frames(self):
+        transactions = TransactionTable()
+        with tempfile.TemporaryFile() as err:
+            try:
+                self._proc = proc = subprocess.Popen(
+                    self.command(), stdout=subprocess.PIPE, stderr=err,
+                    encoding="ascii", errors="replace", bufsize=1 << 16,
+                )
+            except FileNotFoundError as e:
+                raise TsharkNotFoundError(f"tshark not found: {self.tshark_path}") from e
+            try:
+                for line in proc.stdout:
+                    self.lines += 1
+                    frames = parse_fields_line(line, transactions, self._count_partial)
+                    self.frames_out += len(frames)
+                    yield from frames
+            finally:
+                self.close()
+            if proc.returncode not in (0, None, -15):
+                err.seek(0)
+                msg = err.read().decode(errors="replace").strip()
+                raise TsharkError(f"tshark exited with {proc.returncode}: {msg[-500:]}")
+
+    def _count_partial(self):
+        self.partial += 1
+
+    def stats(self):
+        """Lines read from tshark, ModbusFrames yielded, lines whose ADU was partial (lost)."""
+        return {"lines": self.lines, "frames": self.frames_out, "partial": self.partial}
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
@@ -1,17 +1,26 @@
 # src/cli/modbus_watch.py
 import sys
+import json
 import signal
 import argparse
-from datetime import timezone, datetime
-from pathlib import Path
 
-import pyshark
-
-from modbus.direction import normalize_func_code, get_packet_endpoints
-from modbus.registers import parse_register_map
-from modbus.coils import parse_fc5, parse_fc15
+try:
+    import pyshark
+except ImportError:  # the native backend runs without pyshark/tshark
+    pyshark = None
+
+from capture.tshark_fields import TsharkError, TsharkNotFoundError
+from modbus.tags import load_tags
+from modbus.watchset import WatchSet, watch_range
+from pipeline.core import Pipeline
+from pipeline.session_writer import ZSTD_OK
+from pipeline.sources import BACKENDS, BackendUnavailable, open_source
+from pipeline.stages import (
+    ConsoleStage, DecodeStage, MqttStage, SessionLogStage, StateStage, TagStage, TriggerStage,
+)
 from app_logging import log_err, log_info  # _ts not used
-from mqtt.client import init_mqtt, mqtt_publish  # safe even if paho missing
+from mqtt.client import close_mqtt, init_mqtt, mqtt_publish  # safe even if paho missing
+from mqtt.encoders import TriggerLayout, get_encoder
 
 
 def _build_args(argv=None):
@@ -28,6 +37,29 @@ def _build_args(argv=None):
     srcdst = ap.add_argument_group("source")
     srcdst.add_argument("--pcap", help="PCAP/PCAPNG file to replay")
     srcdst.add_argument("--iface", help='Live interface name, e.g. "Ethernet 4"')
+    srcdst.add_argument(
+        "--backend",
+        choices=list(BACKENDS),
+        default="pyshark",
+        help="Packet decoder: pyshark (tshark dissector, default), native "
+             "(no tshark: pure-Python pcap/pcapng reader, or AF_PACKET + BPF for --iface on Linux) "
+             "or tshark-fields (one tshark -T fields process, no pyshark)",
+    )
+    srcdst.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Decode a --pcap replay in N processes (native backend only); frames come out in "
+             "packet order, so output and deltas/triggers/sessions are the same as a "
+             "single-process replay. Default: 1",
+    )
+    srcdst.add_argument(
+        "--ring-slots",
+        type=int,
+        default=8192,
+        help="Live native capture: frames buffered between the capture thread and processing; "
+             "frames arriving while it is full are dropped and counted. 0 = no capture thread. Default: 8192",
+    )
 
     # Filters
     filt = ap.add_argument_group("filters")
@@ -35,8 +67,13 @@ def _build_args(argv=None):
         "--fc",
         type=int,
         default=3,
-        choices=[3, 4, 5, 15],
-        help="Modbus function code to watch (3, 4, 5, or 15). Default: 3",
+        choices=[1, 2, 3, 4, 5, 6, 15, 16, 23],
+        help="Modbus function code to watch (1, 2, 3, 4, 5, 6, 15, 16 or 23). Default: 3",
+    )
+    filt.add_argument(
+        "--all-fc",
+        action="store_true",
+        help="Watch every supported function code (and exception responses) in one pass; overrides --fc",
     )
     filt.add_argument("--src", help="Only packets with this source IP")
     filt.add_argument("--dst", help="Only packets with this destination IP")
@@ -46,28 +83,64 @@ def _build_args(argv=None):
     watch.add_argument(
         "--watch",
         nargs="+",
-        type=int,
+        type=watch_range,
         default=[100] + list(range(200, 211)),
-        help="Registers/Coils to print. Used for FC=3/4 (registers) and FC=5/15 (coils). Default: 100 and 200..210",
+        help="Registers/Coils to print: addresses and/or inclusive ranges, e.g. 100 200-210 40001-40100. "
+             "Used for FC=3/4/6/16/23 (registers) and FC=1/2/5/15 (coils/inputs). Default: 100 and 200..210",
     )
     ap.add_argument(
         "--deltas-only",
         action="store_true",
         help="Print only when watched values change from their last seen value",
     )
+    watch.add_argument(
+        "--tags",
+        metavar="FILE",
+        help="JSON tag map (see modbus/tags.py): typed/scaled values decoded from register blocks "
+             "are printed, written to session logs and added to trigger payloads",
+    )
 
     # Edge-triggered publishing (optional)
     trig = ap.add_argument_group("edge trigger (publish on change)")
     trig.add_argument(
         "--trigger-change-reg",
         type=int,
-        help="Register address to publish on any value change (FC=3/4). If omitted, no MQTT publishes happen.",
+        help="Register address to publish on any value change (FC=3/4/6/16/23). If omitted, no MQTT publishes happen.",
     )
     trig.add_argument(
         "--trigger-once",
         action="store_true",
         help="Publish only the first time the trigger condition is met (first change)",
     )
+    trig.add_argument(
+        "--trigger-debounce-ms",
+        type=float,
+        default=0,
+        metavar="MS",
+        help="Publish a change only after the value has held for MS (capture time); a flapping "
+             "register publishes its settled value once. Default: 0 (off)",
+    )
+    trig.add_argument(
+        "--trigger-deadband",
+        type=float,
+        default=0,
+        metavar="N",
+        help="Skip changes smaller than N from the last published value (hysteresis). Default: 0 (off)",
+    )
+    trig.add_argument(
+        "--trigger-max-rate",
+        type=float,
+        default=0,
+        metavar="PER_S",
+        help="Publish at most PER_S trigger events per second (token bucket); a change arriving "
+             "too early is held and the latest value published when a token frees up. Default: 0 (off)",
+    )
+    trig.add_argument(
+        "--trigger-burst",
+        type=int,
+        default=1,
+        help="Token bucket size for --trigger-max-rate (publishes allowed back to back). Default: 1",
+    )
 
     # Context to include when the trigger fires (e.g., 200 and 205)
     ap.add_argument(
@@ -81,15 +154,69 @@ def _build_args(argv=None):
     # Diagnostics / payload
     ap.add_argument(
         "--payload-format",
-        choices=["json", "text"],
+        choices=["json", "text", "binary"],
         default="json",
-        help="Publish JSON dict (default) or simple text payload",
+        help="Publish JSON dict (default; orjson when installed), simple text payload, or a compact "
+             "fixed-layout binary record per trigger (see mqtt/encoders.py; the layout is logged at start)",
+    )
+    ap.add_argument(
+        "--mqtt-topic",
+        metavar="TEMPLATE",
+        help="Topic for the default broker, optionally a template over payload fields such as "
+             "plant/{src}/{unit}/reg/{reg} (default: config.MQTT_TOPIC; routes to other "
+             "brokers/topics come from config.MQTT_ROUTES)",
+    )
+    ap.add_argument(
+        "--mqtt-batch-ms",
+        type=int,
+        help="Collect MQTT events for up to this many ms and publish one JSON list per topic "
+             "(default: config.MQTT_BATCH_MS; 0 = one message per event)",
+    )
+    ap.add_argument(
+        "--mqtt-batch-max",
+        type=int,
+        help="Publish a batch as soon as it holds this many events (default: config.MQTT_BATCH_MAX)",
+    )
+    ap.add_argument(
+        "--mqtt-coalesce",
+        action="store_true",
+        default=None,
+        help="Within a batch keep only the latest event per device, unit and register or rule match",
+    )
+    ap.add_argument(
+        "--mqtt-spool",
+        metavar="DIR",
+        help="Store-and-forward: spool MQTT messages to DIR while the broker is unreachable and "
+             "replay them in order after reconnect (default: config.MQTT_SPOOL_DIR; empty = off)",
+    )
+    ap.add_argument(
+        "--mqtt-spool-max-mb",
+        type=float,
+        help="Spool size cap; the oldest messages are dropped (and counted) beyond it "
+             "(default: config.MQTT_SPOOL_MAX_MB)",
+    )
+    ap.add_argument(
+        "--mqtt-spool-max-age",
+        type=float,
+        metavar="SECONDS",
+        help="Drop (and count) spooled messages older than this instead of replaying them "
+             "(default: config.MQTT_SPOOL_MAX_AGE_S; 0 = no limit)",
+    )
+    ap.add_argument(
+        "--mqtt-drain-rate",
+        type=float,
+        help="Spooled messages replayed per second after reconnect (default: config.MQTT_SPOOL_DRAIN_RATE)",
     )
     ap.add_argument(
         "--trace-triggers",
         action="store_true",
         help="Log why triggers did or didn't fire (diagnostic)",
     )
+    ap.add_argument(
+        "--stage-stats",
+        action="store_true",
+        help="Log per-stage frame counts and time spent on exit (diagnostic)",
+    )
     ap.add_argument(
         "--echo-trigger",
         action="store_true",
@@ -127,21 +254,62 @@ def _build_args(argv=None):
         default=4,
         help="Register value that stops a session (default: 4)",
     )
+    loggrp.add_argument(
+        "--session-flush-ms",
+        type=int,
+        default=200,
+        help="Session lines are buffered and written by a background thread at least this often "
+             "(default: 200, minimum 1); everything left is written when the session stops or on Ctrl+C",
+    )
+    loggrp.add_argument(
+        "--session-rotate-mb",
+        type=float,
+        default=0,
+        help="Start a new part file (name.001.txt, ...) after this many MB of log text (default: 0 = never)",
+    )
+    loggrp.add_argument(
+        "--session-rotate-min",
+        type=float,
+        default=0,
+        help="Start a new part file after this many minutes (default: 0 = never)",
+    )
+    loggrp.add_argument(
+        "--session-compress",
+        choices=["gzip", "zstd"],
+        help="Compress session files while writing (.txt.gz / .txt.zst; zstd needs the zstandard package)",
+    )
 
     return ap.parse_args(argv)
 
 
-def _build_payload(args, ts, src, dst, fc, trigger_reg, trigger_val, context_regs):
+class _NoTShark(Exception):
+    """Placeholder so the except clause below is valid without pyshark."""
+
+
+def _tshark_not_found():
+    try:
+        return pyshark.capture.capture.TSharkNotFoundException
+    except AttributeError:
+        return _NoTShark
+
+
+def _build_payload(args, ts, src, dst, fc, trigger_reg, trigger_val, context_regs, tags=None, unit=None):
     """
     Return payload for mqtt_publish(payload):
-    - if args.payload_format == 'json': dict (client.py json.dumps it)
+    - if args.payload_format == 'json' or 'binary': dict (the MQTT encoder
+      serializes it; binary wants ts as capture time in ns)
     - else: str
+    tags ({name: value} from --tags) are added only when there are any;
+    unit (the Modbus unit id, for --mqtt-topic templates) when given.
     """
     if args.payload_format == "text":
         ctx = ", ".join(f"{k}={v}" for k, v in sorted(context_regs.items()))
-        return f"{ts} {src}->{dst} fc={fc} reg={trigger_reg} value={trigger_val} ctx[{ctx}]"
-    # JSON dict (mqtt client json.dumps it)
-    return {
+        text = f"{ts} {src}->{dst} fc={fc} reg={trigger_reg} value={trigger_val} ctx[{ctx}]"
+        if tags:
+            text += " tags[" + ", ".join(f"{k}={v}" for k, v in sorted(tags.items())) + "]"
+        return text
+    # dict (the mqtt client's encoder serializes it)
+    payload = {
         "ts": ts,
         "src": src,
         "dst": dst,
@@ -150,6 +318,64 @@ def _build_payload(args, ts, src, dst, fc, trigger_reg, trigger_val, context_reg
         "value": trigger_val,
         "context": context_regs,
     }
+    if unit is not None:
+        payload["unit"] = unit
+    if tags:
+        payload["tags"] = tags
+    return payload
+
+
+def _trigger_layout(args, tagmap=None):
+    """Binary record layout of the trigger payloads these args produce."""
+    tags = [(t.name, t.count) for t in tagmap.tags] if tagmap else ()
+    return TriggerLayout([str(r) for r in args.include_regs], tags)
+
+
+def _build_pipeline(args, source=None, tagmap=None):
+    """The watch pipeline for parsed CLI args (see pipeline.stages)."""
+    watch = list(args.watch)
+    if args.echo_trigger and args.trigger_change_reg is not None:
+        watch.append(args.trigger_change_reg)
+    watch = WatchSet(watch)
+
+    stages = [DecodeStage(fc=None if args.all_fc else args.fc)]
+    if args.tags:
+        if tagmap is None:
+            tagmap = load_tags(args.tags)
+        stages.append(TagStage(tagmap, deltas_only=args.deltas_only))
+    if args.session_log:
+        stages.append(SessionLogStage(
+            args.log_dir, args.session_start_reg, args.session_start_val, args.session_stop_val,
+            log=log_info, log_err=log_err, flush_ms=args.session_flush_ms,
+            rotate_bytes=int(args.session_rotate_mb * (1 << 20)), rotate_s=args.session_rotate_min * 60,
+            compress=args.session_compress,
+        ))
+    state = StateStage(watch, deltas_only=args.deltas_only)
+    stages.append(state)
+    if args.trigger_change_reg is not None:
+        binary = args.payload_format == "binary"
+
+        def build(ctx, reg, value, context):
+            ts = ctx.frame.ts_ns if binary else ctx.wall
+            return _build_payload(args, ts, ctx.src, ctx.dst, ctx.frame.fc,
+                                  trigger_reg=reg, trigger_val=value, context_regs=context,
+                                  tags=ctx.tags, unit=ctx.frame.unit)
+
+        mqtt_stage = MqttStage(mqtt_publish)  # publishes dict as JSON to the routed topic(s)
+        stages.append(TriggerStage(
+            state, args.trigger_change_reg, build, include_regs=args.include_regs,
+            once=args.trigger_once, trace=args.trace_triggers, log=log_info,
+            debounce_ms=args.trigger_debounce_ms, deadband=args.trigger_deadband,
+            max_rate=args.trigger_max_rate, burst=args.trigger_burst, release=mqtt_stage.send,
+        ))
+        stages.append(mqtt_stage)
+    stages.append(ConsoleStage(log_info))
+    return Pipeline(stages, source)
+
+
+def _log_layout(layout):
+    """Binary trigger layouts, the declared one and any compiled later, for consumers to decode with."""
+    log_info(f"[+] Binary trigger layout: {json.dumps(layout.describe())}")
 
 
 def main(argv=None):
@@ -157,258 +383,84 @@ def main(argv=None):
     if not (args.pcap or args.iface):
         log_err("Choose one: --pcap <file> or --iface <name>")
         return 2
+    if args.workers > 1 and (args.backend != "native" or not args.pcap):
+        log_err("--workers needs --backend native and --pcap")
+        return 2
+    if args.session_log and args.session_compress == "zstd" and not ZSTD_OK:
+        log_err("--session-compress zstd needs the zstandard package (pip install zstandard)")
+        return 2
+
+    tagmap = load_tags(args.tags) if args.tags else None
+    encoder_opts = {}
+    if args.payload_format == "binary":
+        layout = _trigger_layout(args, tagmap)
+        encoder_opts["layouts"] = [layout]
+        encoder_opts["on_layout"] = _log_layout
+        if args.trigger_change_reg is not None:
+            _log_layout(layout)
 
     # Initialize shared MQTT client (reads config.py).
     # Safe to call even if we never publish.
-    init_mqtt()  # mqtt_publish encodes dict payload to JSON and publishes (QoS=1).
-
-    trigger_fired = False  # for --trigger-once
-    last_published_reg = {}  # reg -> last value we actually published (edge trigger)
-
-    # Session logging state
-    session_active = False
-    session_file = None
-    prev_start_reg_val = None  # previous observed value for session-start-reg (edge detection)
-
-    def _now_name() -> str:
-        # UTC timestamped filename: YYYY-MM-DD_HH-MM-SS.txt
-        return datetime.now(timezone.utc).strftime("%Y-%m-%d_%H-%M-%S") + ".txt"
+    # mqtt_publish encodes dict payload (JSON or binary) and publishes (QoS=1), batched if asked.
+    init_mqtt(
+        batch_ms=args.mqtt_batch_ms, batch_max=args.mqtt_batch_max, coalesce=args.mqtt_coalesce,
+        spool_dir=args.mqtt_spool, spool_max_mb=args.mqtt_spool_max_mb,
+        spool_max_age_s=args.mqtt_spool_max_age, drain_rate=args.mqtt_drain_rate,
+        topic=args.mqtt_topic, encoder=get_encoder(args.payload_format, **encoder_opts),
+    )
 
-    def _open_session():
-        nonlocal session_active, session_file
-        try:
-            Path(args.log_dir).mkdir(parents=True, exist_ok=True)
-            fname = Path(args.log_dir) / _now_name()
-            session_file = fname.open("w", encoding="utf-8")
-            session_active = True
-            log_info(f"[+] Session log started: {fname}")
-        except Exception as e:
-            log_err(f"Failed to open session log: {e}")
-
-    def _close_session():
-        nonlocal session_active, session_file
-        if session_file:
-            try:
-                session_file.flush()
-                session_file.close()
-            except Exception:
-                pass
-        session_file = None
-        if session_active:
-            log_info("[+] Session log stopped")
-        session_active = False
-
-    def _write_session(line: str):
-        if session_active and session_file:
-            try:
-                session_file.write(line + "\n")
-                session_file.flush()
-            except Exception as e:
-                log_err(f"Session write error: {e}")
-
-    # Wireshark display filter (post-capture filter)
-    display_df = "modbus && tcp.port == 502"
-    if args.src:
-        display_df += f" && ip.src == {args.src}"
-    if args.dst:
-        display_df += f" && ip.dst == {args.dst}"
-
-    cap = None
+    source = None
+    pipe = _build_pipeline(args, tagmap=tagmap)
     try:
-        if args.pcap:
-            cap = pyshark.FileCapture(args.pcap, display_filter=display_df, keep_packets=False)
-            iterator = cap
-            log_info(f"[+] Replaying PCAP: {args.pcap}")
-        else:
-            bpf = "tcp port 502"
-            cap = pyshark.LiveCapture(interface=args.iface, display_filter=display_df, bpf_filter=bpf)
-            iterator = cap.sniff_continuously()
-            log_info(f"[+] Live on {args.iface} (Ctrl-C to stop)")
-
-        WATCH = set(args.watch)
-        if args.echo_trigger and args.trigger_change_reg is not None:
-            WATCH.add(args.trigger_change_reg)
-
-        # State caches
-        REG_STATE = {}  # used for console delta printing of WATCHed registers
-        REG_LAST = {}   # last seen value for ANY register (for context payloads)
-        COIL_STATE = {} # used for deltas-only for coils
+        source = open_source(
+            args.backend, pcap=args.pcap, iface=None if args.pcap else args.iface,
+            src=args.src, dst=args.dst, workers=args.workers, ring_slots=args.ring_slots,
+        )
+        pipe.source = source
+        log_info(f"[+] {source.label}")
 
         def _stop(sig, frame):
             log_info("\n[!] Stopping...")
             try:
-                if cap:
-                    cap.close()
+                # Session file, held trigger values and the source (the finally below sees it closed)
+                pipe.close()
             finally:
-                # Ensure any active session file is closed
-                _close_session()
                 sys.exit(0)
 
         signal.signal(signal.SIGINT, _stop)
 
-        for pkt in iterator:
-            if not hasattr(pkt, "modbus"):
-                continue
-
-            m = pkt.modbus
-            fc = normalize_func_code(m)
-            src, dst, _, _ = get_packet_endpoints(pkt)
-            wall = pkt.sniff_time.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
-
-            # --- Session logging: detect start/stop edges on start-reg using FC 3/4 frames ---
-            # Also write ALL Modbus traffic (FC 3/4/5/15) to the session file while active.
-            registers_for_watch = None  # reuse if fc in (3,4)
-
-            if fc in (3, 4):
-                registers = parse_register_map(m, fc=fc) or {}
-                registers_for_watch = registers  # reuse later for watch print
-
-                if args.session_log:
-                    key = args.session_start_reg
-                    if key in registers:
-                        cur = registers[key]
-                        # FIRST observation: if it already equals the start value, open a session now
-                        if prev_start_reg_val is None:
-                            if cur == args.session_start_val and not session_active:
-                                _open_session()
-                            prev_start_reg_val = cur
-                        # Subsequent observation: open on not-start -> start transition
-                        elif (not session_active) and (prev_start_reg_val != args.session_start_val) and (cur == args.session_start_val):
-                            _open_session()
-                            prev_start_reg_val = cur
-                        # Stop: when active and we observe a transition to stop value
-                        elif session_active and (prev_start_reg_val != args.session_stop_val) and (cur == args.session_stop_val):
-                            _close_session()
-                            prev_start_reg_val = cur
-                        else:
-                            prev_start_reg_val = cur
-
-                # If session is active, log all register pairs (unfiltered)
-                if session_active:
-                    all_pairs = ", ".join(f"{r}={v}" for r, v in sorted(registers.items()))
-                    _write_session(f"[{wall}] [{src}->{dst}] FC={fc} {all_pairs}")
-
-            elif fc == 5:
-                coils = parse_fc5(pkt, m) or {}
-                if session_active:
-                    all_pairs = ", ".join(f"{a}={b}" for a, b in sorted(coils.items()))
-                    _write_session(f"[{wall}] [{src}->{dst}] FC=5 {all_pairs}")
-
-            elif fc == 15:
-                coils = parse_fc15(pkt, m) or {}
-                if session_active:
-                    all_pairs = ", ".join(f"{a}={b}" for a, b in sorted(coils.items()))
-                    _write_session(f"[{wall}] [{src}->{dst}] FC=15 {all_pairs}")
-
-            # --- From here on: honor --fc for "watch" printing and trigger publishing ---
-            watch_fc = (fc == args.fc)
-            if not watch_fc:
-                continue
-
-            # -------- FC 3/4: Registers (watch printing + optional trigger publish) --------
-            if fc in (3, 4):
-                registers = registers_for_watch if registers_for_watch is not None else (parse_register_map(m, fc=fc) or {})
-
-                # Update last-seen cache for ALL registers in this frame (for context payloads)
-                for r, v in registers.items():
-                    REG_LAST[r] = v  # ensures we can include latest 200/205 later
-
-                # Edge-trigger: publish only when the trigger register's value changes
-                trig_reg = args.trigger_change_reg
-                if trig_reg is not None and trig_reg in registers:
-                    cur_val = registers[trig_reg]
-                    prev_pub = last_published_reg.get(trig_reg)
-                    if prev_pub is None:
-                        # First observation: initialize but do NOT publish
-                        last_published_reg[trig_reg] = cur_val
-                        if args.trace_triggers:
-                            log_info(f"[trace] init change-reg {trig_reg}={cur_val}")
-                    elif cur_val != prev_pub:
-                        if not (args.trigger_once and trigger_fired):
-                            context = {str(r): REG_LAST.get(r) for r in args.include_regs}
-                            if args.trace_triggers:
-                                ctx_str = ", ".join(f"{k}={v}" for k, v in sorted(context.items()))
-                                log_info(f"[trace] CHANGE reg={trig_reg} {prev_pub}->{cur_val} ctx[{ctx_str}] -> PUBLISH")
-                            payload = _build_payload(
-                                args, wall, src, dst, fc,
-                                trigger_reg=trig_reg, trigger_val=cur_val,
-                                context_regs=context
-                            )
-                            mqtt_publish(payload)  # publishes dict as JSON to configured topic
-                            last_published_reg[trig_reg] = cur_val
-                            if args.trigger_once:
-                                trigger_fired = True
-                        elif args.trace_triggers:
-                            log_info("[trace] trigger-once already fired; skipping publish")
-                    elif args.trace_triggers:
-                        log_info(f"[trace] no change reg={trig_reg} stays {cur_val}")
-
-                # Console printing for watched set
-                matched = {r: v for r, v in registers.items() if r in WATCH}
-                if not matched:
-                    continue
-                if args.deltas_only:
-                    changed = {r: v for r, v in matched.items() if REG_STATE.get(r) != v}
-                    # Update state after computing changes
-                    REG_STATE.update(matched)
-                    if not changed:
-                        continue
-                    to_print = changed
-                else:
-                    to_print = matched
-                    REG_STATE.update(matched)
-                pairs = ", ".join(f"{r}={v}" for r, v in sorted(to_print.items()))
-                log_info(f"[{wall}] [{src}->{dst}] FC={fc} {pairs}")
-
-            # -------- FC 5: Write Single Coil (watch printing only) --------
-            elif fc == 5:
-                coils = parse_fc5(pkt, m) or {}
-                matched = {a: b for a, b in coils.items() if a in WATCH}
-                if not matched:
-                    continue
-                if args.deltas_only:
-                    changed = {a: b for a, b in matched.items() if COIL_STATE.get(a) != b}
-                    COIL_STATE.update(matched)
-                    if not changed:
-                        continue
-                    to_print = changed
-                else:
-                    to_print = matched
-                    COIL_STATE.update(matched)
-                pairs = ", ".join(f"{a}={b}" for a, b in sorted(to_print.items()))
-                log_info(f"[{wall}] [{src}->{dst}] FC=5 {pairs}")
-
-            # -------- FC 15: Write Multiple Coils (watch printing only) --------
-            elif fc == 15:
-                coils = parse_fc15(pkt, m) or {}
-                matched = {a: b for a, b in coils.items() if a in WATCH}
-                if not matched:
-                    continue
-                if args.deltas_only:
-                    changed = {a: b for a, b in matched.items() if COIL_STATE.get(a) != b}
-                    COIL_STATE.update(matched)
-                    if not changed:
-                        continue
-                    to_print = changed
-                else:
-                    to_print = matched
-                    COIL_STATE.update(matched)
-                pairs = ", ".join(f"{a}={b}" for a, b in sorted(to_print.items()))
-                log_info(f"[{wall}] [{src}->{dst}] FC=15 {pairs}")
-
+        pipe.run()
         return 0
 
-    except pyshark.capture.capture.TSharkNotFoundException:
+    except BackendUnavailable as e:
+        log_err(str(e))
+        return 1
+    except (_tshark_not_found(), TsharkNotFoundError):
         log_err("tshark not found. Install Wireshark/TShark and ensure it's on PATH.")
         return 1
+    except TsharkError as e:
+        log_err(str(e))
+        return 1
     except PermissionError:
         log_err("Permission denied. On Windows, run your shell as Administrator for live capture.")
         return 1
     finally:
         try:
-            if cap:
-                cap.close()
-            _close_session()  # ensure file is closed
+            pipe.close()  # session file, held trigger values, then the source (pipe.source)
+            if source is not None:
+                st = source.stats()
+                if st:
+                    log_info("[+] Capture stats: " + " ".join(f"{k}={v}" for k, v in st.items()))
+            trigger = pipe.stage("trigger")
+            if trigger is not None and (args.trigger_debounce_ms or args.trigger_deadband
+                                        or args.trigger_max_rate):
+                log_info("[+] Trigger stats: " + " ".join(f"{k}={v}" for k, v in trigger.stats().items()))
+            st = close_mqtt()  # flush pending batches
+            if st:
+                log_info("[+] MQTT stats: " + " ".join(f"{k}={v}" for k, v in st.items()))
+            if args.stage_stats:
+                for name, st in pipe.stats().items():
+                    log_info(f"[+] Stage {name}: frames={st['frames']} ms={st['ms']} us/frame={st['us_per_frame']}")
         except Exception:
             pass
 
@@ -11,6 +11,25 @@ MQTT_USERNAME = ""
 MQTT_PASSWORD = ""
 MQTT_KEEPALIVE = 60
 
+# Batched publishing (mqtt/batch.py): 0 ms = one message per event (default)
+MQTT_BATCH_MS = 0
+MQTT_BATCH_MAX = 100
+MQTT_COALESCE = False
+
+# Store-and-forward (mqtt/spool.py): "" = off; otherwise messages published
+# while the broker is down are spooled to this directory and replayed later
+MQTT_SPOOL_DIR = ""
+MQTT_SPOOL_MAX_MB = 256
+MQTT_SPOOL_MAX_AGE_S = 0      # 0 = keep until replayed or pushed out by the size cap
+MQTT_SPOOL_DRAIN_RATE = 50    # replayed messages per second after reconnect
+
+# Topic routing (mqtt/routing.py). MQTT_TOPIC above may itself be a template,
+# e.g. "plant/{src}/{unit}/reg/{reg}". Each extra broker gets its own
+# persistent connection; routes pick payloads by rule name or payload field.
+MQTT_BROKERS = {}   # e.g. {"historian": {"host": "192.168.179.12", "port": 1883}}
+MQTT_ROUTES = []    # e.g. [{"broker": "historian", "topic": "hist/{src}/{rule}",
+                    #        "rules": ["pulse_box_started", "pulse_box_stopped"]}]
+
 # Pulse box
 PULSE_BOX_IP = "10.0.0.71"
 PULSE_BOX_STATE_REG = 100
@@ -18,9 +37,11 @@ PULSE_BOX_MM1_REG = 200
 PULSE_BOX_MM2_REG = 201
 PULSE_BOX_MUT1_REG = 202
 
-WATCH_REGISTERS = {
-    PULSE_BOX_STATE_REG: {"eq": 3},
-    PULSE_BOX_STATE_REG: {"eq": 4},
-}
+# Watch rules (see modbus/rules.py): one dict per rule, so one register can
+# carry several. Optional "device" limits a rule to one server IP.
+WATCH_REGISTERS = [
+    {"register": PULSE_BOX_STATE_REG, "eq": 3, "name": "pulse_box_started"},
+    {"register": PULSE_BOX_STATE_REG, "eq": 4, "name": "pulse_box_stopped"},
+]
 
-WATCH_COILS = {}
+WATCH_COILS = []
@@ -0,0 +1,119 @@
+# src/modbus/bitmap.py
+"""
+Packed coil/discrete-input bitmaps.
+
+A CoilBitmap keeps bits the way they travel on the wire (LSB-first within
+each byte) plus a base address, so an FC15 request of 2000 coils is one
+250-byte copy rather than 2000 dict entries. CoilState keeps the last seen
+value of every coil as two Python ints and reports changes with XOR.
+"""
+from .pdu import unpack_bits_from_bytes
+
+__all__ = ["CoilBitmap", "CoilState", "bit_positions"]
+
+
+# byte value -> offsets of its set bits
+_POSITIONS = tuple(tuple(i for i in range(8) if (b >> i) & 1) for b in range(256))
+
+
+def bit_positions(n):
+    """Indices of the set bits of a non-negative int, ascending."""
+    out = []
+    if not n:
+        return out
+    for i, b in enumerate(n.to_bytes((n.bit_length() + 7) // 8, "little")):
+        if b:
+            base = i << 3
+            out.extend([base + p for p in _POSITIONS[b]])
+    return out
+
+
+class CoilBitmap:
+    __slots__ = ("base", "count", "bits")
+
+    def __init__(self, base=0, count=0, packed=b""):
+        count = min(count, len(packed) * 8)
+        bits = bytearray(packed[: (count + 7) // 8])
+        if count % 8:
+            bits[-1] &= 0xFF >> (8 - count % 8)  # clear padding bits past quantity
+        self.base = base
+        self.count = count
+        self.bits = bits
+
+    @classmethod
+    def from_dict(cls, coils):
+        """{addr: bit} covering a contiguous address run (what FC5/FC15 carry)."""
+        if not coils:
+            return cls()
+        base = min(coils)
+        n = 0
+        for addr, bit in coils.items():
+            if bit:
+                n |= 1 << (addr - base)
+        count = max(coils) - base + 1
+        return cls(base, count, n.to_bytes((count + 7) // 8, "little"))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, addr):
+        return 0 <= addr - self.base < self.count
+
+    def __getitem__(self, addr):
+        off = addr - self.base
+        if not 0 <= off < self.count:
+            raise KeyError(addr)
+        return (self.bits[off >> 3] >> (off & 7)) & 1
+
+    def get(self, addr, default=None):
+        off = addr - self.base
+        if not 0 <= off < self.count:
+            return default
+        return (self.bits[off >> 3] >> (off & 7)) & 1
+
+    def __eq__(self, other):
+        if not isinstance(other, CoilBitmap):
+            return NotImplemented
+        return (self.base, self.count, self.bits) == (other.base, other.count, other.bits)
+
+    def __repr__(self):
+        return f"CoilBitmap(base={self.base}, count={self.count}, bits={bytes(self.bits).hex()})"
+
+    def as_int(self):
+        """Bit i of the result is the coil at base + i."""
+        return int.from_bytes(self.bits, "little")
+
+    def items(self):
+        """(addr, bit) pairs in address order."""
+        return zip(range(self.base, self.base + self.count), unpack_bits_from_bytes(self.bits, self.count))
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+class CoilState:
+    """
+    Last seen value of every coil, as a value int and a known-mask int
+    (bit n = coil n). update() returns the addresses that changed.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.known = 0
+
+    def update(self, bitmap):
+        """Merge a CoilBitmap; return changed (or first-seen) addresses, ascending."""
+        if not bitmap.count:
+            return []
+        base = bitmap.base
+        span = (1 << bitmap.count) - 1
+        new = bitmap.as_int()
+        diff = (((self.value >> base) ^ new) | ~(self.known >> base)) & span
+        self.value = (self.value & ~(span << base)) | (new << base)
+        self.known |= span << base
+        return [base + i for i in bit_positions(diff)]
+
+    def get(self, addr, default=None):
+        if not (self.known >> addr) & 1:
+            return default
+        return (self.value >> addr) & 1
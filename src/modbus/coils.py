@@ -1,18 +1,60 @@
 # src/modbus/coils.py
 
+import struct
+
+from .bitmap import CoilBitmap, bit_positions
 from .field_finder import find_field
-from .pdu import get_modbus_pdu_bytes, unpack_bits_from_bytes
+from .pdu import get_modbus_pdu_bytes
+
+__all__ = [
+    "decode_fc5_pdu",
+    "decode_fc15_pdu",
+    "parse_fc5",
+    "parse_fc15",
+    "check_coil_rules",
+]
+
+_u16x2 = struct.Struct(">HH")
+
+
+def decode_fc5_pdu(pdu):
+    """
+    FC=5 PDU (request or echoed response) -> (address, bit) or None.
+    bit is 1 for 0xFF00 and 0 for anything else.
+    """
+    if len(pdu) < 5 or pdu[0] != 0x05:
+        return None
+    addr, outv = _u16x2.unpack_from(pdu, 1)
+    return addr, 1 if outv == 0xFF00 else 0
 
-__all__ = ["parse_fc5", "parse_fc15", "check_coil_rules"]
+
+def decode_fc15_pdu(pdu):
+    """
+    FC=15 request PDU -> (start address, quantity, packed coil bytes) or None.
+    The packed bytes are a memoryview slice of pdu (LSB-first per byte).
+    """
+    if len(pdu) < 6 or pdu[0] != 0x0F:
+        return None
+    addr, qty = _u16x2.unpack_from(pdu, 1)
+    bytecnt = pdu[5]
+    packed = memoryview(pdu)[6 : 6 + bytecnt]
+    if not packed:
+        return None
+    return addr, qty, packed
 
 
 def parse_fc5(packet, m):
     """
     FC=5 (Write Single Coil)
     Returns {address: bit}, where bit is 1 for 0xFF00 and 0 for 0x0000.
-    Tries dissector fields first, then falls back to raw PDU parsing.
+    Decodes the raw PDU bytes; falls back to dissector fields when the
+    packet carries no TCP payload.
     """
-    # Try to resolve via fields
+    pdu = get_modbus_pdu_bytes(packet)
+    if pdu is not None:
+        hit = decode_fc5_pdu(pdu)
+        return {hit[0]: hit[1]} if hit else {}
+
     addr, _ = find_field(
         m,
         ["ref_num", "reference_number", "coil_address", "address"],
@@ -24,66 +66,53 @@ def parse_fc5(packet, m):
         as_int=True,
     )
     if addr is not None and outv is not None:
-        bit = 1 if outv == 0xFF00 else 0
-        return {addr: bit}
-
-    # Fallback: raw PDU
-    pdu = get_modbus_pdu_bytes(packet)
-    if not pdu or len(pdu) < 5 or pdu[0] != 0x05:
-        return {}
-    addr = (pdu[1] << 8) | pdu[2]
-    outv = (pdu[3] << 8) | pdu[4]
-    bit = 1 if outv == 0xFF00 else 0
-    return {addr: bit}
+        return {addr: 1 if outv == 0xFF00 else 0}
+    return {}
 
 
-def parse_fc15(packet, m):
+def parse_fc15(packet, m, packed=False):
     """
     FC=15 (Write Multiple Coils)
-    Returns flat dict {address: bit}.
-    Uses field names when possible; otherwise falls back to raw PDU.
+    Returns flat dict {address: bit}, decoded from the raw PDU bytes, or a
+    CoilBitmap when packed=True.
     """
-    # Try to read via fields
-    addr, _ = find_field(
-        m,
-        ["ref_num", "reference_number", "address", "starting_address"],
-        as_int=True,
-    )
-    qty, _ = find_field(
-        m,
-        ["quantity", "ref_cnt", "quantity_of_outputs", "quantity_of_coils"],
-        as_int=True,
-    )
-
     pdu = get_modbus_pdu_bytes(packet)
-    if not pdu or len(pdu) < 6 or pdu[0] != 0x0F:
-        return {}
-
-    if addr is None or qty is None:
-        # Decode from PDU when fields are missing
-        addr = (pdu[1] << 8) | pdu[2]
-        qty = (pdu[3] << 8) | pdu[4]
-        bytecnt = pdu[5]
-        bytes_list = pdu[6 : 6 + bytecnt]
-    else:
-        # We know addr/qty; still extract the packed bytes from PDU
-        bytecnt = pdu[5] if len(pdu) > 5 else 0
-        bytes_list = pdu[6 : 6 + bytecnt] if bytecnt else pdu[6:]
-
-    if qty is None or not bytes_list:
-        return {}
-
-    bits = unpack_bits_from_bytes(bytes_list, qty)
-    return {addr + i: bits[i] for i in range(len(bits))}
+    hit = decode_fc15_pdu(pdu) if pdu is not None else None
+    if hit is None:
+        return CoilBitmap() if packed else {}
+    bitmap = CoilBitmap(*hit)
+    return bitmap if packed else bitmap.to_dict()
 
 
 def check_coil_rules(coils, rules):
     """
-    Compare parsed coils to watch rules.
+    Compare parsed coils ({addr: bit} or a CoilBitmap) to watch rules.
     Returns list of match dicts: [{"coil": addr, "value": bit}, ...]
+    rules is the legacy {addr: bit} mapping, a rule list or a compiled
+    modbus.rules.RuleSet.
     """
+    if not isinstance(rules, dict):
+        from .rules import RuleSet, compile_rules
+        if not isinstance(rules, RuleSet):
+            rules = compile_rules(coils=rules)
+        return rules.match_coils(coils)
+    if isinstance(coils, CoilBitmap):
+        return _check_bitmap_rules(coils, rules)
     return [
         {"coil": addr, "value": val}
         for addr, val in coils.items()
         if addr in rules and rules[addr] == val
     ]
+
+
+def _check_bitmap_rules(bitmap, rules):
+    """Rules against a CoilBitmap: one XOR over the rule mask, no per-coil walk."""
+    base, count = bitmap.base, bitmap.count
+    mask = want = 0
+    for addr, val in rules.items():
+        off = addr - base
+        if 0 <= off < count and val in (0, 1):
+            mask |= 1 << off
+            want |= val << off
+    hit = ~(bitmap.as_int() ^ want) & mask
+    return [{"coil": base + off, "value": (want >> off) & 1} for off in bit_positions(hit)]
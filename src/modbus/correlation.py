@@ -0,0 +1,170 @@
+# src/modbus/correlation.py
+"""
+Request/response correlation keyed by MBAP transaction id.
+
+Read responses (FC1-4) carry no starting address. TransactionTable remembers
+outstanding requests by (flow, unit id, transaction id) so the matching
+response can be given its start address and quantity, and the
+request -> response latency can be measured.
+"""
+import struct
+from bisect import bisect_left
+from collections import OrderedDict
+
+__all__ = [
+    "PendingRequest",
+    "TransactionTable",
+    "LATENCY_BUCKETS_MS",
+    "READ_FCS",
+    "ADDRESSED_FCS",
+    "resolve_span",
+]
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# Requests whose response carries data but no address (FC23: the read half)
+READ_FCS = (1, 2, 3, 4, 23)
+# Requests starting with a (start address, quantity/value) pair
+ADDRESSED_FCS = (1, 2, 3, 4, 5, 6, 15, 16, 23)
+
+_u16x2 = struct.Struct(">HH")
+
+
+class PendingRequest:
+    __slots__ = ("fc", "address", "quantity", "ts_ns")
+
+    def __init__(self, fc, address, quantity, ts_ns):
+        self.fc = fc
+        self.address = address
+        self.quantity = quantity
+        self.ts_ns = ts_ns
+
+
+class TransactionTable:
+    """
+    Outstanding requests keyed by (flow, unit_id, transaction_id).
+
+    flow is the (client_ip, client_port, server_ip, server_port) tuple, the
+    same for a request and its response. Entries older than ttl seconds
+    (capture time) expire; beyond max_pending the oldest entry is evicted.
+    """
+
+    def __init__(self, ttl=5.0, max_pending=65536):
+        self.ttl_ns = int(ttl * 1e9)
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+
+        self.requests = 0
+        self.matched = 0
+        self.unmatched = 0
+        self.superseded = 0
+        self.expired = 0
+        self.evicted = 0
+
+        self.latency_count = 0
+        self.latency_total_ns = 0
+        self.latency_max_ns = 0
+        self.latency_hist = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending(self):
+        """Snapshot of the outstanding requests: {(flow, unit_id, trans_id): PendingRequest}."""
+        return dict(self._pending)
+
+    def expire(self, now_ns):
+        """Drop requests that have waited longer than ttl."""
+        cutoff = now_ns - self.ttl_ns
+        pending = self._pending
+        while pending:
+            key = next(iter(pending))
+            if pending[key].ts_ns >= cutoff:
+                break
+            del pending[key]
+            self.expired += 1
+
+    def add_request(self, flow, unit_id, trans_id, fc, address, quantity, ts_ns):
+        key = (flow, unit_id, trans_id)
+        pending = self._pending
+        if key in pending:
+            # Transaction id reused before a response arrived
+            del pending[key]
+            self.superseded += 1
+        elif len(pending) >= self.max_pending:
+            pending.popitem(last=False)
+            self.evicted += 1
+        pending[key] = PendingRequest(fc, address, quantity, ts_ns)
+        self.requests += 1
+        self.expire(ts_ns)
+
+    def match_response(self, flow, unit_id, trans_id, fc, ts_ns):
+        """
+        Pop the request answered by this response. Returns
+        (PendingRequest, latency_ns) or (None, None) if there is none.
+        Exception responses (fc | 0x80) match their request as well.
+        """
+        req = self._pending.pop((flow, unit_id, trans_id), None)
+        if req is None or req.fc != (fc & 0x7F):
+            self.unmatched += 1
+            return None, None
+        latency = ts_ns - req.ts_ns
+        if latency > self.ttl_ns:
+            self.expired += 1
+            return None, None
+        self.matched += 1
+        self._record_latency(latency)
+        return req, latency
+
+    def _record_latency(self, latency_ns):
+        self.latency_count += 1
+        self.latency_total_ns += latency_ns
+        if latency_ns > self.latency_max_ns:
+            self.latency_max_ns = latency_ns
+        self.latency_hist[bisect_left(LATENCY_BUCKETS_MS, latency_ns / 1e6)] += 1
+
+    def stats(self):
+        avg_ms = (self.latency_total_ns / self.latency_count / 1e6) if self.latency_count else None
+        return {
+            "outstanding": len(self._pending),
+            "requests": self.requests,
+            "matched": self.matched,
+            "unmatched": self.unmatched,
+            "superseded": self.superseded,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "latency_avg_ms": avg_ms,
+            "latency_max_ms": self.latency_max_ns / 1e6,
+            "latency_hist": dict(zip([*LATENCY_BUCKETS_MS, "inf"], self.latency_hist)),
+        }
+
+
+def resolve_span(transactions, flow, unit_id, trans_id, pdu, is_response, ts_ns):
+    """
+    (address, quantity) addressed by a PDU, or (-1, 0) if unknown.
+
+    flow is oriented client -> server for both directions. Read requests
+    are remembered in transactions; read responses take their span from
+    the matching request. Write responses echo it. For FC5/FC6 the second
+    field is the written value, so quantity is 1.
+    """
+    if not pdu:
+        return -1, 0
+    fc = pdu[0]
+    address, quantity = -1, 0
+    if not is_response:
+        if fc in ADDRESSED_FCS and len(pdu) >= 5:
+            address, quantity = _u16x2.unpack_from(pdu, 1)
+            if fc in READ_FCS:
+                transactions.add_request(flow, unit_id, trans_id, fc, address, quantity, ts_ns)
+    elif (fc & 0x7F) in READ_FCS:
+        req, _latency = transactions.match_response(flow, unit_id, trans_id, fc, ts_ns)
+        if req is not None:
+            address, quantity = req.address, req.quantity
+    elif fc in ADDRESSED_FCS and len(pdu) >= 5:
+        address, quantity = _u16x2.unpack_from(pdu, 1)
+
+    if fc in (5, 6) and address >= 0:
+        quantity = 1
+    return address, quantity
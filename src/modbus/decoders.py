@@ -0,0 +1,92 @@
+# src/modbus/decoders.py
+"""
+Byte-level decoders for the function codes beyond FC3/4/5/15, and for
+exception responses. All take a PDU (function code onward) as
+bytes/memoryview and return None when it is malformed or truncated.
+"""
+import struct
+
+from .bitmap import CoilBitmap
+from .pdu import decode_registers
+
+__all__ = [
+    "BIT_FCS",
+    "REGISTER_FCS",
+    "EXCEPTION_CODES",
+    "is_exception",
+    "decode_exception_pdu",
+    "decode_read_bits_response",
+    "decode_fc6_pdu",
+    "decode_fc16_request",
+    "decode_fc23_request",
+]
+
+# Function codes whose values are single bits (coils / discrete inputs)
+BIT_FCS = (1, 2, 5, 15)
+# Function codes whose values are 16-bit registers
+REGISTER_FCS = (3, 4, 6, 16, 23)
+
+EXCEPTION_CODES = {
+    1: "ILLEGAL FUNCTION",
+    2: "ILLEGAL DATA ADDRESS",
+    3: "ILLEGAL DATA VALUE",
+    4: "SERVER DEVICE FAILURE",
+    5: "ACKNOWLEDGE",
+    6: "SERVER DEVICE BUSY",
+    8: "MEMORY PARITY ERROR",
+    10: "GATEWAY PATH UNAVAILABLE",
+    11: "GATEWAY TARGET DEVICE FAILED TO RESPOND",
+}
+
+_u16x2 = struct.Struct(">HH")
+_u16x4 = struct.Struct(">HHHH")
+
+
+def is_exception(fc):
+    return fc >= 0x80
+
+
+def decode_exception_pdu(pdu):
+    """Exception response (fc | 0x80) -> (original fc, exception code) or None."""
+    if len(pdu) < 2 or pdu[0] < 0x80:
+        return None
+    return pdu[0] & 0x7F, pdu[1]
+
+
+def decode_read_bits_response(pdu, start, quantity):
+    """
+    FC=1/2 response PDU + the request's start address and quantity ->
+    CoilBitmap. The response carries neither, so both come from correlation.
+    """
+    if len(pdu) < 2 or start < 0:
+        return None
+    packed = memoryview(pdu)[2 : 2 + pdu[1]]
+    return CoilBitmap(start, quantity, packed)
+
+
+def decode_fc6_pdu(pdu):
+    """FC=6 request or echoed response -> (address, value) or None."""
+    if len(pdu) < 5 or pdu[0] != 0x06:
+        return None
+    return _u16x2.unpack_from(pdu, 1)
+
+
+def decode_fc16_request(pdu):
+    """FC=16 request -> (start address, array('H') of written values) or None."""
+    if len(pdu) < 6 or pdu[0] != 0x10:
+        return None
+    addr, qty = _u16x2.unpack_from(pdu, 1)
+    count = min(qty, pdu[5] // 2, (len(pdu) - 6) // 2)
+    return addr, decode_registers(pdu, 6, count)
+
+
+def decode_fc23_request(pdu):
+    """
+    FC=23 (Read/Write Multiple Registers) request ->
+    (read address, read quantity, write address, array('H') written) or None.
+    """
+    if len(pdu) < 10 or pdu[0] != 0x17:
+        return None
+    raddr, rqty, waddr, wqty = _u16x4.unpack_from(pdu, 1)
+    count = min(wqty, pdu[9] // 2, (len(pdu) - 10) // 2)
+    return raddr, rqty, waddr, decode_registers(pdu, 10, count)
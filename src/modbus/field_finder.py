@@ -7,6 +7,61 @@ FIELD_MAP = {
     "byte_count": None,
 }
 
+_ATTR, _FIELD, _NONE = 0, 1, 2  # how a cached name resolves
+
+
+class FieldResolutionCache:
+    """
+    Remembers which field name answered a find_field() lookup.
+
+    Keyed by (layer name, frozenset of the layer's field_names, candidate
+    tuple): a layer with a different schema (other tshark version, other
+    function code) gets its own entry, so a schema change is a fresh miss
+    rather than a stale hit. Layers that do not expose field_names are not
+    cached. Entries whose remembered field no longer resolves are dropped.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, layer, candidates):
+        names = getattr(layer, "field_names", None)
+        if names is None:
+            return None
+        return (getattr(layer, "layer_name", None), frozenset(names), tuple(candidates))
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, how, name):
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+        self._entries[key] = (how, name)
+
+    def invalidate(self, key):
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = self.invalidations = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+FIELD_CACHE = FieldResolutionCache()
+
+
 def dump_layer_fields(layer):
     out = {}
     for fname in getattr(layer, "field_names", []):
@@ -17,27 +72,77 @@ def dump_layer_fields(layer):
             out[fname] = None
     return out
 
-def find_field(layer, candidates, as_int=False, record_key=None):
+
+def _get_field_value(layer, name):
+    fld = layer.get_field(name)
+    if fld is None:
+        raise KeyError(name)
+    return getattr(fld, "showname_value", fld)
+
+
+def _resolve(layer, candidates):
+    """Full search; returns (how, value, name)."""
     for name in candidates:
         val = getattr(layer, name, None)
         if val is not None:
-            return (intify(val) if as_int else val, name)
-
+            return _ATTR, val, name
         try:
-            fld = layer.get_field(name)
-            val = getattr(fld, "showname_value", fld)
-            if record_key and FIELD_MAP[record_key] is None:
-                FIELD_MAP[record_key] = name
-            return (intify(val) if as_int else val, name)
+            return _FIELD, _get_field_value(layer, name), name
         except Exception:
             pass
 
     for fname, sval in dump_layer_fields(layer).items():
         for hint in candidates:
             if hint.replace("_", "") in fname.replace("_", ""):
-                return (intify(sval) if as_int else sval, fname)
+                return _FIELD, sval, fname
+
+    return _NONE, None, None
+
+
+def _cached(layer, how, name):
+    """Re-read a remembered field; raises LookupError if it no longer resolves."""
+    if how == _NONE:
+        return None
+    if how == _ATTR:
+        val = getattr(layer, name, None)
+        if val is None:
+            raise LookupError(name)
+        return val
+    try:
+        return _get_field_value(layer, name)
+    except Exception:
+        raise LookupError(name)
+
+
+def find_field(layer, candidates, as_int=False, record_key=None):
+    cache = FIELD_CACHE
+    key = cache.key(layer, candidates)
+    entry = cache.get(key) if key is not None else None
+    if entry is not None:
+        how, name = entry
+        try:
+            val = _cached(layer, how, name)
+            cache.hits += 1
+            if how == _NONE:
+                return None, None
+            return (intify(val) if as_int else val, name)
+        except LookupError:
+            cache.invalidate(key)
+
+    cache.misses += 1
+    how, val, name = _resolve(layer, candidates)
+    if key is not None:
+        cache.put(key, how, name)
+    if how == _NONE:
+        return None, None
+    if record_key and FIELD_MAP.get(record_key) is None:
+        FIELD_MAP[record_key] = name
+    return (intify(val) if as_int else val, name)
+
+
+def field_cache_stats():
+    return FIELD_CACHE.stats()
 
-    return None, None
 
 def get_all_field_ints(layer, fieldname):
     try:
@@ -0,0 +1,150 @@
+# src/modbus/frame.py
+"""
+ModbusFrame: the compact per-ADU record every capture backend produces and
+every downstream stage consumes, in place of pyshark packet objects.
+"""
+import socket
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from .bitmap import CoilBitmap
+from .coils import decode_fc5_pdu, decode_fc15_pdu
+from .decoders import (
+    decode_exception_pdu,
+    decode_fc6_pdu,
+    decode_fc16_request,
+    decode_fc23_request,
+    decode_read_bits_response,
+)
+from .pdu import decode_registers
+from .registers import register_map
+
+__all__ = [
+    "ModbusFrame",
+    "pack_ip",
+    "ip_str",
+    "frame_wall_time",
+    "frame_values",
+    "frame_register_block",
+    "frame_coils",
+    "frame_exception",
+]
+
+_EMPTY = memoryview(b"")
+
+
+class ModbusFrame(NamedTuple):
+    ts_ns: int              # capture time, ns since the epoch (UTC)
+    src: bytes              # packed IPv4 (4 bytes) / IPv6 (16 bytes)
+    dst: bytes
+    sport: int
+    dport: int
+    unit: int
+    tid: int                # MBAP transaction id
+    fc: int                 # raw function code (exceptions keep the 0x80 bit)
+    address: int            # start address, -1 if unknown
+    quantity: int
+    payload: memoryview     # the PDU, function code onward
+    is_response: bool
+    values: Optional[dict] = None  # pre-decoded {addr: value} from a dissector (pyshark)
+
+
+def pack_ip(addr):
+    """Dotted/colon IP string -> packed bytes; b"" when missing or unparsable."""
+    if not addr:
+        return b""
+    try:
+        return socket.inet_aton(addr)
+    except OSError:
+        try:
+            return socket.inet_pton(socket.AF_INET6, addr)
+        except (OSError, ValueError):
+            return b""
+
+
+@lru_cache(maxsize=4096)
+def ip_str(packed):
+    """Packed IP -> string (cached: a capture only has a handful of hosts)."""
+    if len(packed) == 4:
+        return socket.inet_ntoa(packed)
+    if len(packed) == 16:
+        return socket.inet_ntop(socket.AF_INET6, packed)
+    return None
+
+
+def frame_wall_time(frame):
+    """ISO-8601 UTC timestamp with milliseconds, e.g. 2026-01-23T16:24:41.137Z."""
+    secs, ns = divmod(frame.ts_ns, 1_000_000_000)
+    dt = datetime.fromtimestamp(secs, timezone.utc).replace(microsecond=ns // 1000)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def frame_values(frame):
+    """
+    {address: value} carried by a frame: registers for FC3/4/23 responses
+    and FC6/16/23 writes, bits for FC1/2 responses and FC5/15 writes.
+    Frames from a dissector already carry them in frame.values; native
+    frames are decoded from the payload. Exceptions carry none.
+    """
+    if frame.values is not None:
+        return frame.values
+    fc = frame.fc
+    if fc in (3, 4, 6, 16, 23):
+        block = frame_register_block(frame)
+        return register_map(*block) if block is not None else {}
+    if fc in (1, 2, 5, 15):
+        return frame_coils(frame).to_dict()
+    return {}
+
+
+def frame_register_block(frame):
+    """
+    The registers of a native frame as one contiguous block,
+    (start address, array('H') or tuple of values), or None when there is
+    none or the values came pre-decoded from a dissector (frame.values).
+    """
+    if frame.values is not None:
+        return None
+    fc, pdu = frame.fc, frame.payload
+    if fc in (3, 4, 23) and frame.is_response:
+        if frame.address < 0 or len(pdu) < 2:
+            return None
+        count = min(pdu[1], len(pdu) - 2) // 2
+        return frame.address, decode_registers(pdu, 2, min(count, frame.quantity))
+    if fc == 6:
+        hit = decode_fc6_pdu(pdu)
+        return (hit[0], (hit[1],)) if hit else None
+    if fc == 16 and not frame.is_response:
+        return decode_fc16_request(pdu)
+    if fc == 23:
+        hit = decode_fc23_request(pdu)
+        return (hit[2], hit[3]) if hit else None
+    return None
+
+
+def frame_coils(frame):
+    """
+    Bits carried by an FC1/2 response or FC5/15 request as a CoilBitmap
+    (empty when there are none); payload bytes are copied packed, not unpacked.
+    """
+    fc = frame.fc
+    if frame.values is not None:
+        return CoilBitmap.from_dict(frame.values) if fc in (1, 2, 5, 15) else CoilBitmap()
+    if fc == 5:
+        hit = decode_fc5_pdu(frame.payload)
+        return CoilBitmap(hit[0], 1, bytes((hit[1],))) if hit else CoilBitmap()
+    if fc == 15 and not frame.is_response:
+        hit = decode_fc15_pdu(frame.payload)
+        return CoilBitmap(*hit) if hit else CoilBitmap()
+    if fc in (1, 2) and frame.is_response:
+        return decode_read_bits_response(frame.payload, frame.address, frame.quantity) or CoilBitmap()
+    return CoilBitmap()
+
+
+def frame_exception(frame):
+    """(original fc, exception code) for an exception response, else None."""
+    if not frame.is_response:
+        return None
+    # Checked on the payload: tshark reports the function code without 0x80
+    return decode_exception_pdu(frame.payload)
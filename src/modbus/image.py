@@ -0,0 +1,236 @@
+# src/modbus/image.py
+"""
+Per-device process image: the last value of every register and coil,
+keyed by (server IP, unit id), so two slaves that both have register 200
+no longer overwrite each other.
+
+Each device holds a 65,536-entry array('H') per register table (holding
+registers; input registers only once FC4 is seen) with a known-bitmap,
+per-block dirty bits and per-block last-update timestamps, plus CoilState
+bit images for coils and discrete inputs. Everything is allocated once per
+device, so memory does not grow with run time.
+
+Steady-state polls mostly return what they returned last time, so each
+table also remembers the raw PDU of every polled block: a frame whose
+payload is byte-identical to the last one for its block, with none of the
+BLOCK_SIZE blocks it covers changed since, needs no per-register work at
+all. Other polled blocks changing (counters, analog values) do not get in
+the way, as long as they are in different BLOCK_SIZE blocks.
+"""
+from array import array
+from functools import lru_cache
+
+from .bitmap import CoilState, bit_positions
+
+__all__ = ["BLOCK_SIZE", "RegisterImage", "DeviceImage", "ImageStore", "changed_words"]
+
+ADDRESSES = 65536
+BLOCK_SHIFT = 6
+BLOCK_SIZE = 1 << BLOCK_SHIFT          # registers per dirty/timestamp block
+_BLOCKS = ADDRESSES >> BLOCK_SHIFT
+MAX_PAYLOADS = 4096                    # remembered poll blocks per table
+
+
+@lru_cache(maxsize=64)
+def _word_lsbs(n):
+    return int.from_bytes(b"\x01\x00" * n, "little")
+
+
+def changed_words(old, new):
+    """
+    Offsets of the 16-bit words that differ between two equal-length byte
+    strings, found with one XOR over the whole block instead of a loop.
+    """
+    x = int.from_bytes(old, "little") ^ int.from_bytes(new, "little")
+    if not x:
+        return []
+    # Fold each word onto its lowest bit (shifts stay inside the word)
+    x |= x >> 8
+    x |= x >> 4
+    x |= x >> 2
+    x |= x >> 1
+    return [p >> 4 for p in bit_positions(x & _word_lsbs(len(new) // 2))]
+
+
+class RegisterImage:
+    """One register table of one device."""
+
+    __slots__ = ("values", "known", "dirty", "updated_ns", "changed_at", "version", "_payloads")
+
+    def __init__(self):
+        self.values = array("H", bytes(2 * ADDRESSES))
+        self.known = bytearray(ADDRESSES // 8)       # bit per register
+        self.dirty = bytearray(_BLOCKS // 8)         # bit per block, set on change
+        self.updated_ns = array("q", bytes(8 * _BLOCKS))
+        self.changed_at = array("q", bytes(8 * _BLOCKS))  # per block: version of its last change
+        self.version = 0                             # bumped on every change
+        self._payloads = {}                          # block key -> (raw PDU, version, first, last block)
+
+    def same_payload(self, key, payload):
+        """
+        True when payload is byte-identical to the last one remember()ed for
+        key and none of the blocks it covers changed since: the image already
+        holds exactly these values.
+        """
+        seen = self._payloads.get(key)
+        if seen is None:
+            return False
+        data, version, lo, hi = seen
+        changed_at = self.changed_at
+        if lo == hi:
+            if changed_at[lo] > version:
+                return False
+        elif max(changed_at[lo:hi + 1]) > version:
+            return False
+        return data == payload
+
+    def remember(self, key, payload, start, count):
+        """Remember payload as the raw PDU of registers [start, start + count)."""
+        payloads = self._payloads
+        if len(payloads) >= MAX_PAYLOADS and key not in payloads:
+            payloads.clear()
+        lo = start >> BLOCK_SHIFT
+        hi = max(lo, (min(start + count, ADDRESSES) - 1) >> BLOCK_SHIFT)
+        payloads[key] = (bytes(payload), self.version, lo, hi)
+
+    def _bits(self, buf, start, n):
+        lo, hi = start >> 3, (start + n + 7) >> 3
+        return int.from_bytes(buf[lo:hi], "little") >> (start & 7), lo, hi
+
+    def _set_bits(self, buf, start, n):
+        lo, hi = start >> 3, (start + n + 7) >> 3
+        cur = int.from_bytes(buf[lo:hi], "little") | (((1 << n) - 1) << (start & 7))
+        buf[lo:hi] = cur.to_bytes(hi - lo, "little")
+
+    def get(self, addr, default=None):
+        if not 0 <= addr < ADDRESSES or not (self.known[addr >> 3] >> (addr & 7)) & 1:
+            return default
+        return self.values[addr]
+
+    def last(self, addr):
+        """(value, last update ns of its block) or None if never seen."""
+        if not 0 <= addr < ADDRESSES or not (self.known[addr >> 3] >> (addr & 7)) & 1:
+            return None
+        return self.values[addr], self.updated_ns[addr >> BLOCK_SHIFT]
+
+    def update(self, start, values, ts_ns=0):
+        """
+        Store a block of values read/written from start; returns the
+        addresses whose value changed or was seen for the first time.
+        """
+        n = min(len(values), ADDRESSES - start)
+        if n <= 0 or start < 0:
+            return []
+        end = start + n
+        new = values if isinstance(values, array) and values.typecode == "H" and len(values) == n \
+            else array("H", values[:n])
+        old = self.values[start:end]
+        full = (1 << n) - 1
+        known = self._bits(self.known, start, n)[0] & full
+        if known == full:
+            if old == new:
+                self.touch(start, end, ts_ns)
+                return []
+            changed = [start + i for i in changed_words(old.tobytes(), new.tobytes())]
+        else:
+            changed = [start + i for i in range(n) if old[i] != new[i] or not (known >> i) & 1]
+            self._set_bits(self.known, start, n)
+        self.values[start:end] = new
+        self.touch(start, end, ts_ns)
+        self.version += 1
+        version, dirty, changed_at = self.version, self.dirty, self.changed_at
+        for b in {a >> BLOCK_SHIFT for a in changed}:
+            dirty[b >> 3] |= 1 << (b & 7)
+            changed_at[b] = version
+        return changed
+
+    def update_map(self, registers, ts_ns=0):
+        """update() for a {addr: value} mapping (dissector output)."""
+        changed = []
+        values, known, dirty, stamps = self.values, self.known, self.dirty, self.updated_ns
+        changed_at, version = self.changed_at, self.version + 1
+        for addr, v in registers.items():
+            if not 0 <= addr < ADDRESSES:
+                continue
+            byte, bit = addr >> 3, 1 << (addr & 7)
+            if not known[byte] & bit or values[addr] != v:
+                changed.append(addr)
+                values[addr] = v
+                known[byte] |= bit
+                b = addr >> BLOCK_SHIFT
+                dirty[b >> 3] |= 1 << (b & 7)
+                changed_at[b] = version
+            stamps[addr >> BLOCK_SHIFT] = ts_ns
+        if changed:
+            self.version = version
+        return changed
+
+    def touch(self, start, end, ts_ns):
+        stamps = self.updated_ns
+        for b in range(start >> BLOCK_SHIFT, ((end - 1) >> BLOCK_SHIFT) + 1):
+            stamps[b] = ts_ns
+
+    def take_dirty(self):
+        """Block numbers changed since the last call (block b = registers b*BLOCK_SIZE...)."""
+        blocks = bit_positions(int.from_bytes(self.dirty, "little"))
+        if blocks:
+            self.dirty[:] = bytes(len(self.dirty))
+        return blocks
+
+
+class DeviceImage:
+    """Register and bit tables of one (ip, unit)."""
+
+    __slots__ = ("holding", "_inputs", "coils", "discrete")
+
+    def __init__(self):
+        self.holding = RegisterImage()
+        self._inputs = None
+        self.coils = CoilState()       # FC 1/5/15
+        self.discrete = CoilState()    # FC 2
+
+    @property
+    def inputs(self):
+        if self._inputs is None:
+            self._inputs = RegisterImage()
+        return self._inputs
+
+    def registers_for(self, fc):
+        """FC4 reads input registers; every other register FC the holding registers."""
+        return self.inputs if (fc & 0x7F) == 4 else self.holding
+
+    def bits_for(self, fc):
+        return self.discrete if (fc & 0x7F) == 2 else self.coils
+
+    def nbytes(self):
+        regs = [self.holding] + ([self._inputs] if self._inputs is not None else [])
+        return sum(len(r.values) * 2 + len(r.known) + len(r.dirty) + (len(r.updated_ns) + len(r.changed_at)) * 8
+                   for r in regs)
+
+
+class ImageStore:
+    """(packed server IP, unit id) -> DeviceImage, created on first sight."""
+
+    def __init__(self):
+        self._devices = {}
+
+    def device(self, ip, unit):
+        key = (ip, unit)
+        image = self._devices.get(key)
+        if image is None:
+            image = self._devices[key] = DeviceImage()
+        return image
+
+    def for_frame(self, frame):
+        """The image of the server a frame was sent by (responses) or to (requests)."""
+        return self.device(frame.src if frame.is_response else frame.dst, frame.unit)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def items(self):
+        return self._devices.items()
+
+    def stats(self):
+        return {"devices": len(self._devices),
+                "bytes": sum(d.nbytes() for d in self._devices.values())}
@@ -1,16 +1,102 @@
+# src/modbus/pdu.py
+"""
+Byte-level PDU helpers. Everything here works on bytes/memoryview; the
+tshark colon-hex rendering of tcp.payload is converted once, in C, by
+payload_bytes().
+"""
+import struct
+import sys
+from array import array
+
+__all__ = [
+    "payload_bytes",
+    "pdu_from_adu",
+    "split_adus",
+    "get_modbus_pdu_bytes",
+    "decode_registers",
+    "unpack_bits_from_bytes",
+]
+
+_BYTESWAP = sys.byteorder == "little"  # Modbus registers are big-endian
+_u16 = struct.Struct(">H")
+
+# byte value -> its 8 bits, LSB first (Modbus coil packing)
+_BIT_TABLE = tuple(bytes((b >> i) & 1 for i in range(8)) for b in range(256))
+
+
+def payload_bytes(raw):
+    """
+    Return raw TCP payload as bytes-like: native backends already hand us
+    bytes/memoryview; pyshark renders it as "00:01:00:00:...".
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        return raw
+    return bytes.fromhex(str(raw).replace(":", ""))
+
+
+def pdu_from_adu(b):
+    """
+    Slice the PDU (function code onward) out of an ADU as a memoryview.
+
+    When another ADU follows in the same segment (pipelined requests), cut
+    at the MBAP length so it is not glued onto this PDU.
+    """
+    mv = memoryview(b)
+    if len(mv) < 7:
+        return mv[7:]
+    end = 6 + _u16.unpack_from(mv, 4)[0]
+    if len(mv) - end >= 7 and mv[end + 2] == 0 and mv[end + 3] == 0:
+        return mv[7:end]
+    return mv[7:]
+
+
+def split_adus(b):
+    """
+    Cut a TCP payload holding back-to-back ADUs into memoryviews, one per
+    complete ADU, by their MBAP lengths. A trailing partial ADU is dropped.
+    """
+    mv = memoryview(b)
+    out = []
+    off, end = 0, len(mv)
+    while end - off >= 8:
+        adu_end = off + 6 + _u16.unpack_from(mv, off + 4)[0]
+        if adu_end > end or adu_end <= off + 7:
+            break
+        out.append(mv[off:adu_end])
+        off = adu_end
+    return out
+
+
 def get_modbus_pdu_bytes(packet):
+    """Return the Modbus PDU of a packet as a memoryview, or None."""
     try:
         raw = getattr(packet.tcp, "payload", None)
         if raw:
-            b = [int(x, 16) for x in str(raw).split(":")]
-            return b[7:]
+            return pdu_from_adu(payload_bytes(raw))
     except Exception:
         pass
     return None
 
+
+def decode_registers(buf, offset=0, count=None):
+    """
+    Decode count big-endian 16-bit registers starting at buf[offset] into an
+    array('H') with one copy and one byteswap (no per-register Python work).
+    """
+    mv = memoryview(buf)[offset:]
+    if count is None:
+        count = len(mv) // 2
+    regs = array("H")
+    regs.frombytes(mv[: count * 2])
+    if _BYTESWAP:
+        regs.byteswap()
+    return regs
+
+
 def unpack_bits_from_bytes(bytes_list, quantity):
-    bits = []
-    for b in bytes_list:
-        for i in range(8):
-            bits.append((b >> i) & 1)
-    return bits[:quantity]
+    """
+    Packed coil bytes (LSB-first) -> list of quantity 0/1 ints, via a
+    256-entry table and one join instead of a per-bit Python loop.
+    """
+    nbytes = (quantity + 7) // 8
+    return list(b"".join(map(_BIT_TABLE.__getitem__, bytes_list[:nbytes]))[:quantity])
@@ -0,0 +1,169 @@
+# src/modbus/reassembly.py
+"""
+Modbus/TCP stream reassembly.
+
+A TCP segment may carry several pipelined ADUs, or only part of one (large
+FC3 responses). AduReassembler keeps a small per-flow buffer keyed by the
+directional 4-tuple and uses the MBAP length field to cut the byte stream
+into whole ADUs (MBAP header + PDU).
+"""
+import struct
+from collections import OrderedDict
+
+__all__ = ["MBAP_LEN", "MAX_ADU_LEN", "AduReassembler"]
+
+MBAP_LEN = 7            # transaction id, protocol id, length, unit id
+MAX_ADU_LEN = 260       # 7-byte MBAP + 253-byte PDU
+_MAX_LENGTH_FIELD = MAX_ADU_LEN - 6  # length counts unit id + PDU
+
+_mbap = struct.Struct(">HHH")
+
+
+def _valid_header(buf, off):
+    _tid, proto, length = _mbap.unpack_from(buf, off)
+    return proto == 0 and 2 <= length <= _MAX_LENGTH_FIELD
+
+
+class _Flow:
+    __slots__ = ("buf", "next_seq", "last_ts")
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.next_seq = None
+        self.last_ts = 0
+
+
+class AduReassembler:
+    """
+    Split/join TCP payloads into whole Modbus ADUs per flow.
+
+    max_buffer   : bytes kept per flow while waiting for the rest of an ADU
+    max_flows    : flows tracked at once (least recently seen is evicted)
+    idle_timeout : seconds without traffic after which a flow is forgotten
+    """
+
+    def __init__(self, max_buffer=4 * MAX_ADU_LEN, max_flows=4096, idle_timeout=60.0):
+        self.max_buffer = max_buffer
+        self.max_flows = max_flows
+        self.idle_timeout_ns = int(idle_timeout * 1e9)
+        self._flows = OrderedDict()
+        self._last_sweep = 0
+
+        self.segments = 0
+        self.adus = 0
+        self.resyncs = 0
+        self.gaps = 0
+        self.retransmits = 0
+        self.overflows = 0
+        self.evicted = 0
+
+    def stats(self):
+        return {
+            "flows": len(self._flows),
+            "segments": self.segments,
+            "adus": self.adus,
+            "resyncs": self.resyncs,
+            "gaps": self.gaps,
+            "retransmits": self.retransmits,
+            "overflows": self.overflows,
+            "evicted": self.evicted,
+        }
+
+    def _flow(self, key, ts_ns):
+        flow = self._flows.get(key)
+        if flow is None:
+            if len(self._flows) >= self.max_flows:
+                self._flows.popitem(last=False)
+                self.evicted += 1
+            flow = self._flows[key] = _Flow()
+        else:
+            self._flows.move_to_end(key)
+        flow.last_ts = ts_ns
+        return flow
+
+    def evict_idle(self, now_ns):
+        """Forget flows idle for longer than idle_timeout (capture time)."""
+        cutoff = now_ns - self.idle_timeout_ns
+        while self._flows:
+            key, flow = next(iter(self._flows.items()))
+            if flow.last_ts >= cutoff:
+                break
+            del self._flows[key]
+            self.evicted += 1
+
+    def feed(self, key, payload, seq=None, ts_ns=0):
+        """
+        Add one TCP payload for flow key (src, sport, dst, dport).
+        Returns a list of complete ADUs (memoryview/bytes incl. MBAP header).
+        """
+        self.segments += 1
+        if ts_ns - self._last_sweep > self.idle_timeout_ns:
+            self.evict_idle(ts_ns)
+            self._last_sweep = ts_ns
+
+        flow = self._flow(key, ts_ns)
+        n = len(payload)
+
+        if seq is not None and flow.next_seq is not None and seq != flow.next_seq:
+            ahead = (seq - flow.next_seq) & 0xFFFFFFFF
+            if ahead < 0x80000000:
+                # Lost segment(s): whatever is buffered can never complete
+                self.gaps += 1
+                if flow.buf:
+                    self.resyncs += 1
+                    flow.buf.clear()
+            else:
+                # Retransmission / overlap: skip bytes we already have
+                dup = (flow.next_seq - seq) & 0xFFFFFFFF
+                if dup >= n:
+                    self.retransmits += 1
+                    return []
+                payload = memoryview(payload)[dup:]
+                seq = flow.next_seq
+                n = len(payload)
+        if seq is not None:
+            flow.next_seq = (seq + n) & 0xFFFFFFFF
+
+        if not flow.buf:
+            # Fast path: the segment starts on an ADU boundary
+            out, used = self._split(payload)
+            if used < n:
+                flow.buf += payload[used:]
+                self._check_overflow(flow)
+            return out
+
+        flow.buf += payload
+        # ADUs must not alias the buffer we are about to shrink, so copy them
+        out, used = self._split(flow.buf, copy=True)
+        del flow.buf[:used]
+        self._check_overflow(flow)
+        return out
+
+    def _check_overflow(self, flow):
+        if len(flow.buf) > self.max_buffer:
+            self.overflows += 1
+            flow.buf.clear()
+
+    def _split(self, buf, copy=False):
+        """Cut buf into whole ADUs; return (adus, bytes consumed)."""
+        mv = buf if copy else memoryview(buf)
+        out = []
+        off, end = 0, len(buf)
+        resyncing = False
+        while end - off >= MBAP_LEN:
+            if not _valid_header(buf, off):
+                # Not an MBAP header: slide forward until one lines up
+                if not resyncing:
+                    self.resyncs += 1
+                    resyncing = True
+                off += 1
+                continue
+            resyncing = False
+            length = _mbap.unpack_from(buf, off)[2]
+            adu_end = off + 6 + length
+            if adu_end > end:
+                break
+            out.append(bytes(mv[off:adu_end]) if copy else mv[off:adu_end])
+            off = adu_end
+        self.adus += len(out)
+        return out, off
@@ -1,11 +1,42 @@
 from .field_finder import get_all_field_ints
+from .pdu import decode_registers
+
+def decode_read_response(pdu, start, quantity=None):
+    """
+    FC=3/4 response PDU + the request's start address -> (start, array('H')).
+    The whole block is decoded in one call; quantity caps a short/odd byte count.
+    """
+    if len(pdu) < 2:
+        return start, decode_registers(b"")
+    count = min(pdu[1], len(pdu) - 2) // 2
+    if quantity is not None:
+        count = min(count, quantity)
+    return start, decode_registers(pdu, 2, count)
+
+def register_map(start, regs):
+    """Expand a decoded block into the {reg: value} dict the CLI consumes."""
+    return dict(zip(range(start, start + len(regs)), regs))
 
 def parse_register_map(m, fc):
+    # Native backends attach the already-decoded block; pyshark layers do not
+    block = getattr(m, "register_block", None)
+    if block is not None:
+        return register_map(*block)
     regnums = get_all_field_ints(m, "regnum16")
     regvals = get_all_field_ints(m, "regval_uint16")
     return dict(zip(regnums, regvals))
 
 def check_register_rules(registers, rules):
+    """
+    Registers against watch rules: a compiled modbus.rules.RuleSet (all
+    predicates, indexed by address), a rule list (compiled per call), or
+    the legacy {reg: {"eq": value}} mapping.
+    """
+    if not isinstance(rules, dict):
+        from .rules import RuleSet, compile_rules
+        if not isinstance(rules, RuleSet):
+            rules = compile_rules(registers=rules)
+        return rules.match_registers(registers)
     matches = []
     for reg, rule in rules.items():
         if reg not in registers:
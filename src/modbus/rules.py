@@ -0,0 +1,230 @@
+# src/modbus/rules.py
+"""
+Compiled watch rules for registers and coils.
+
+A rule is a dict naming one address and one or more predicates, all of
+which must hold:
+
+    {"register": 100, "eq": 3}
+    {"register": 100, "eq": 4, "device": "10.0.0.71", "name": "stopped"}
+    {"coil": 12, "rising": 1}
+    {"register": 7, "range": [0, 500]}
+    {"register": 8, "bitmask": [0x0C, 0x04]}        # (v & 0x0C) == 0x04
+    {"register": 9, "rate": 50}                      # |dv/dt| > 50 per second
+
+Predicates: eq, ne, in, range [lo, hi], bitmask (mask: any bit set, or
+[mask, value]), rising T (prev < T <= v), falling T (prev > T >= v),
+changed, rate. Edge/change/rate predicates compare with the previous
+value seen for the same device and address and never fire on the first.
+
+compile_rules() turns rule lists into a RuleSet: a dispatch table keyed by
+(kind, device) and then address, so matching a frame costs
+O(min(addresses in the frame, watched addresses of that device)), not
+O(rules). Rules without "device" apply to every device.
+
+The older mapping forms are still accepted: {reg: {"eq": 3}} for
+registers and {addr: bit} for coils.
+"""
+from bisect import bisect_left
+
+from .bitmap import CoilBitmap
+from .frame import ip_str, pack_ip
+
+__all__ = ["PREDICATES", "Rule", "RuleSet", "compile_rules", "frame_device"]
+
+REGISTER = "register"
+COIL = "coil"
+PREDICATES = ("eq", "ne", "in", "range", "bitmask", "rising", "falling", "changed", "rate")
+_STATEFUL = frozenset(("rising", "falling", "changed", "rate"))
+
+
+def frame_device(frame):
+    """Packed IP of the Modbus server a frame belongs to."""
+    return frame.src if frame.is_response else frame.dst
+
+
+def _check(op, arg):
+    """One predicate -> fn(value, prev, dt_seconds) -> bool."""
+    if op == "eq":
+        return lambda v, p, dt: v == arg
+    if op == "ne":
+        return lambda v, p, dt: v != arg
+    if op == "in":
+        allowed = frozenset(arg)
+        return lambda v, p, dt: v in allowed
+    if op == "range":
+        lo, hi = arg
+        return lambda v, p, dt: lo <= v <= hi
+    if op == "bitmask":
+        if isinstance(arg, int):
+            return lambda v, p, dt: (v & arg) != 0
+        mask, want = arg
+        return lambda v, p, dt: (v & mask) == want
+    if op == "rising":
+        return lambda v, p, dt: p is not None and p < arg <= v
+    if op == "falling":
+        return lambda v, p, dt: p is not None and p > arg >= v
+    if op == "changed":
+        return lambda v, p, dt: p is not None and p != v
+    if op == "rate":
+        return lambda v, p, dt: p is not None and dt > 0 and abs(v - p) / dt > arg
+    raise ValueError(f"unknown rule predicate {op!r}")
+
+
+class Rule:
+    """One compiled rule: address, optional device and its predicates."""
+
+    __slots__ = ("kind", "address", "device", "name", "stateful", "timed", "_checks", "_single")
+
+    def __init__(self, spec):
+        if REGISTER in spec:
+            self.kind, self.address = REGISTER, int(spec[REGISTER])
+        elif COIL in spec:
+            self.kind, self.address = COIL, int(spec[COIL])
+        else:
+            raise ValueError(f"rule needs a 'register' or 'coil' address: {spec!r}")
+        device = spec.get("device")
+        self.device = pack_ip(device) if device else None
+        if device and not self.device:
+            raise ValueError(f"rule device is not an IP address: {device!r}")
+        self.name = spec.get("name")
+        ops = [k for k in spec if k not in (REGISTER, COIL, "device", "name")]
+        if not ops:
+            raise ValueError(f"rule has no predicate: {spec!r}")
+        self._checks = tuple(_check(op, spec[op]) for op in ops)
+        self._single = self._checks[0] if len(self._checks) == 1 else None
+        self.stateful = any(op in _STATEFUL for op in ops)
+        self.timed = "rate" in ops  # needs the time of this address's own last value
+
+    def test(self, value, prev=None, dt=0.0):
+        if self._single is not None:
+            return self._single(value, prev, dt)
+        for check in self._checks:
+            if not check(value, prev, dt):
+                return False
+        return True
+
+
+def _since(last, ts_ns):
+    """(previous value, seconds since it) from a (value, ts_ns) history entry."""
+    if not last:
+        return None, 0.0
+    return last[0], (ts_ns - last[1]) / 1e9
+
+
+def _specs(rules, kind):
+    """Normalise list / legacy mapping forms to a list of rule dicts."""
+    if not rules:
+        return []
+    if isinstance(rules, dict):
+        out = []
+        for addr, rule in rules.items():
+            spec = dict(rule) if isinstance(rule, dict) else {"eq": rule}
+            spec[kind] = addr
+            out.append(spec)
+        return out
+    return list(rules)
+
+
+class RuleSet:
+    """Address-indexed rules; build with compile_rules()."""
+
+    def __init__(self):
+        self._tables = {}   # (kind, device or None) -> {address: (Rule, ...)}
+        self._addrs = {}    # (kind, device or None) -> sorted addresses
+        self._prev = {}     # (kind, device, address) -> (value, ts_ns): stateful addresses, rate only with prev
+        self.count = 0
+
+    def add(self, rule):
+        table = self._tables.setdefault((rule.kind, rule.device), {})
+        table[rule.address] = table.get(rule.address, ()) + (rule,)
+        self._addrs.pop((rule.kind, rule.device), None)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def devices(self):
+        """Devices with device-specific rules (IP strings)."""
+        return sorted({ip_str(dev) for (_kind, dev) in self._tables if dev is not None})
+
+    def _present(self, key, table, values):
+        """(address, value) pairs present in both the frame and the table."""
+        if isinstance(values, CoilBitmap):
+            addrs = self._addrs.get(key)
+            if addrs is None:
+                addrs = self._addrs[key] = sorted(table)
+            lo = bisect_left(addrs, values.base)
+            hi = bisect_left(addrs, values.base + values.count, lo)
+            return [(a, values[a]) for a in addrs[lo:hi]]
+        if len(values) <= len(table):
+            return [(a, v) for a, v in values.items() if a in table]
+        return [(a, values[a]) for a in table if a in values]
+
+    def match(self, kind, device, values, ts_ns=0, prev=None):
+        """
+        Rules of `kind` ("register"/"coil") that hold for the values of one
+        frame ({addr: value} or CoilBitmap) from `device` (packed IP or None).
+        Returns [{kind: addr, "value": v[, "rule": name]}, ...].
+
+        prev, if given, is a callable addr -> (value, ts_ns) or None giving
+        the previous value (e.g. RegisterImage.last); the caller then owns
+        that history for edge/change rules. Rate rules always use the
+        RuleSet's own per-address history: the caller's timestamps may be
+        coarser (RegisterImage keeps one per block of registers), which
+        would shorten dt whenever a neighbouring register is polled.
+        """
+        if not values:
+            return []
+        out = []
+        seen = None
+        for key in ((kind, device), (kind, None)) if device is not None else ((kind, None),):
+            table = self._tables.get(key)
+            if not table:
+                continue
+            for addr, v in self._present(key, table, values):
+                shared = own = None
+                for rule in table[addr]:
+                    if rule.stateful:
+                        if prev is not None and not rule.timed:
+                            if shared is None:
+                                shared = _since(prev(addr), ts_ns)
+                            before, dt = shared
+                        else:
+                            if own is None:
+                                if seen is None:
+                                    seen = {}
+                                seen[addr] = v
+                                own = _since(self._prev.get((kind, device, addr)), ts_ns)
+                            before, dt = own
+                        if not rule.test(v, before, dt):
+                            continue
+                    elif not rule.test(v):
+                        continue
+                    hit = {kind: addr, "value": v}
+                    if rule.name:
+                        hit["rule"] = rule.name
+                    out.append(hit)
+        if seen:
+            prev_map = self._prev
+            for addr, v in seen.items():
+                prev_map[(kind, device, addr)] = (v, ts_ns)
+        return out
+
+    def match_registers(self, registers, device=None, ts_ns=0, prev=None):
+        return self.match(REGISTER, device, registers, ts_ns, prev)
+
+    def match_coils(self, coils, device=None, ts_ns=0, prev=None):
+        return self.match(COIL, device, coils, ts_ns, prev)
+
+
+def compile_rules(registers=None, coils=None):
+    """
+    Compile register rules and coil rules (lists of rule dicts, or the
+    legacy mappings) into one RuleSet. List entries name their own kind
+    ("register" or "coil"), so a single list may hold both.
+    """
+    rs = RuleSet()
+    for spec in _specs(registers, REGISTER) + _specs(coils, COIL):
+        rs.add(Rule(spec))
+    return rs
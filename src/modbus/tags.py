@@ -0,0 +1,236 @@
+# src/modbus/tags.py
+"""
+Typed register tags: engineering values straight from register blocks.
+
+A tag map is a list of dicts:
+
+    {"name": "flow", "address": 200, "type": "float32"}
+    {"name": "total", "address": 210, "type": "uint32", "wordorder": "LITTLE", "scale": 0.1}
+    {"name": "temps", "address": 300, "type": "int16", "count": 32, "scale": 0.1, "offset": -40}
+    {"name": "speed", "address": 10, "type": "uint16", "device": "10.0.0.71"}
+
+Types: uint16, int16, uint32, int32, float32, uint64, int64, float64.
+byteorder / wordorder (modbus.constants, default BIG) are the byte order
+inside each register and the register order inside a value, as in
+utils.decode_ieee_float32_from_regs. value = raw * scale + offset; count
+makes an array tag (a list of count consecutive values).
+
+TagMap compiles, once per (start, quantity) block, one struct layout per
+byte/word-order combination present: every order maps onto the block's
+big-endian bytes or its byte-swapped copy read as '>' or '<', so each
+layout decodes all of its tags with a single unpack_from.
+"""
+import json
+import struct
+import sys
+from array import array
+
+from .constants import ByteOrder, WordOrder
+from .frame import pack_ip
+
+__all__ = ["TYPES", "Tag", "TagMap", "load_tags"]
+
+# type -> (struct code, registers per value)
+TYPES = {
+    "uint16": ("H", 1),
+    "int16": ("h", 1),
+    "uint32": ("I", 2),
+    "int32": ("i", 2),
+    "float32": ("f", 2),
+    "uint64": ("Q", 4),
+    "int64": ("q", 4),
+    "float64": ("d", 4),
+}
+
+_LITTLE_HOST = sys.byteorder == "little"
+MAX_PLANS = 1024
+_NO_TAGS = object()
+
+
+def _order(value, enum):
+    if isinstance(value, enum):
+        return value
+    return enum(str(value).upper())
+
+
+def _layout(byteorder, wordorder):
+    """
+    (read the byte-swapped block?, struct endianness) for an order pair.
+    Registers ABCD on the wire: BIG/BIG reads ABCD ('>'), LITTLE/LITTLE
+    DCBA ('<'); swapping every register first gives BADC ('>') for
+    LITTLE bytes/BIG words and CDAB ('<') for BIG bytes/LITTLE words.
+    """
+    return byteorder.value != wordorder.value, ">" if wordorder is WordOrder.BIG else "<"
+
+
+class Tag:
+    __slots__ = ("name", "address", "type", "byteorder", "wordorder", "scale", "offset",
+                 "count", "device", "code", "words", "span", "layout", "plain")
+
+    def __init__(self, name, address, type="uint16", byteorder=ByteOrder.BIG,
+                 wordorder=WordOrder.BIG, scale=1, offset=0, count=1, device=None):
+        if type not in TYPES:
+            raise ValueError(f"tag {name!r}: unknown type {type!r}")
+        if count < 1:
+            raise ValueError(f"tag {name!r}: count must be >= 1")
+        self.name = name
+        self.address = int(address)
+        self.type = type
+        self.byteorder = _order(byteorder, ByteOrder)
+        self.wordorder = _order(wordorder, WordOrder)
+        self.scale = scale
+        self.offset = offset
+        self.count = int(count)
+        self.device = pack_ip(device) if isinstance(device, str) else device
+        self.code, self.words = TYPES[type]
+        self.span = self.words * self.count
+        self.layout = _layout(self.byteorder, self.wordorder)
+        self.plain = scale == 1 and offset == 0
+
+    @classmethod
+    def from_dict(cls, spec):
+        spec = dict(spec)
+        try:
+            return cls(spec.pop("name"), spec.pop("address"), **spec)
+        except TypeError as e:
+            raise ValueError(f"bad tag {spec!r}: {e}") from None
+
+    def value(self, raw):
+        if self.plain:
+            return raw
+        return raw * self.scale + self.offset
+
+    def __repr__(self):
+        return f"Tag({self.name!r}, {self.address}, {self.type!r})"
+
+
+class _Lane:
+    """One struct over one buffer: non-overlapping tags, ascending."""
+
+    __slots__ = ("swapped", "struct", "tags", "names", "simple")
+
+    def __init__(self, swapped, endian, tags, start):
+        fmt, pos = [endian], start
+        for tag in tags:
+            if tag.address > pos:
+                fmt.append(f"{2 * (tag.address - pos)}x")
+            fmt.append(f"{tag.count}{tag.code}" if tag.count > 1 else tag.code)
+            pos = tag.address + tag.span
+        self.swapped = swapped
+        self.struct = struct.Struct("".join(fmt))
+        self.tags = tags
+        self.names = [t.name for t in tags]
+        self.simple = all(t.plain and t.count == 1 for t in tags)
+
+    def decode(self, buf, offset, out):
+        vals = self.struct.unpack_from(buf, offset)
+        if self.simple:
+            out.update(zip(self.names, vals))
+            return
+        i = 0
+        for tag in self.tags:
+            if tag.count == 1:
+                out[tag.name] = tag.value(vals[i])
+                i += 1
+            else:
+                chunk = vals[i:i + tag.count]
+                out[tag.name] = list(chunk) if tag.plain else [v * tag.scale + tag.offset for v in chunk]
+                i += tag.count
+
+
+class _Plan:
+    """Compiled decoding of one (start, quantity) block."""
+
+    __slots__ = ("start", "lanes", "needs_plain", "needs_swapped")
+
+    def __init__(self, start, tags):
+        self.start = start
+        groups = {}
+        for tag in sorted(tags, key=lambda t: t.address):
+            lanes = groups.setdefault(tag.layout, [])
+            for lane in lanes:
+                if lane[-1].address + lane[-1].span <= tag.address:
+                    lane.append(tag)
+                    break
+            else:
+                lanes.append([tag])
+        self.lanes = [_Lane(swapped, endian, lane, start)
+                      for (swapped, endian), lanes in groups.items() for lane in lanes]
+        self.needs_plain = any(not lane.swapped for lane in self.lanes)
+        self.needs_swapped = any(lane.swapped for lane in self.lanes)
+
+    def decode(self, values):
+        regs = values if isinstance(values, array) and values.typecode == "H" else array("H", values)
+        native = regs.tobytes()
+        if _LITTLE_HOST:
+            swapped = native
+            if self.needs_plain:
+                regs = array("H", regs)
+                regs.byteswap()
+                plain = regs.tobytes()
+        else:
+            plain = native
+            if self.needs_swapped:
+                regs = array("H", regs)
+                regs.byteswap()
+                swapped = regs.tobytes()
+        out = {}
+        for lane in self.lanes:
+            lane.decode(swapped if lane.swapped else plain, 0, out)
+        return out
+
+
+class TagMap:
+    """Tags indexed for block decoding; build from Tag objects or dicts."""
+
+    def __init__(self, tags=()):
+        self.tags = [t if isinstance(t, Tag) else Tag.from_dict(t) for t in tags]
+        names = [t.name for t in self.tags]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate tag names")
+        self._by_device = any(t.device is not None for t in self.tags)
+        self._plans = {}
+        self._single = {t.name: _Plan(t.address, [t]) for t in self.tags}
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __bool__(self):
+        return bool(self.tags)
+
+    def plan(self, start, count, device=None):
+        """The compiled plan for tags wholly inside [start, start + count), cached."""
+        key = (device if self._by_device else None, start, count)
+        plan = self._plans.get(key, _NO_TAGS)
+        if plan is _NO_TAGS:
+            end = start + count
+            tags = [t for t in self.tags
+                    if start <= t.address and t.address + t.span <= end
+                    and (t.device is None or t.device == key[0])]
+            if len(self._plans) >= MAX_PLANS:
+                self._plans.clear()
+            plan = self._plans[key] = _Plan(start, tags) if tags else None
+        return plan
+
+    def decode_block(self, start, values, device=None):
+        """{tag name: value} for a block of registers starting at start."""
+        plan = self.plan(start, len(values), device)
+        return plan.decode(values) if plan is not None else {}
+
+    def decode_map(self, registers, device=None):
+        """decode_block() for an {addr: value} mapping (dissector output), tag by tag."""
+        out = {}
+        for tag in self.tags:
+            if tag.device is not None and tag.device != device:
+                continue
+            words = [registers.get(a) for a in range(tag.address, tag.address + tag.span)]
+            if None in words:
+                continue
+            out.update(self._single[tag.name].decode(words))
+        return out
+
+
+def load_tags(path):
+    """TagMap from a JSON file holding a list of tag dicts."""
+    with open(path, encoding="utf-8") as f:
+        return TagMap(json.load(f))
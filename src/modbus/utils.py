@@ -4,6 +4,10 @@ from .constants import ByteOrder, WordOrder
 
 __all__ = ["intify", "decode_ieee_float32_from_regs", "ByteOrder", "WordOrder"]
 
+_REGS_BE = struct.Struct(">HH")
+_REGS_LE = struct.Struct("<HH")
+_F32 = struct.Struct(">f")
+
 def intify(x, default=None):
     """Convert decimal or hex-like strings to int; return default on failure/None."""
     if x is None:
@@ -28,19 +32,11 @@ def decode_ieee_float32_from_regs(reg_hi, reg_lo,
       - LITTLE  -> 0xABCD -> [0xCD, 0xAB]
 
     The final 4 bytes are then interpreted in network order (big-endian) as a float.
+    For whole blocks of typed values use modbus.tags.TagMap.
     """
-    def reg_to_bytes(reg, per_reg_byteorder):
-        hi = (reg >> 8) & 0xFF
-        lo = reg & 0xFF
-        return (hi, lo) if per_reg_byteorder == ByteOrder.BIG else (lo, hi)
-
     # Arrange the two registers by word order
     hi_reg, lo_reg = (reg_hi, reg_lo) if wordorder == WordOrder.BIG else (reg_lo, reg_hi)
 
-    # Convert each 16-bit register to 2 bytes according to per-register byte order
-    b0, b1 = reg_to_bytes(hi_reg, byteorder)
-    b2, b3 = reg_to_bytes(lo_reg, byteorder)
-
-    # Always interpret the resulting 4 bytes as big-endian float
-    raw = bytes([b0, b1, b2, b3])
-    return struct.unpack(">f", raw)[0]
+    # Pack each register big- or little-endian per byteorder, read the 4 bytes as a big-endian float
+    packer = _REGS_BE if byteorder == ByteOrder.BIG else _REGS_LE
+    return _F32.unpack(packer.pack(hi_reg & 0xFFFF, lo_reg & 0xFFFF))[0]
@@ -0,0 +1,143 @@
+# src/modbus/watchset.py
+"""
+Watch sets over large address spaces.
+
+A WatchSet is built from single addresses and inclusive ranges
+("0-9999", (40001, 40100), 100) and stored twice: as merged, sorted
+interval arrays (for intersecting a whole register/coil block in one
+bisect) and as a bitmap (for O(1) membership of a single address).
+"""
+from array import array
+from bisect import bisect_left
+
+__all__ = ["MAX_ADDRESS", "WatchSet", "watch_range"]
+
+MAX_ADDRESS = 0xFFFF  # Modbus addresses are 16-bit; also bounds the bitmap
+
+
+def watch_range(text):
+    """
+    One --watch token: "100" -> 100, "0-9999" -> (0, 9999).
+    Used as an argparse type; raises ValueError on bad input, including
+    addresses above MAX_ADDRESS.
+    """
+    lo, sep, hi = str(text).partition("-")
+    if not sep:
+        addr = int(lo)
+        if addr < 0:
+            raise ValueError(f"negative address: {text}")
+        if addr > MAX_ADDRESS:
+            raise ValueError(f"address above {MAX_ADDRESS}: {text}")
+        return addr
+    lo, hi = int(lo), int(hi)
+    if lo < 0 or hi < lo:
+        raise ValueError(f"bad address range: {text}")
+    if hi > MAX_ADDRESS:
+        raise ValueError(f"address range beyond {MAX_ADDRESS}: {text}")
+    return lo, hi
+
+
+def _bounds(item):
+    if isinstance(item, str):
+        return _bounds(watch_range(item))
+    if isinstance(item, int):
+        lo = hi = item
+    else:
+        lo, hi = int(item[0]), int(item[1])
+    if not 0 <= lo <= hi <= MAX_ADDRESS:
+        raise ValueError(f"bad address range: {item!r} (addresses are 0..{MAX_ADDRESS})")
+    return lo, hi
+
+
+class WatchSet:
+    """Immutable set of addresses; iterable, sized, supports `in`."""
+
+    __slots__ = ("starts", "ends", "_bits", "_size")
+
+    def __init__(self, items=()):
+        if isinstance(items, WatchSet):
+            items = items.ranges()
+        ranges = sorted(_bounds(i) for i in items)
+        merged = []
+        for lo, hi in ranges:
+            if merged and lo <= merged[-1][1] + 1:
+                if hi > merged[-1][1]:
+                    merged[-1][1] = hi
+            else:
+                merged.append([lo, hi])
+        self.starts = array("q", (lo for lo, _hi in merged))
+        self.ends = array("q", (hi for _lo, hi in merged))  # inclusive
+        self._size = sum(hi - lo + 1 for lo, hi in merged)
+
+        bits = bytearray(((merged[-1][1] >> 3) + 1) if merged else 0)
+        for lo, hi in merged:
+            first, last = lo >> 3, hi >> 3
+            if first == last:
+                bits[first] |= (0xFF << (lo & 7)) & (0xFF >> (7 - (hi & 7)))
+                continue
+            bits[first] |= (0xFF << (lo & 7)) & 0xFF
+            bits[first + 1 : last] = b"\xff" * (last - first - 1)
+            bits[last] |= 0xFF >> (7 - (hi & 7))
+        self._bits = bytes(bits)
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __contains__(self, addr):
+        i = addr >> 3
+        return 0 <= i < len(self._bits) and (self._bits[i] >> (addr & 7)) & 1 == 1
+
+    def __iter__(self):
+        for lo, hi in zip(self.starts, self.ends):
+            yield from range(lo, hi + 1)
+
+    def __eq__(self, other):
+        if isinstance(other, WatchSet):
+            return self.starts == other.starts and self.ends == other.ends
+        if isinstance(other, (set, frozenset)):
+            return len(other) == self._size and all(a in self for a in other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"WatchSet({self.ranges()!r})"
+
+    def ranges(self):
+        """Merged (lo, hi) inclusive ranges, ascending."""
+        return list(zip(self.starts, self.ends))
+
+    def union(self, *items):
+        return WatchSet(self.ranges() + list(items))
+
+    def intersect(self, start, count):
+        """Watched (lo, hi) inclusive sub-ranges of the block [start, start + count)."""
+        if count <= 0:
+            return []
+        stop = start + count - 1
+        starts, ends = self.starts, self.ends
+        i = bisect_left(ends, start)
+        out = []
+        while i < len(starts) and starts[i] <= stop:
+            out.append((max(starts[i], start), min(ends[i], stop)))
+            i += 1
+        return out
+
+    def select_block(self, start, values):
+        """{addr: value} for the watched part of a block of values starting at start."""
+        out = {}
+        for lo, hi in self.intersect(start, len(values)):
+            out.update(zip(range(lo, hi + 1), values[lo - start : hi - start + 1]))
+        return out
+
+    def select(self, values):
+        """
+        Watched entries of an {addr: value} mapping or a CoilBitmap
+        (anything with base/count and item access is treated as a block).
+        """
+        base = getattr(values, "base", None)
+        if base is not None:
+            return {a: values[a] for lo, hi in self.intersect(base, values.count)
+                    for a in range(lo, hi + 1)}
+        return {a: v for a, v in values.items() if a in self}
@@ -0,0 +1,195 @@
+# src/mqtt/batch.py
+"""
+Batched MQTT publishing: collect payloads for up to window_ms or
+max_events and hand each topic's batch to send(topic, payloads) as one
+message, instead of one QoS1 round trip per event.
+
+With coalesce=True a later payload with the same key (see payload_key)
+replaces the pending one, so a register that flaps inside one window is
+sent once with its latest value. Only repeats of the same register / rule
+match are merged, never different ones.
+"""
+import threading
+import time
+
+__all__ = ["BatchPublisher", "payload_key"]
+
+
+def payload_key(payload):
+    """
+    Coalescing key of a payload: trigger payloads by (src, unit, reg);
+    rule payloads by (type, ip, unit) plus what they report, i.e. the
+    (address, rule name) of each match, the written coils, or the
+    exception's fc and code, so different rules and registers of one
+    device never replace each other. Anything else is never coalesced (None).
+    """
+    if not isinstance(payload, dict):
+        return None
+    unit = payload.get("unit")
+    if "reg" in payload:
+        return ("reg", payload.get("src"), unit, payload["reg"])
+    kind, ip = payload.get("type"), payload.get("ip")
+    if kind is None or ip is None:
+        return None
+    if "matches" in payload:
+        what = tuple((m.get(kind), m.get("rule")) for m in payload["matches"])
+    elif "coils" in payload:
+        what = tuple(payload["coils"])
+    elif kind == "exception":
+        what = (payload.get("fc"), payload.get("code"))
+    else:
+        return None
+    return (kind, ip, unit, what)
+
+
+class _Pending:
+    __slots__ = ("items", "keys", "first")
+
+    def __init__(self, now):
+        self.items = []      # [(enqueue time, payload)]
+        self.keys = {}       # coalescing key -> index in items
+        self.first = now
+
+
+class BatchPublisher:
+    """
+    send(topic, payloads) -> bool publishes one batch. publish() only
+    queues; batches go out when max_events is reached, when the oldest
+    pending event is window_ms old (background flusher thread), and on
+    flush()/close().
+    """
+
+    def __init__(self, send, window_ms=100, max_events=100, coalesce=False, key=payload_key,
+                 clock=time.monotonic, start=True):
+        self.send = send
+        self.window = window_ms / 1000.0
+        self.max_events = max(1, int(max_events))
+        self.coalesce = coalesce
+        self.key = key
+        self.clock = clock
+        self._pending = {}   # topic -> _Pending
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()   # pop + send, so batches of a topic stay in order
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        # metrics
+        self.events = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.failed = 0
+        self.sent_events = 0
+        self.max_batch = 0
+        self._latency_sum = 0.0   # enqueue -> publish returned, per event
+        self.max_latency = 0.0
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name="mqtt-batch", daemon=True)
+            self._thread.start()
+
+    def publish(self, payload, topic=None):
+        """Queue payload for topic; returns True (delivery is reported in stats())."""
+        now = self.clock()
+        with self._lock:
+            pend = self._pending.get(topic)
+            if pend is None:
+                pend = self._pending[topic] = _Pending(now)
+                self._wake.notify()
+            self.events += 1
+            key = self.key(payload) if self.coalesce else None
+            if key is not None and key in pend.keys:
+                i = pend.keys[key]
+                pend.items[i] = (pend.items[i][0], payload)
+                self.coalesced += 1
+                return True
+            if key is not None:
+                pend.keys[key] = len(pend.items)
+            pend.items.append((now, payload))
+            full = len(pend.items) >= self.max_events
+        if full:
+            self.flush(topic)
+        return True
+
+    def flush(self, topic=...):
+        """Send pending batches now (all topics, or just topic)."""
+        with self._send_lock:
+            with self._lock:
+                if topic is ...:
+                    batches, self._pending = list(self._pending.items()), {}
+                else:
+                    pend = self._pending.pop(topic, None)
+                    batches = [(topic, pend)] if pend is not None else []
+            for t, pend in batches:
+                self._send(t, pend)
+
+    def flush_due(self, now=None):
+        """Send the batches whose window has expired; returns seconds until the next one is due."""
+        now = self.clock() if now is None else now
+        due, wait = [], None
+        with self._send_lock:
+            with self._lock:
+                for topic, pend in list(self._pending.items()):
+                    left = pend.first + self.window - now
+                    if left <= 0:
+                        due.append((topic, self._pending.pop(topic)))
+                    elif wait is None or left < wait:
+                        wait = left
+            for topic, pend in due:
+                self._send(topic, pend)
+        return wait
+
+    def _send(self, topic, pend):
+        payloads = [p for _t, p in pend.items]
+        try:
+            ok = self.send(topic, payloads) is not False
+        except Exception:
+            ok = False
+        done = self.clock()
+        with self._lock:
+            self.batches += 1
+            if not ok:
+                self.failed += 1
+                return
+            n = len(payloads)
+            self.sent_events += n
+            if n > self.max_batch:
+                self.max_batch = n
+            for t, _p in pend.items:
+                lat = done - t
+                self._latency_sum += lat
+                if lat > self.max_latency:
+                    self.max_latency = lat
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+            wait = self.flush_due()
+            if wait:
+                with self._lock:
+                    if not self._closed:
+                        self._wake.wait(wait)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            sent = self.sent_events
+            return {
+                "events": self.events,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "failed_batches": self.failed,
+                "avg_batch": round(sent / (self.batches - self.failed), 2) if self.batches > self.failed else 0.0,
+                "max_batch": self.max_batch,
+                "avg_latency_ms": round(self._latency_sum / sent * 1e3, 3) if sent else 0.0,
+                "max_latency_ms": round(self.max_latency * 1e3, 3),
+            }
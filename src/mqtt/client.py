@@ -1,104 +1,327 @@
 # src/mqtt/client.py
-import json
+import os
 
 try:
     import paho.mqtt.client as mqtt
     from paho.mqtt.client import CallbackAPIVersion
+    # publish() results for which paho did not queue the message; any other
+    # failure (e.g. NO_CONN while reconnecting) leaves a QoS1 message in
+    # paho's queue, to be sent after the reconnect
+    _REFUSED = frozenset((mqtt.MQTT_ERR_NOMEM, mqtt.MQTT_ERR_QUEUE_SIZE))
     MQTT_OK = True
 except ImportError:
     MQTT_OK = False
 
 from config import *  # existing pattern retained; consider namespaced imports later
 from app_logging import log_info, log_err
+from mqtt.batch import BatchPublisher
+from mqtt.encoders import JsonEncoder
+from mqtt.routing import DEFAULT_BROKER, Router
+from mqtt.spool import DiskSpool, SpoolForwarder
 
-_client = None
-_connected = False
+_client = None    # paho client of the default broker
+_pool = {}        # broker name -> BrokerConnection
+_router = None
 
 
-def init_mqtt():
-    """Initialize MQTT client using paho-mqtt v2 Callback API VERSION2."""
-    global _client, _connected
+class BrokerConnection:
+    """
+    One broker: a persistent paho client with its own network loop
+    (loop_start), plus the optional batcher and store-and-forward spool
+    that publishes to it go through. encoder (mqtt/encoders.py) turns
+    payloads and batches into the published bytes.
+    """
+
+    def __init__(self, name, host, port=1883, username="", password="", keepalive=60, client_id=None,
+                 encoder=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.client_id = client_id or MQTT_CLIENT_ID
+        self.encoder = encoder or JsonEncoder()
+        self.label = "" if name == DEFAULT_BROKER else f" ({name})"
+        self.client = None
+        self.connected = False
+        self.batcher = None
+        self.spool = None
+        self.forwarder = None
+
+    def start(self, spool_dir="", spool_max_mb=MQTT_SPOOL_MAX_MB, spool_max_age_s=MQTT_SPOOL_MAX_AGE_S,
+              drain_rate=MQTT_SPOOL_DRAIN_RATE, batch_ms=0, batch_max=MQTT_BATCH_MAX, coalesce=False):
+        """Create the client and start its loop; False if that failed."""
+        try:
+            # Select v2 callback API to remove deprecation warnings and align with paho 2.x
+            # Docs: migrations & Client constructor.
+            c = mqtt.Client(
+                CallbackAPIVersion.VERSION2,
+                client_id=self.client_id,
+                clean_session=True,  # OK for MQTT v3.1.1; for v5 use clean_start in connect()
+            )
+
+            # Resilience: reconnect backoff
+            c.reconnect_delay_set(min_delay=1, max_delay=30)
+
+            # Authentication (optional) and TLS (optional)
+            if self.username:
+                c.username_pw_set(self.username, self.password)
+            # If your broker uses TLS (e.g., port 8883), uncomment:
+            # if self.port == 8883:
+            #     c.tls_set()
+
+            c.on_connect = self._on_connect
+            c.on_disconnect = self._on_disconnect
+
+            if spool_dir:
+                # An unreachable broker at start-up is just an outage: spool and keep retrying
+                c.connect_async(self.host, self.port, self.keepalive)
+            else:
+                c.connect(self.host, self.port, self.keepalive)
+            c.loop_start()
+            self.client = c
+        except Exception as e:
+            log_err(f"MQTT init error{self.label}: {e}")
+            return False
+
+        if spool_dir:
+            try:
+                self.spool = DiskSpool(spool_dir, max_bytes=int(spool_max_mb * (1 << 20)),
+                                       max_age_s=spool_max_age_s)
+            except OSError as e:
+                log_err(f"MQTT spool unavailable ({spool_dir}): {e}")
+            else:
+                self.forwarder = SpoolForwarder(
+                    self.spool, self._publish_acked, lambda: self.connected, rate=drain_rate,
+                ).start()
+                if len(self.spool):
+                    log_info(f"MQTT spool: {len(self.spool)} messages waiting in {spool_dir}")
+
+        if batch_ms and batch_ms > 0:
+            self.batcher = BatchPublisher(self._publish_batch, window_ms=batch_ms,
+                                          max_events=batch_max, coalesce=coalesce)
+        return True
+
+    # ---- v2 callback signatures (robust to 4-arg vs 5-arg variants) ----
+    def _on_connect(self, client, userdata, *args):
+        """
+        Tolerate both:
+        - (client, userdata, flags, reason_code, properties)  [5 args]
+        - (client, userdata, reason_code, properties)          [4 args]
+        """
+        flags = None
+        reason_code = None
+        properties = None
+        if len(args) == 4:
+            flags, reason_code, properties = args[0], args[1], args[2]  # extra arg guard
+        elif len(args) == 3:
+            flags, reason_code, properties = args[0], args[1], args[2]
+        elif len(args) == 2:
+            reason_code, properties = args[0], args[1]
+        else:
+            reason_code = args[0] if args else 0
+        self.connected = (reason_code == 0)
+        if self.connected:
+            log_info(f"MQTT connected{self.label}")
+        else:
+            log_err(f"MQTT connect failed{self.label}: {reason_code}")
+
+    def _on_disconnect(self, client, userdata, *args):
+        """
+        Tolerate both:
+        - (client, userdata, flags, reason_code, properties)  [5 args]
+        - (client, userdata, reason_code, properties)          [4 args]
+        """
+        self.connected = False
+        if len(args) >= 2:
+            reason_code = args[1]
+        elif len(args) >= 1:
+            reason_code = args[0]
+        else:
+            reason_code = None
+        log_err(f"MQTT disconnected{self.label}: {reason_code}")
+
+    def deliver(self, topic, data):
+        """
+        Publish, or spool while disconnected / a backlog is still draining
+        (keeps order). A message paho refused is spooled too; one paho
+        queued despite a failed publish() is not, or it would go out twice.
+        """
+        spool = self.spool
+        if spool is not None and (not self.connected or len(spool)):
+            spool.append(topic, data)
+            return True
+        rc = getattr(self.client.publish(topic, data, qos=1), "rc", None)
+        if rc == mqtt.MQTT_ERR_SUCCESS or (rc is not None and rc not in _REFUSED):
+            return True
+        if spool is not None:
+            spool.append(topic, data)
+            return True
+        return False
+
+    def _publish_acked(self, topic, data, timeout=5.0):
+        """Spool replay: publish and wait for the PUBACK before the record is dropped."""
+        info = self.client.publish(topic, data, qos=1)
+        if getattr(info, "rc", None) != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        info.wait_for_publish(timeout)
+        return info.is_published()
+
+    def _publish_batch(self, topic, payloads):
+        return self.deliver(topic, self.encoder.encode_batch(payloads))
+
+    def publish(self, payload, topic):
+        if self.client is None:
+            return False
+        if self.batcher is not None:
+            return self.batcher.publish(payload, topic)
+        try:
+            return self.deliver(topic, self.encoder.encode(payload))
+        except Exception as e:
+            log_err(f"MQTT publish error{self.label}: {e}")
+            return False
+
+    def stats(self):
+        stats = self.batcher.stats() if self.batcher is not None else {}
+        if self.spool is not None:
+            stats.update((f"spool_{k}", v) for k, v in self.spool.stats().items())
+        return stats
+
+    def close(self):
+        """Send anything still batched, stop the spool and the network loop; returns the final stats()."""
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.forwarder is not None:
+            self.forwarder.stop()
+            self.forwarder = None
+        stats = self.stats()
+        self.batcher = None
+        if self.spool is not None:
+            self.spool.close()  # whatever is left is replayed on the next start
+            self.spool = None
+        if self.client is not None:
+            try:
+                self.client.loop_stop()
+                self.client.disconnect()
+            except Exception as e:
+                log_err(f"MQTT close error{self.label}: {e}")
+            self.client = None
+        return stats
+
+
+def _broker_settings(name, brokers):
+    if name == DEFAULT_BROKER:
+        spec = {"host": MQTT_BROKER, "port": MQTT_PORT, "username": MQTT_USERNAME,
+                "password": MQTT_PASSWORD, "keepalive": MQTT_KEEPALIVE}
+        spec.update(brokers.get(name, {}))
+        return spec
+    spec = {"keepalive": MQTT_KEEPALIVE, "client_id": f"{MQTT_CLIENT_ID}-{name}"}
+    spec.update(brokers[name])
+    return spec
+
+
+def init_mqtt(batch_ms=None, batch_max=None, coalesce=None, spool_dir=None,
+              spool_max_mb=None, spool_max_age_s=None, drain_rate=None,
+              topic=None, routes=None, brokers=None, encoder=None):
+    """
+    Initialize MQTT clients using paho-mqtt v2 Callback API VERSION2.
+    batch_ms > 0 (default config.MQTT_BATCH_MS) publishes a JSON list of
+    the events collected over that window / batch_max events instead of
+    one message per event; coalesce keeps only the latest of repeats.
+    spool_dir (default config.MQTT_SPOOL_DIR) turns on store-and-forward:
+    messages published while disconnected go to disk and are replayed in
+    order at drain_rate messages/s once the broker is back.
+    topic (default config.MQTT_TOPIC) may be a template such as
+    "plant/{src}/{unit}/reg/{reg}"; routes / brokers (config.MQTT_ROUTES /
+    MQTT_BROKERS, see mqtt/routing.py) send payloads to further topics and
+    brokers, one connection per broker used, each with its own network
+    loop, batcher and spool (a subdirectory of spool_dir named after it).
+    encoder (default: JSON, orjson when installed) encodes what is published.
+    """
+    global _client, _router
     if not MQTT_OK:
         log_err("MQTT unavailable")
         return
+    brokers = MQTT_BROKERS if brokers is None else brokers
+    valid = []
+    for spec in MQTT_ROUTES if routes is None else routes:
+        name = spec.get("broker", DEFAULT_BROKER)
+        if name != DEFAULT_BROKER and name not in brokers:
+            log_err(f"MQTT route {spec.get('topic')!r}: unknown broker {name!r}")
+            continue
+        if name != DEFAULT_BROKER and not brokers[name].get("host"):
+            log_err(f"MQTT route {spec.get('topic')!r}: broker {name!r} has no host")
+            continue
+        valid.append(spec)
     try:
-        # Select v2 callback API to remove deprecation warnings and align with paho 2.x
-        # Docs: migrations & Client constructor.
-        c = mqtt.Client(
-            CallbackAPIVersion.VERSION2,
-            client_id=MQTT_CLIENT_ID,
-            clean_session=True,  # OK for MQTT v3.1.1; for v5 use clean_start in connect()
-        )
-
-        # Resilience: reconnect backoff
-        c.reconnect_delay_set(min_delay=1, max_delay=30)
-
-        # Authentication (optional) and TLS (optional)
-        if MQTT_USERNAME:
-            c.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-        # If your broker uses TLS (e.g., port 8883), uncomment:
-        # if MQTT_PORT == 8883:
-        #     c.tls_set()
-
-        # ---- v2 callback signatures (robust to 4-arg vs 5-arg variants) ----
-        def _on_connect(client, userdata, *args):
-            """
-            Tolerate both:
-            - (client, userdata, flags, reason_code, properties)  [5 args]
-            - (client, userdata, reason_code, properties)          [4 args]
-            """
-            global _connected
-            flags = None
-            reason_code = None
-            properties = None
-            if len(args) == 4:
-                flags, reason_code, properties = args[0], args[1], args[2]  # extra arg guard
-            elif len(args) == 3:
-                flags, reason_code, properties = args[0], args[1], args[2]
-            elif len(args) == 2:
-                reason_code, properties = args[0], args[1]
-            else:
-                reason_code = args[0] if args else 0
-            _connected = (reason_code == 0)
-            if _connected:
-                log_info("MQTT connected")
-            else:
-                log_err(f"MQTT connect failed: {reason_code}")
-
-        def _on_disconnect(client, userdata, *args):
-            """
-            Tolerate both:
-            - (client, userdata, flags, reason_code, properties)  [5 args]
-            - (client, userdata, reason_code, properties)          [4 args]
-            """
-            global _connected
-            _connected = False
-            if len(args) >= 2:
-                reason_code = args[1]
-            elif len(args) >= 1:
-                reason_code = args[0]
-            else:
-                reason_code = None
-            log_err(f"MQTT disconnected: {reason_code}")
-
-        c.on_connect = _on_connect
-        c.on_disconnect = _on_disconnect
+        router = Router(valid, MQTT_TOPIC if topic is None else topic)
+    except ValueError as e:
+        log_err(f"MQTT routes: {e}")
+        return
 
-        c.connect(MQTT_BROKER, MQTT_PORT, MQTT_KEEPALIVE)
-        c.loop_start()
-        _client = c
-    except Exception as e:
-        log_err(f"MQTT init error: {e}")
+    spool_dir = MQTT_SPOOL_DIR if spool_dir is None else spool_dir
+    options = dict(
+        spool_max_mb=MQTT_SPOOL_MAX_MB if spool_max_mb is None else spool_max_mb,
+        spool_max_age_s=MQTT_SPOOL_MAX_AGE_S if spool_max_age_s is None else spool_max_age_s,
+        drain_rate=MQTT_SPOOL_DRAIN_RATE if drain_rate is None else drain_rate,
+        batch_ms=MQTT_BATCH_MS if batch_ms is None else batch_ms,
+        batch_max=MQTT_BATCH_MAX if batch_max is None else batch_max,
+        coalesce=MQTT_COALESCE if coalesce is None else coalesce,
+    )
+    # The default broker first: the rest are only opened when a route uses them
+    for name in sorted(router.brokers, key=lambda n: n != DEFAULT_BROKER):
+        conn = BrokerConnection(name, encoder=encoder, **_broker_settings(name, brokers))
+        if name != DEFAULT_BROKER and spool_dir:
+            own_spool = os.path.join(spool_dir, name)
+        else:
+            own_spool = spool_dir
+        if conn.start(spool_dir=own_spool, **options):
+            _pool[name] = conn
+        elif name == DEFAULT_BROKER:
+            return
+    _client = _pool[DEFAULT_BROKER].client
+    _router = router
 
 
 def mqtt_publish(payload):
-    """Publish JSON payload at QoS 1. Returns True on success, False otherwise."""
+    """
+    Publish the encoded payload at QoS 1 to every topic/broker it is routed to.
+    Returns True on success, False if any of them failed. When batching,
+    the payload is queued and True means accepted.
+    """
     if not _client:
         log_err("MQTT publish failed: client not initialized")
         return False
-    try:
-        result = _client.publish(MQTT_TOPIC, json.dumps(payload), qos=1)
-        return getattr(result, "rc", None) == mqtt.MQTT_ERR_SUCCESS
-    except Exception as e:
-        log_err(f"MQTT publish error: {e}")
-        return False
+    ok = True
+    for name, topic in _router.resolve(payload):
+        conn = _pool.get(name)
+        if conn is None or conn.publish(payload, topic) is False:
+            ok = False
+    return ok
+
+
+def mqtt_stats():
+    """
+    Batch metrics (events, batches, sizes, latency) and spool_* counters of
+    the default broker, the same prefixed "<broker>_" for the others; {}
+    when neither batching nor spooling is on.
+    """
+    stats = {}
+    for name, conn in _pool.items():
+        prefix = "" if name == DEFAULT_BROKER else f"{name}_"
+        stats.update((prefix + k, v) for k, v in conn.stats().items())
+    return stats
+
+
+def close_mqtt():
+    """Send anything still batched and stop the network loops; returns the final mqtt_stats()."""
+    global _client, _router
+    stats = {}
+    for name, conn in list(_pool.items()):
+        prefix = "" if name == DEFAULT_BROKER else f"{name}_"
+        stats.update((prefix + k, v) for k, v in conn.close().items())
+    _pool.clear()
+    _client = None
+    _router = None
+    return stats
@@ -0,0 +1,266 @@
+# src/mqtt/encoders.py
+"""
+Payload encoders: payload (dict / str) -> the bytes published.
+
+    json    orjson when installed (compact, several times faster), else
+            the stdlib json module
+    binary  trigger events as one fixed big-endian struct, under a third
+            of their JSON size; anything else falls back to JSON
+
+Binary trigger record (TriggerLayout):
+
+    u8 0xB1 | u32 layout id | i64 ts (ns) | src[4] | dst[4] | u8 unit | u8 fc
+    | u16 reg | u16 value | context presence bitmap | u16 per context register
+    | f64 per tag value (NaN when absent)
+
+The layout (context register order, tag names and counts) is compiled once
+per trigger definition; its id is a crc32 of that definition, so
+decode_trigger() can pick the right one. A batch is u8 0xB2 | u16 count
+followed by u16 length + record for each payload.
+"""
+import json
+import math
+import socket
+import struct
+import zlib
+
+try:
+    import orjson
+except ImportError:  # stdlib json is used instead
+    orjson = None
+
+__all__ = ["ENCODERS", "BinaryEncoder", "JsonEncoder", "TriggerLayout", "decode_trigger", "get_encoder"]
+
+TRIGGER_MAGIC = 0xB1
+BATCH_MAGIC = 0xB2
+MAX_LAYOUTS = 256
+
+_HEAD = struct.Struct(">BIq4s4sBBHH")
+_BATCH = struct.Struct(">BH")
+_LEN = struct.Struct(">H")
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+_NAN = math.nan
+_IPS = {}
+
+
+def _ip(addr):
+    """inet_aton, cached: trigger payloads come from a handful of devices."""
+    packed = _IPS.get(addr)
+    if packed is None:
+        packed = socket.inet_aton(addr)
+        if len(_IPS) >= MAX_LAYOUTS * 16:
+            _IPS.clear()
+        _IPS[addr] = packed
+    return packed
+
+
+class JsonEncoder:
+    name = "json"
+
+    def __init__(self, fast=True):
+        self.fast = fast and orjson is not None
+
+    def encode(self, payload):
+        if self.fast:
+            try:
+                return orjson.dumps(payload, option=_ORJSON_OPTS)
+            except TypeError:  # e.g. ints beyond 64 bits: let the stdlib decide
+                pass
+        return json.dumps(payload)
+
+    def encode_batch(self, payloads):
+        return self.encode(payloads)
+
+
+class TriggerLayout:
+    """
+    The fixed record of one trigger definition: context register keys (in
+    payload order) and (tag name, value count) pairs.
+    """
+
+    def __init__(self, context=(), tags=()):
+        self.context = tuple(str(k) for k in context)
+        self.tags = tuple((str(name), int(count)) for name, count in tags)
+        self._names = frozenset(name for name, _count in self.tags)
+        self.id = zlib.crc32(repr((self.context, self.tags)).encode("utf-8"))
+        n = len(self.context)
+        self._bitmap = (n + 7) // 8
+        self._all_present = bytes(((1 << n) - 1).to_bytes(self._bitmap, "little"))
+        self._scalar = all(count == 1 for _name, count in self.tags)
+        nvals = sum(count for _name, count in self.tags)
+        self.struct = struct.Struct(f"{_HEAD.format}{self._bitmap}s{n}H{nvals}d")
+        self.size = self.struct.size
+
+    @classmethod
+    def for_payload(cls, payload):
+        tags = payload.get("tags") or {}
+        return cls(payload.get("context") or (),
+                   [(k, len(v) if isinstance(v, (list, tuple)) else 1) for k, v in tags.items()])
+
+    def fits(self, payload):
+        context = payload.get("context") or {}
+        tags = payload.get("tags") or {}
+        return (len(context) == len(self.context) and all(k in context for k in self.context)
+                and self._names.issuperset(tags))
+
+    def encode(self, payload):
+        """The record; raises ValueError when payload does not fit the layout."""
+        try:
+            context = payload.get("context") or {}
+            words = [context[key] for key in self.context]
+            if None in words:
+                bitmap = bytearray(self._bitmap)
+                for i, v in enumerate(words):
+                    if v is None:
+                        words[i] = 0
+                    else:
+                        bitmap[i >> 3] |= 1 << (i & 7)
+                bitmap = bytes(bitmap)
+            else:
+                bitmap = self._all_present
+            tags = payload.get("tags")
+            if not self.tags:
+                nums = ()
+            elif self._scalar:
+                get = (tags or {}).get
+                nums = [get(name, _NAN) for name, _count in self.tags]
+            else:
+                nums = self._tag_values(tags or {})
+            return self.struct.pack(
+                TRIGGER_MAGIC, self.id, payload["ts"], _ip(payload["src"]), _ip(payload["dst"]),
+                payload["unit"], payload["fc"], payload["reg"], payload["value"],
+                bitmap, *words, *nums,
+            )
+        except (KeyError, TypeError, OSError, struct.error) as e:
+            raise ValueError(f"payload does not fit layout {self.id:#010x}: {e}") from None
+
+    def _tag_values(self, tags):
+        nums = []
+        for name, count in self.tags:
+            v = tags.get(name)
+            if v is None:
+                nums.extend([_NAN] * count)
+            elif count == 1:
+                nums.append(v)
+            elif len(v) == count:
+                nums.extend(v)
+            else:
+                raise ValueError(f"tag {name}: {len(v)} values, layout has {count}")
+        return nums
+
+    def decode(self, data, offset=0):
+        fields = self.struct.unpack_from(data, offset)
+        _magic, _id, ts, src, dst, unit, fc, reg, value = fields[:9]
+        body = fields[9:]
+        bitmap, n = body[0], len(self.context)
+        context = {key: body[1 + i] if bitmap[i >> 3] >> (i & 7) & 1 else None
+                   for i, key in enumerate(self.context)}
+        tags, pos = {}, 1 + n
+        for name, count in self.tags:
+            vals = body[pos:pos + count]
+            pos += count
+            if not all(math.isnan(v) for v in vals):
+                tags[name] = vals[0] if count == 1 else list(vals)
+        out = {"ts": ts, "src": socket.inet_ntoa(src), "dst": socket.inet_ntoa(dst), "unit": unit,
+               "fc": fc, "reg": reg, "value": value, "context": context}
+        if tags:
+            out["tags"] = tags
+        return out
+
+    def describe(self):
+        """JSON-able definition, for consumers decoding the records."""
+        return {"id": self.id, "context": list(self.context), "tags": [list(t) for t in self.tags]}
+
+    def __repr__(self):
+        return f"TriggerLayout(id={self.id:#010x}, context={list(self.context)}, tags={list(self.tags)})"
+
+
+class BinaryEncoder:
+    """
+    Trigger payloads ({"ts": ns, "src", "dst", "unit", "fc", "reg", "value",
+    "context"[, "tags"]}) as TriggerLayout records; layouts are the ones
+    given up front plus any compiled on first sight of a new payload shape,
+    which is handed to on_layout(layout) so consumers can learn its
+    definition. Other payloads are encoded by fallback (JSON).
+    """
+
+    name = "binary"
+
+    def __init__(self, layouts=(), fallback=None, on_layout=None):
+        self.layouts = list(layouts)
+        self.fallback = fallback or JsonEncoder()
+        self.on_layout = on_layout
+        self._by_shape = {}
+
+    def layout(self, payload):
+        tags = payload.get("tags")
+        shape = (tuple(payload.get("context") or ()), tuple(tags) if tags else ())
+        layout = self._by_shape.get(shape)
+        if layout is None:
+            layout = next((lo for lo in self.layouts if lo.fits(payload)), None)
+            if layout is None:
+                layout = TriggerLayout.for_payload(payload)
+                if self.on_layout is not None:
+                    self.on_layout(layout)
+            if len(self._by_shape) >= MAX_LAYOUTS:
+                self._by_shape.clear()
+            self._by_shape[shape] = layout
+        return layout
+
+    def encode(self, payload):
+        if isinstance(payload, dict) and "reg" in payload and "context" in payload:
+            try:
+                return self.layout(payload).encode(payload)
+            except ValueError:
+                pass
+        data = self.fallback.encode(payload)
+        return data.encode("utf-8") if isinstance(data, str) else data
+
+    def encode_batch(self, payloads):
+        parts = [_BATCH.pack(BATCH_MAGIC, len(payloads))]
+        for payload in payloads:
+            rec = self.encode(payload)
+            parts.append(_LEN.pack(len(rec)))
+            parts.append(rec)
+        return b"".join(parts)
+
+
+def decode_trigger(data, layouts):
+    """
+    Payload dict(s) from a binary record or batch; layouts are the
+    TriggerLayouts (or their describe() dicts) that may have produced it.
+    JSON fallback records are parsed as JSON.
+    """
+    by_id = {}
+    for lo in layouts:
+        if isinstance(lo, dict):
+            lo = TriggerLayout(lo["context"], lo["tags"])
+        by_id[lo.id] = lo
+
+    def record(buf):
+        if buf[:1] != bytes([TRIGGER_MAGIC]):
+            return json.loads(bytes(buf))
+        layout_id = _HEAD.unpack_from(buf)[1]
+        if layout_id not in by_id:
+            raise ValueError(f"unknown trigger layout {layout_id:#010x}")
+        return by_id[layout_id].decode(buf)
+
+    data = memoryview(data)
+    if data[:1] != bytes([BATCH_MAGIC]):
+        return record(data)
+    _magic, count = _BATCH.unpack_from(data)
+    out, pos = [], _BATCH.size
+    for _ in range(count):
+        n = _LEN.unpack_from(data, pos)[0]
+        pos += _LEN.size
+        out.append(record(data[pos:pos + n]))
+        pos += n
+    return out
+
+
+ENCODERS = {"json": JsonEncoder, "binary": BinaryEncoder}
+
+
+def get_encoder(name, **kwargs):
+    """Encoder instance by --payload-format name ("text" payloads are JSON strings)."""
+    return ENCODERS.get(name, JsonEncoder)(**kwargs)
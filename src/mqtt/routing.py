@@ -0,0 +1,143 @@
+# src/mqtt/routing.py
+"""
+Topic templates and routes: which broker(s) and topic(s) a payload goes to.
+
+A topic template is a str.format pattern over payload fields, e.g.
+"plant/{src}/{unit}/reg/{reg}". Rule payloads ({"type", "ip", "matches"})
+also provide src (their ip) and the first match's rule / reg / coil /
+value. Missing fields render as "_", and "/", "+" and "#" inside a value
+are replaced so one field is always one topic level. Rendered topics are
+cached per tuple of field values.
+
+A route is a dict:
+
+    {"topic": "plant/{src}/{unit}/reg/{reg}"}
+    {"broker": "historian", "topic": "hist/{src}/{rule}", "rules": ["pulse_box_started"]}
+    {"broker": "alarms", "topic": "alarms/{ip}", "match": {"type": ["exception", "coil"]}}
+
+broker names a connection (default "default"); "rules" selects rule
+payloads with at least one match of those rule names; "match" compares
+payload fields (a list means any of them). A payload goes to every route
+that accepts it, and to the fallback topic on the default broker when none
+does.
+"""
+from string import Formatter
+
+__all__ = ["DEFAULT_BROKER", "TopicTemplate", "Route", "Router", "field"]
+
+DEFAULT_BROKER = "default"
+MAX_TOPICS = 4096
+MISSING = "_"
+_UNSAFE = str.maketrans({"/": "_", "+": "_", "#": "_"})
+_MATCH_ALIASES = {"reg": "register"}
+
+
+def field(payload, name):
+    """Value of a template/match field in payload, or None."""
+    if not isinstance(payload, dict):
+        return None
+    value = payload.get(name)
+    if value is not None:
+        return value
+    if name == "src":
+        return payload.get("ip")
+    matches = payload.get("matches")
+    if matches:
+        return matches[0].get(_MATCH_ALIASES.get(name, name))
+    return None
+
+
+class TopicTemplate:
+    """A topic pattern; render(payload) formats it once per distinct field values."""
+
+    __slots__ = ("pattern", "fields", "_static", "_cache")
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        names = []
+        for _text, name, _spec, _conv in Formatter().parse(pattern):
+            if name is None:
+                continue
+            if not name.isidentifier():
+                raise ValueError(f"topic {pattern!r}: bad field {{{name}}}")
+            if name not in names:
+                names.append(name)
+        self.fields = tuple(names)
+        self._static = None if names else pattern.format()
+        self._cache = {}
+
+    def render(self, payload):
+        if self._static is not None:
+            return self._static
+        key = tuple(field(payload, name) for name in self.fields)
+        try:
+            topic = self._cache.get(key)
+        except TypeError:  # a list/dict field value: not cacheable
+            return self._format(key)
+        if topic is None:
+            topic = self._format(key)
+            if len(self._cache) >= MAX_TOPICS:
+                self._cache.clear()
+            self._cache[key] = topic
+        return topic
+
+    def _format(self, key):
+        values = {name: MISSING if v is None else str(v).translate(_UNSAFE) or MISSING
+                  for name, v in zip(self.fields, key)}
+        return self.pattern.format(**values)
+
+    def __repr__(self):
+        return f"TopicTemplate({self.pattern!r})"
+
+
+class Route:
+    __slots__ = ("broker", "template", "rules", "match")
+
+    def __init__(self, topic, broker=DEFAULT_BROKER, rules=None, match=None):
+        self.broker = broker
+        self.template = topic if isinstance(topic, TopicTemplate) else TopicTemplate(topic)
+        self.rules = frozenset(rules) if rules else None
+        self.match = {k: frozenset(v) if isinstance(v, (list, tuple, set)) else frozenset([v])
+                      for k, v in (match or {}).items()}
+
+    @classmethod
+    def from_dict(cls, spec):
+        spec = dict(spec)
+        try:
+            return cls(spec.pop("topic"), **spec)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"bad route {spec!r}: {e}") from None
+
+    def accepts(self, payload):
+        for name, allowed in self.match.items():
+            value = field(payload, name)
+            if value is None or isinstance(value, (dict, list)) or value not in allowed:
+                return False
+        if self.rules is not None:
+            if not isinstance(payload, dict):
+                return False
+            return any(m.get("rule") in self.rules for m in payload.get("matches") or ())
+        return True
+
+    def __repr__(self):
+        return f"Route({self.template.pattern!r}, broker={self.broker!r})"
+
+
+class Router:
+    """routes (Route objects or dicts) plus the fallback topic on the default broker."""
+
+    def __init__(self, routes=(), fallback="", broker=DEFAULT_BROKER):
+        self.routes = [r if isinstance(r, Route) else Route.from_dict(r) for r in routes]
+        self.fallback = Route(fallback, broker)
+
+    @property
+    def brokers(self):
+        """Broker names any payload can be sent to."""
+        return {self.fallback.broker} | {r.broker for r in self.routes}
+
+    def resolve(self, payload):
+        """[(broker, topic)] for payload; never empty."""
+        out = [(r.broker, r.template.render(payload)) for r in self.routes if r.accepts(payload)]
+        if not out:
+            out.append((self.fallback.broker, self.fallback.template.render(payload)))
+        return out
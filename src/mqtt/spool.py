@@ -0,0 +1,333 @@
+# src/mqtt/spool.py
+"""
+Disk-backed store-and-forward queue for MQTT publishes.
+
+While the broker is unreachable, messages go to append-only segment files
+(seg-<n>.log) in the spool directory instead of paho's unbounded in-memory
+queue; an index file holds the read cursor, so nothing is lost across a
+restart. After reconnect a SpoolForwarder replays the backlog in order at a
+fixed rate, waiting for each PUBACK before advancing the cursor.
+
+Record layout: <u32 body length><u32 crc32(body)><i64 append time ns>
+followed by the body, <u16 topic length><topic utf-8><payload bytes>.
+
+Appends are buffered and written in batches. The spool is capped by total
+size (oldest segments are dropped first) and optionally by record age;
+every dropped record is counted in stats().
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+
+__all__ = ["DiskSpool", "SpoolForwarder"]
+
+_HEAD = struct.Struct("<IIq")
+_TOPIC = struct.Struct("<H")
+_INDEX = struct.Struct("<QQQ")   # cursor: segment number, byte offset, records consumed in it
+
+
+class _Segment:
+    __slots__ = ("seq", "path", "size", "records", "last_ns")
+
+    def __init__(self, seq, path, size=0, records=0, last_ns=0):
+        self.seq = seq
+        self.path = path
+        self.size = size
+        self.records = records
+        self.last_ns = last_ns
+
+
+class DiskSpool:
+    """
+    directory     : created if missing; reopening it resumes the backlog
+    segment_bytes : roll to a new segment file past this size
+    max_bytes     : drop the oldest segments beyond this total size
+    max_age_s     : skip (and count) records older than this on replay; 0 = keep
+    batch         : buffered appends written per write
+    """
+
+    def __init__(self, directory, segment_bytes=4 << 20, max_bytes=256 << 20, max_age_s=0,
+                 batch=64, fsync=False, clock=time.time_ns):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.segment_bytes = max(4096, min(int(segment_bytes), self.max_bytes // 4 or 4096))
+        self.max_age_ns = int(max_age_s * 1e9)
+        self.batch = max(1, int(batch))
+        self.fsync = fsync
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._buf = []
+        self._peeked = []          # cursor positions after each record of the last peek()
+        self.appended = 0
+        self.replayed = 0
+        self.dropped_size = 0
+        self.dropped_age = 0
+        self.corrupt = 0
+
+        self._segments = deque()
+        for path in sorted(self.dir.glob("seg-*.log")):
+            self._segments.append(self._scan(int(path.stem[4:]), path))
+        self._cursor = self._load_index()
+        if not self._segments:
+            self._segments.append(self._new_segment(self._cursor[0] or 1))
+        self._drop_before(self._cursor[0])
+        first = self._segments[0]
+        if self._cursor[0] != first.seq:
+            self._cursor = (first.seq, 0, 0)
+        elif self._cursor[2] > first.records or self._cursor[1] > first.size:
+            self._cursor = (first.seq, first.size, first.records)
+        self._out = open(self._segments[-1].path, "ab")
+
+    # -- files ----------------------------------------------------------------
+
+    def _new_segment(self, seq):
+        path = self.dir / f"seg-{seq:012d}.log"
+        path.touch()
+        return _Segment(seq, path)
+
+    def _scan(self, seq, path):
+        """Count the records of a segment; cut a torn tail left by a crash."""
+        seg = _Segment(seq, path)
+        with open(path, "rb") as f:
+            data = f.read()
+        off = 0
+        while off + _HEAD.size <= len(data):
+            length, crc, ts = _HEAD.unpack_from(data, off)
+            end = off + _HEAD.size + length
+            if end > len(data) or zlib.crc32(data[off + _HEAD.size:end]) != crc:
+                break
+            seg.records += 1
+            seg.last_ns = ts
+            off = end
+        if off != len(data):
+            self.corrupt += 1
+            with open(path, "r+b") as f:
+                f.truncate(off)
+        seg.size = off
+        return seg
+
+    def _load_index(self):
+        try:
+            raw = (self.dir / "index").read_bytes()
+            return _INDEX.unpack(raw[:_INDEX.size])
+        except (OSError, struct.error):
+            return (self._segments[0].seq if self._segments else 0, 0, 0)
+
+    def _save_index(self):
+        tmp = self.dir / "index.tmp"
+        tmp.write_bytes(_INDEX.pack(*self._cursor))
+        os.replace(tmp, self.dir / "index")
+
+    def _drop_before(self, seq):
+        while len(self._segments) > 1 and self._segments[0].seq < seq:
+            self._segments.popleft().path.unlink(missing_ok=True)
+
+    # -- writing --------------------------------------------------------------
+
+    def append(self, topic, payload):
+        """Queue one message (payload str or bytes); written once batch records are buffered."""
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        t = topic.encode("utf-8")
+        body = _TOPIC.pack(len(t)) + t + payload
+        rec = _HEAD.pack(len(body), zlib.crc32(body), self.clock()) + body
+        with self._lock:
+            self._buf.append(rec)
+            self.appended += 1
+            if len(self._buf) >= self.batch:
+                self._write()
+
+    def flush(self):
+        """Write buffered appends to disk."""
+        with self._lock:
+            if self._buf:
+                self._write()
+
+    def _write(self):
+        seg = self._segments[-1]
+        data = b"".join(self._buf)
+        self._out.write(data)
+        self._out.flush()
+        if self.fsync:
+            os.fsync(self._out.fileno())
+        seg.size += len(data)
+        seg.records += len(self._buf)
+        seg.last_ns = _HEAD.unpack_from(self._buf[-1])[2]
+        self._buf = []
+        if seg.size >= self.segment_bytes:
+            self._out.close()
+            self._segments.append(self._new_segment(seg.seq + 1))
+            self._out = open(self._segments[-1].path, "ab")
+            self._advance(self._cursor)  # drops the old segment if it was fully replayed
+        self._enforce_size()
+
+    def _enforce_size(self):
+        total = sum(s.size for s in self._segments)
+        while total > self.max_bytes and len(self._segments) > 1:
+            seg = self._segments.popleft()
+            consumed = self._cursor[2] if self._cursor[0] == seg.seq else 0
+            self.dropped_size += seg.records - consumed
+            total -= seg.size
+            seg.path.unlink(missing_ok=True)
+            self._cursor = (self._segments[0].seq, 0, 0)
+            self._peeked = []
+            self._save_index()
+
+    # -- reading --------------------------------------------------------------
+
+    def __len__(self):
+        with self._lock:
+            return sum(s.records for s in self._segments) - self._cursor[2] + len(self._buf)
+
+    def peek(self, n):
+        """Up to n oldest unacknowledged (topic, payload bytes), in append order."""
+        out, positions = [], []
+        with self._lock:
+            if self._buf:
+                self._write()
+            cutoff = self.clock() - self.max_age_ns if self.max_age_ns else None
+            for seg in list(self._segments):
+                seq, off, recno = self._cursor if seg.seq == self._cursor[0] else (seg.seq, 0, 0)
+                if seg.seq < self._cursor[0]:
+                    continue
+                end = (seg.seq, seg.size, seg.records)
+                if cutoff is not None and seg.last_ns < cutoff and seg is not self._segments[-1]:
+                    if out:
+                        break
+                    # Whole segment expired
+                    self.dropped_age += seg.records - recno
+                    self._advance(end)
+                    continue
+                with open(seg.path, "rb") as f:
+                    f.seek(off)
+                    data = f.read(max(0, seg.size - off))
+                pos, stop = 0, False
+                while len(out) < n and pos + _HEAD.size <= len(data):
+                    length, crc, ts = _HEAD.unpack_from(data, pos)
+                    body = data[pos + _HEAD.size:pos + _HEAD.size + length]
+                    pos += _HEAD.size + length
+                    recno += 1
+                    here = (seq, off + pos, recno)
+                    # Expired or damaged records are skipped only when they
+                    # come first, so each is counted exactly once
+                    if len(body) != length or zlib.crc32(body) != crc:
+                        stop = True
+                        if not out:
+                            self.corrupt += 1
+                            self._advance(end)
+                        break
+                    if cutoff is not None and ts < cutoff:
+                        if out:
+                            stop = True
+                            break
+                        self.dropped_age += 1
+                        self._advance(here)
+                        continue
+                    tlen = _TOPIC.unpack_from(body)[0]
+                    out.append((body[2:2 + tlen].decode("utf-8"), body[2 + tlen:]))
+                    positions.append(here)
+                if stop or len(out) >= n:
+                    break
+            self._peeked = positions
+        return out
+
+    def ack(self, count):
+        """Mark the first count records of the last peek() as delivered."""
+        with self._lock:
+            if count <= 0 or not self._peeked:
+                return
+            count = min(count, len(self._peeked))
+            self._advance(self._peeked[count - 1])
+            self._peeked = self._peeked[count:]
+            self.replayed += count
+
+    def _advance(self, cursor):
+        seq, off, recno = cursor
+        segs = self._segments
+        # A fully read segment is deleted, unless it is the one being written
+        while len(segs) > 1 and (segs[0].seq < seq or (segs[0].seq == seq and recno >= segs[0].records)):
+            segs.popleft().path.unlink(missing_ok=True)
+            if segs[0].seq > seq:
+                seq, off, recno = segs[0].seq, 0, 0
+        if seq < segs[0].seq:
+            seq, off, recno = segs[0].seq, 0, 0
+        self._cursor = (seq, off, recno)
+        self._save_index()
+
+    def close(self):
+        with self._lock:
+            if self._buf:
+                self._write()
+            self._save_index()
+            self._out.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self),
+                "bytes": sum(s.size for s in self._segments),
+                "segments": len(self._segments),
+                "appended": self.appended,
+                "replayed": self.replayed,
+                "dropped_size": self.dropped_size,
+                "dropped_age": self.dropped_age,
+                "corrupt": self.corrupt,
+            }
+
+
+class SpoolForwarder:
+    """
+    Background replay of a DiskSpool: while connected() is true, send
+    (topic, payload) -> bool each record in order at no more than rate
+    messages/s, acknowledging only what was sent. Also writes buffered
+    appends to disk every idle_s.
+    """
+
+    def __init__(self, spool, send, connected, rate=50.0, batch=32, idle_s=0.5):
+        self.spool = spool
+        self.send = send
+        self.connected = connected
+        self.rate = float(rate)
+        self.batch = max(1, int(batch))
+        self.idle_s = idle_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mqtt-spool", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def drain_once(self):
+        """Send one batch; returns the number of records sent."""
+        if not self.connected():
+            return 0
+        items = self.spool.peek(self.batch)
+        sent = 0
+        for topic, payload in items:
+            try:
+                if self.send(topic, payload) is False:
+                    break
+            except Exception:
+                break
+            sent += 1
+        self.spool.ack(sent)
+        return sent
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.spool.flush()
+            sent = self.drain_once() if len(self.spool) else 0
+            if sent:
+                self._stop.wait(sent / self.rate if self.rate > 0 else 0)
+            else:
+                self._stop.wait(self.idle_s)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2.0)
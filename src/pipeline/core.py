@@ -0,0 +1,167 @@
+# src/pipeline/core.py
+"""
+Pipeline: the one frame-processing loop every entry point builds on.
+
+A Pipeline pulls ModbusFrames from a source (any PacketSource or plain
+iterable of frames: pyshark, native, tshark-fields, parallel replay) and
+hands each one, wrapped in a FrameContext, through an ordered list of
+stages (decode, session-log, state, rules/trigger, MQTT, console...).
+A stage returning False ends processing of that frame. Every stage is
+timed, so stats() shows where the per-frame budget goes.
+
+Stages are plain callables; subclassing Stage just gives them a name and
+a close() hook. Pipeline.process is itself a frame callable, so a whole
+Pipeline can run as one pipeline.staged.Stage.
+"""
+import time
+
+__all__ = ["FrameContext", "Stage", "Pipeline"]
+
+
+class FrameContext:
+    """Per-frame scratch space shared by the stages."""
+
+    __slots__ = (
+        "frame",
+        "src",          # source IP string
+        "dst",
+        "wall",         # ISO-8601 capture time
+        "exc",          # (fc, exception code) for exception responses
+        "exc_text",
+        "_registers",   # {addr: value} for register FCs; built from block on first use
+        "block",        # (start, values) when the registers are one native block
+        "coils",        # CoilBitmap for bit FCs
+        "watched",      # frame passes the --fc / --all-fc gate
+        "image",        # DeviceImage of the frame's (server, unit), set by StateStage
+        "printable",    # {addr: value} the console should show
+        "tags",         # {tag name: engineering value} decoded from the registers
+        "printable_tags",
+        "outbox",       # payloads queued for the MQTT stage
+    )
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.src = self.dst = self.wall = None
+        self.exc = self.exc_text = None
+        self._registers = self.block = self.coils = None
+        self.watched = True
+        self.image = None
+        self.printable = None
+        self.tags = self.printable_tags = None
+        self.outbox = None
+
+    @property
+    def registers(self):
+        regs = self._registers
+        if regs is None and self.block is not None:
+            start, values = self.block
+            regs = self._registers = dict(zip(range(start, start + len(values)), values))
+        return regs
+
+    @registers.setter
+    def registers(self, value):
+        self._registers = value
+
+    def has_registers(self):
+        return self._registers is not None or self.block is not None
+
+    def register(self, addr):
+        """One register of the frame (None if absent) without building the dict."""
+        block = self.block
+        if block is not None:
+            i = addr - block[0]
+            return block[1][i] if 0 <= i < len(block[1]) else None
+        regs = self._registers
+        return regs.get(addr) if regs is not None else None
+
+    def emit(self, payload):
+        """Queue a payload for publishing by a later stage."""
+        if self.outbox is None:
+            self.outbox = [payload]
+        else:
+            self.outbox.append(payload)
+
+
+class Stage:
+    """Base for named pipeline stages."""
+
+    name = "stage"
+
+    def __call__(self, ctx):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class Pipeline:
+    """
+    source : PacketSource (its frames() is used) or an iterable of frames;
+             may be None when frames are pushed with process()
+    stages : ordered stage callables taking a FrameContext
+    """
+
+    def __init__(self, stages, source=None):
+        self.source = source
+        self.stages = list(stages)
+        self.names = [getattr(s, "name", None) or getattr(s, "__name__", type(s).__name__)
+                      for s in self.stages]
+        self.frames = 0
+        self._calls = [0] * len(self.stages)
+        self._ns = [0] * len(self.stages)
+        self._closed = False
+
+    def stage(self, name):
+        """The stage registered under name, or None."""
+        for n, s in zip(self.names, self.stages):
+            if n == name:
+                return s
+        return None
+
+    def process(self, frame):
+        """Run one frame through the stages; returns its FrameContext."""
+        ctx = FrameContext(frame)
+        self.frames += 1
+        calls, spent = self._calls, self._ns
+        clock = time.perf_counter_ns
+        for i, stage in enumerate(self.stages):
+            t0 = clock()
+            keep = stage(ctx)
+            spent[i] += clock() - t0
+            calls[i] += 1
+            if keep is False:
+                break
+        return ctx
+
+    def run(self):
+        """Process every frame from the source; returns the frame count."""
+        src = self.source
+        frames = src.frames() if hasattr(src, "frames") else src
+        process = self.process
+        for frame in frames:
+            process(frame)
+        return self.frames
+
+    def close(self):
+        """Close every stage, then the source; only the first call does anything."""
+        if self._closed:
+            return
+        self._closed = True
+        for stage in self.stages:
+            close = getattr(stage, "close", None)
+            if close is not None:
+                close()
+        close = getattr(self.source, "close", None)
+        if close is not None:
+            close()
+
+    def stats(self):
+        """{stage name: frames seen, total ms, us per frame}, in stage order."""
+        out = {}
+        for name, calls, ns in zip(self.names, self._calls, self._ns):
+            out[name] = {
+                "frames": calls,
+                "ms": round(ns / 1e6, 3),
+                "us_per_frame": round(ns / calls / 1e3, 3) if calls else 0.0,
+            }
+        return out
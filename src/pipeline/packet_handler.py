@@ -1,48 +1,104 @@
-from modbus.direction import normalize_func_code, get_packet_endpoints
-from modbus.registers import parse_register_map, check_register_rules
-from modbus.coils import parse_fc5, parse_fc15, check_coil_rules
+from capture.pyshark_frames import frame_from_packet
+from modbus.image import ImageStore
+from modbus.rules import compile_rules, frame_device
 from config import WATCH_REGISTERS, WATCH_COILS
 from mqtt.client import mqtt_publish
 from app_logging import log_err
+from pipeline.core import Pipeline, Stage
+from pipeline.stages import DecodeStage, MqttStage
 
-def handle_packet(pkt):
-    try:
-        if not hasattr(pkt, "modbus"):
-            return
 
-        m = pkt.modbus
-        fc = normalize_func_code(m)
-        src, dst, _, _ = get_packet_endpoints(pkt)
+class RulesStage(Stage):
+    """
+    config.WATCH_REGISTERS / WATCH_COILS matches -> MQTT payloads (with ip
+    and unit, for topic templates). Register edge rules compare against the
+    per-device image, which is updated after matching; rate rules keep
+    per-register times of their own (RuleSet.match).
+    """
+
+    name = "rules"
+
+    def __init__(self, watch_registers, watch_coils, images=None):
+        self.rules = compile_rules(watch_registers, watch_coils)
+        self.images = images if images is not None else ImageStore()
+
+    def __call__(self, ctx):
+        src = ctx.src
+        frame = ctx.frame
+        if ctx.exc is not None:
+            ctx.emit({
+                "type": "exception",
+                "ip": src,
+                "unit": frame.unit,
+                "fc": ctx.exc[0],
+                "code": ctx.exc[1]
+            })
 
-        if fc in (3, 4):
-            regs = parse_register_map(m, fc)
-            matches = check_register_rules(regs, WATCH_REGISTERS)
+        elif ctx.has_registers():
+            image = self.images.for_frame(frame).registers_for(frame.fc)
+            matches = self.rules.match_registers(ctx.registers, frame_device(frame), frame.ts_ns,
+                                                 prev=image.last)
+            if ctx.block is not None:
+                image.update(*ctx.block, frame.ts_ns)
+            else:
+                image.update_map(ctx.registers, frame.ts_ns)
             if matches:
-                mqtt_publish({
+                ctx.emit({
                     "type": "register",
                     "ip": src,
+                    "unit": frame.unit,
                     "matches": matches
                 })
 
-        elif fc == 5:
-            coils = parse_fc5(pkt, m)
-            matches = check_coil_rules(coils, WATCH_COILS)
+        elif frame.fc == 5:
+            coils = ctx.coils.to_dict()
+            matches = self.rules.match_coils(coils, frame_device(frame), frame.ts_ns)
             if matches:
-                mqtt_publish({
+                ctx.emit({
                     "type": "coil",
                     "ip": src,
+                    "unit": frame.unit,
                     "coils": coils
                 })
 
-        elif fc == 15:
-            coils = parse_fc15(pkt, m)
-            matches = check_coil_rules(coils, WATCH_COILS)
+        elif frame.fc in (1, 15):
+            matches = self.rules.match_coils(ctx.coils, frame_device(frame), frame.ts_ns)
             if matches:
-                mqtt_publish({
+                ctx.emit({
                     "type": "coil",
                     "ip": src,
+                    "unit": frame.unit,
                     "matches": matches
                 })
 
+
+def build_rules_pipeline(source=None, watch_registers=WATCH_REGISTERS, watch_coils=WATCH_COILS,
+                         publish=mqtt_publish):
+    """decode -> config rules -> MQTT, on any frame source."""
+    return Pipeline([
+        DecodeStage(),
+        RulesStage(watch_registers, watch_coils),
+        MqttStage(publish),
+    ], source)
+
+
+PIPELINE = build_rules_pipeline()
+
+
+def handle_packet(pkt):
+    """pyshark packet entry point; converts to a ModbusFrame first."""
+    if not hasattr(pkt, "modbus"):
+        return
+    try:
+        frame = frame_from_packet(pkt)
+    except Exception as e:
+        log_err(f"Packet error: {e}")
+        return
+    handle_frame(frame)
+
+
+def handle_frame(frame):
+    try:
+        PIPELINE.process(frame)
     except Exception as e:
         log_err(f"Packet error: {e}")
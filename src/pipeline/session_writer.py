@@ -0,0 +1,232 @@
+# src/pipeline/session_writer.py
+"""
+Buffered session log files, written off the capture thread.
+
+SessionWriter.write(line) only appends to an in-memory buffer. A
+background thread writes the buffer out every flush_ms, or sooner once
+flush_bytes are waiting, optionally through gzip or zstd, and starts a
+new part file past rotate_bytes (uncompressed, cut at line boundaries)
+or rotate_s seconds (checked at each flush). close() (session stop, SIGINT, exit) writes out
+everything still buffered. If the disk falls max_buffer_bytes behind,
+further lines are dropped and counted instead of blocking the capture.
+
+Parts are <stem>.txt, <stem>.001.txt, <stem>.002.txt, ... with .gz or
+.zst appended when compressed.
+"""
+import gzip
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+try:
+    import zstandard
+    ZSTD_OK = True
+except ImportError:  # zstd compression is optional
+    zstandard = None
+    ZSTD_OK = False
+
+__all__ = ["COMPRESSORS", "ZSTD_OK", "SessionWriter"]
+
+COMPRESSORS = (None, "gzip", "zstd")
+_SUFFIX = {None: "", "gzip": ".gz", "zstd": ".zst"}
+_LEVEL = {"gzip": 1, "zstd": 3}  # fast levels: keep the writer ahead of a busy link
+
+
+class SessionWriter:
+    """
+    directory / stem : where the parts go and their common name
+    flush_ms         : longest a line stays buffered (at least 1 ms)
+    flush_bytes      : write as soon as this much is buffered
+    rotate_bytes     : new part past this many (uncompressed) bytes; 0 = never
+    rotate_s         : new part after this many seconds; 0 = never
+    compress         : None, "gzip" or "zstd" (needs the zstandard package)
+    background       : False writes from the caller at flush_bytes (tests, tools)
+    on_error(msg)    : write errors, reported from the writer thread
+    """
+
+    def __init__(self, directory, stem, flush_ms=200, flush_bytes=1 << 20, rotate_bytes=0, rotate_s=0,
+                 compress=None, level=None, max_buffer_bytes=256 << 20, background=True,
+                 clock=time.monotonic, on_error=None):
+        if compress not in COMPRESSORS:
+            raise ValueError(f"unknown compression {compress!r}; choose from {COMPRESSORS[1:]}")
+        if compress == "zstd" and zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        self.dir = Path(directory)
+        self.stem = stem
+        self.flush_s = max(flush_ms, 1) / 1000.0  # 0 would make the writer thread spin
+        self.flush_bytes = max(1, int(flush_bytes))
+        self.rotate_bytes = int(rotate_bytes)
+        self.rotate_s = rotate_s
+        self.compress = compress
+        self.level = level if level is not None else _LEVEL.get(compress)
+        self.max_buffer_bytes = int(max_buffer_bytes)
+        self.clock = clock
+        self.on_error = on_error or (lambda _msg: None)
+        self.paths = []
+        self.lines = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.errors = 0
+        # write() only appends to the deque and bumps _queued (capture thread);
+        # draining pops and bumps _taken, so neither side takes a lock
+        self._queue = deque()
+        self._queued = 0
+        self._taken = 0
+        self._overflow = 0                 # lines refused by write(): buffer full
+        self._wake = threading.Event()
+        self._lock = threading.Lock()      # counters shared by drains and stats()
+        self._io_lock = threading.Lock()   # one drain at a time, in order
+        self._closed = False
+        self._sink = None
+        self._part_bytes = 0
+        self._opened_at = 0.0
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._open_part()  # in the caller, so a bad directory fails here
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+            self._thread.start()
+
+    @property
+    def path(self):
+        """The first part (the session's file when it never rotates)."""
+        return self.paths[0]
+
+    # -- capture side ----------------------------------------------------------
+
+    def write(self, line):
+        """Buffer one line; never touches the disk when running in the background."""
+        buffered = self._queued - self._taken
+        if buffered >= self.max_buffer_bytes:
+            self._overflow += 1
+            return
+        data = line + os.linesep
+        self._queue.append(data)
+        self._queued += len(data)
+        if buffered + len(data) >= self.flush_bytes:
+            if self._thread is None:
+                self._drain()
+            elif not self._wake.is_set():
+                self._wake.set()
+
+    def flush(self):
+        """Write everything buffered now (blocks on I/O)."""
+        self._drain()
+        with self._io_lock:
+            if self._sink is not None and self.compress is None:
+                self._sink.flush()
+
+    def close(self):
+        """Write out the buffer and close the current part; safe to call twice."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._drain()
+        with self._io_lock:
+            self._close_part()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lines": self.lines,
+                "bytes": self.bytes,
+                "parts": len(self.paths),
+                "dropped": self.dropped + self._overflow,
+                "errors": self.errors,
+            }
+
+    # -- writer side -------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def _drain(self):
+        with self._io_lock:
+            queue = self._queue
+            buf = [queue.popleft() for _ in range(len(queue))]
+            self._taken += sum(map(len, buf))
+            if self._sink is None:
+                if buf:
+                    with self._lock:
+                        self.dropped += len(buf)
+                return
+            written = 0
+            try:
+                if self.rotate_s and self._part_bytes and self.clock() - self._opened_at >= self.rotate_s:
+                    self._rotate()
+                if not self.rotate_bytes:
+                    self._write(buf)
+                    written = len(buf)
+                    return
+                # Cut the buffer at line boundaries so each part stays near rotate_bytes
+                start, room = 0, self.rotate_bytes - self._part_bytes
+                for i, line in enumerate(buf):
+                    if len(line) > room and (i > start or self._part_bytes):
+                        self._write(buf[start:i])
+                        written = i
+                        self._rotate()
+                        start, room = i, self.rotate_bytes
+                    room -= len(line)
+                self._write(buf[start:])
+                written = len(buf)
+            except (OSError, ValueError) as e:
+                with self._lock:
+                    self.errors += 1
+                    self.dropped += len(buf) - written
+                self.on_error(f"Session write error: {e}")
+
+    def _write(self, lines):
+        if not lines:
+            return
+        data = "".join(lines).encode("utf-8")
+        self._sink.write(data)
+        if self.compress is None:
+            self._sink.flush()
+        self._part_bytes += len(data)
+        with self._lock:
+            self.lines += len(lines)
+            self.bytes += len(data)
+
+    def _part_path(self):
+        n = len(self.paths)
+        name = f"{self.stem}.txt" if n == 0 else f"{self.stem}.{n:03d}.txt"
+        return self.dir / (name + _SUFFIX[self.compress])
+
+    def _open_part(self):
+        path = self._part_path()
+        if self.compress == "gzip":
+            sink = gzip.open(path, "wb", compresslevel=self.level)
+        elif self.compress == "zstd":
+            sink = zstandard.ZstdCompressor(level=self.level).stream_writer(open(path, "wb"))
+        else:
+            sink = open(path, "wb")
+        self._sink = sink
+        self.paths.append(path)
+        self._part_bytes = 0
+        self._opened_at = self.clock()
+
+    def _close_part(self):
+        if self._sink is not None:
+            try:
+                self._sink.close()
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                self.on_error(f"Session write error: {e}")
+            self._sink = None
+
+    def _rotate(self):
+        self._close_part()
+        self._open_part()
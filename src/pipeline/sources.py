@@ -0,0 +1,97 @@
+# src/pipeline/sources.py
+"""
+Frame source selection shared by the CLI and the scripts: one call maps
+(backend, pcap | iface, filters) to a ModbusFrame iterator.
+
+pyshark and the pyshark adapter are imported when the pyshark backend is
+actually chosen, so the native backends run without them.
+"""
+from capture.af_packet import AfPacketSource
+from capture.parallel_replay import ParallelPcapSource
+from capture.pcap_native import NativePcapPacketSource
+from capture.ring import ThreadedCaptureSource
+from capture.tshark_fields import TsharkFieldsSource
+
+__all__ = ["BACKENDS", "BackendUnavailable", "FrameSource", "display_filter", "open_source"]
+
+BACKENDS = ("pyshark", "native", "tshark-fields")
+
+
+class BackendUnavailable(RuntimeError):
+    """The selected backend's dependency is not installed."""
+
+
+class FrameSource:
+    """
+    frames()  -> iterator of ModbusFrames
+    cap       -> the live/subprocess capture to close() (and stats()), or None
+    label     -> what is being read, for the startup log line
+    """
+
+    def __init__(self, frames, cap, label):
+        self._frames = frames
+        self.cap = cap
+        self.label = label
+
+    def frames(self):
+        return self._frames
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.close()
+
+    def stats(self):
+        st = getattr(self.cap, "stats", None)
+        return st() if st is not None else None
+
+
+def display_filter(src=None, dst=None, extra=None, port=502):
+    """Wireshark display filter for Modbus/TCP plus optional host filters."""
+    df = f"modbus && tcp.port == {port}"
+    if src:
+        df += f" && ip.src == {src}"
+    if dst:
+        df += f" && ip.dst == {dst}"
+    if extra:
+        df = f"({df}) && ({extra})"
+    return df
+
+
+def open_source(backend="pyshark", pcap=None, iface=None, src=None, dst=None,
+                workers=1, ring_slots=8192, extra_filter=None):
+    """Start reading Modbus frames from a capture file (pcap) or interface (iface)."""
+    if bool(pcap) == bool(iface):
+        raise ValueError("exactly one of pcap or iface is required")
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, not {backend!r}")
+
+    if backend == "native" and pcap and workers > 1:
+        source = ParallelPcapSource(pcap, workers, src=src, dst=dst)
+        return FrameSource(source.frames(), None, f"Replaying PCAP (native, {workers} workers): {pcap}")
+    if backend == "native" and pcap:
+        source = NativePcapPacketSource(pcap, src=src, dst=dst)
+        return FrameSource(source.frames(), None, f"Replaying PCAP (native): {pcap}")
+    if backend == "native":
+        cap = AfPacketSource(iface, src=src, dst=dst)
+        if ring_slots > 0:
+            cap = ThreadedCaptureSource(cap, slots=ring_slots)
+        return FrameSource(cap.frames(), cap, f"Live on {iface} (AF_PACKET, Ctrl-C to stop)")
+    if backend == "tshark-fields":
+        cap = TsharkFieldsSource(pcap_path=pcap, iface=iface, src=src, dst=dst)
+        where = f"Replaying PCAP: {pcap}" if pcap else f"Live on {iface}"
+        return FrameSource(cap.frames(), cap, f"{where} (tshark fields)")
+
+    try:
+        import pyshark
+    except ImportError:
+        pyshark = None
+    if pyshark is None:
+        raise BackendUnavailable("pyshark is not installed. Install it or use --backend native.")
+    from capture.pyshark_frames import pyshark_frames
+
+    df = display_filter(src, dst, extra_filter)
+    if pcap:
+        cap = pyshark.FileCapture(pcap, display_filter=df, keep_packets=False)
+        return FrameSource(pyshark_frames(cap), cap, f"Replaying PCAP: {pcap}")
+    cap = pyshark.LiveCapture(interface=iface, display_filter=df, bpf_filter="tcp port 502")
+    return FrameSource(pyshark_frames(cap.sniff_continuously()), cap, f"Live on {iface} (Ctrl-C to stop)")
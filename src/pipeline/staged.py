@@ -0,0 +1,239 @@
+# src/pipeline/staged.py
+"""
+asyncio staged pipeline: source -> stage -> stage -> ... joined by bounded
+queues, so a slow stage (MQTT reconnect, slow session-log disk) backs up
+its own queue instead of stalling capture.
+
+The source is any blocking iterable (a PacketSource.frames() generator)
+and is pulled on its own thread. Each Stage wraps a plain callable, such
+as pipeline.packet_handler.handle_frame or modbus.frame.frame_values:
+it gets one item and returns the item for the next stage, or None to
+drop it. The last stage's return value is discarded.
+
+Per stage:
+  concurrency  worker tasks pulling from the stage's input queue (more
+               than one may reorder items; keep stateful stages at 1)
+  maxsize      bound of the input queue
+  overflow     what a full input queue does with a new item:
+               "block" (backpressure upstream), "drop-oldest", "drop-newest"
+  blocking     run a sync callable in the default thread pool instead of
+               on the event loop (for I/O such as mqtt_publish or file writes)
+"""
+import asyncio
+import threading
+import time
+
+from app_logging import log_err
+
+__all__ = ["OVERFLOW_POLICIES", "StageQueue", "Stage", "StagedPipeline", "run_staged"]
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+
+class StageQueue:
+    """Bounded asyncio queue with an overflow policy and depth metrics."""
+
+    def __init__(self, maxsize=1024, overflow="block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, not {overflow!r}")
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._q = asyncio.Queue(maxsize)
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._credits = None  # threading.Semaphore when fed from a thread with "block"
+
+    def depth(self):
+        return self._q.qsize()
+
+    def _track(self):
+        self.put_count += 1
+        depth = self._q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def put_nowait(self, item):
+        """Enqueue without waiting, applying the drop policy when full."""
+        q = self._q
+        if q.full():
+            if self.overflow == "drop-newest":
+                self.dropped += 1
+                return False
+            # drop-oldest (or a full "block" queue fed from a thread, which
+            # the credits below rule out)
+            q.get_nowait()
+            q.task_done()
+            self.dropped += 1
+        q.put_nowait(item)
+        self._track()
+        return True
+
+    async def put(self, item):
+        if self.overflow == "block":
+            await self._q.put(item)
+            self._track()
+            return True
+        return self.put_nowait(item)
+
+    async def get(self):
+        item = await self._q.get()
+        if self._credits is not None:
+            self._credits.release()
+        return item
+
+    def task_done(self):
+        self._q.task_done()
+
+    async def join(self):
+        await self._q.join()
+
+    def stats(self):
+        return {
+            "depth": self._q.qsize(),
+            "max_depth": self.max_depth,
+            "put": self.put_count,
+            "dropped": self.dropped,
+        }
+
+
+class Stage:
+    """One pipeline step: a callable plus its queue and worker settings."""
+
+    def __init__(self, name, fn, concurrency=1, maxsize=1024, overflow="block", blocking=False):
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, not {overflow!r}")
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.blocking = blocking
+        self._is_async = asyncio.iscoroutinefunction(fn)
+        self.processed = 0
+        self.errors = 0
+        self.busy_ns = 0
+
+    async def call(self, item):
+        t0 = time.perf_counter_ns()
+        try:
+            if self._is_async:
+                return await self.fn(item)
+            if self.blocking:
+                return await asyncio.get_running_loop().run_in_executor(None, self.fn, item)
+            return self.fn(item)
+        finally:
+            self.busy_ns += time.perf_counter_ns() - t0
+            self.processed += 1
+
+
+class StagedPipeline:
+    """
+    Run a blocking source through a chain of Stages.
+
+        pipe = StagedPipeline(source.frames(), [
+            Stage("decode", decode_frame),
+            Stage("rules", apply_rules),
+            Stage("mqtt", handle_frame, overflow="drop-oldest", blocking=True),
+        ])
+        asyncio.run(pipe.run())
+        pipe.stats()
+    """
+
+    def __init__(self, source, stages):
+        if not stages:
+            raise ValueError("at least one stage is required")
+        self.source = source
+        self.stages = list(stages)
+        self.queues = []
+        self.source_count = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop pulling from the source; queued items are still drained."""
+        self._stop.set()
+
+    def _feed(self, loop, q):
+        """Capture thread: pull the source and hand items to the loop."""
+        put = q.put_nowait
+        credits = q._credits
+        try:
+            for item in self.source:
+                if self._stop.is_set():
+                    break
+                if credits is not None:
+                    # "block": wait for room in the first queue, off the loop
+                    while not credits.acquire(timeout=0.2):
+                        if self._stop.is_set():
+                            return
+                self.source_count += 1
+                loop.call_soon_threadsafe(put, item)
+        finally:
+            close = getattr(self.source, "close", None)
+            if close is not None and self._stop.is_set():
+                close()
+
+    async def _worker(self, stage, inq, outq):
+        while True:
+            item = await inq.get()
+            try:
+                out = await stage.call(item)
+                if out is not None and outq is not None:
+                    await outq.put(out)
+            except Exception as e:
+                stage.errors += 1
+                log_err(f"Stage {stage.name} error: {e}")
+            finally:
+                inq.task_done()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.queues = [StageQueue(s.maxsize, s.overflow) for s in self.stages]
+        first = self.queues[0]
+        if first.overflow == "block":
+            first._credits = threading.Semaphore(first.maxsize)
+
+        groups = []
+        for i, stage in enumerate(self.stages):
+            outq = self.queues[i + 1] if i + 1 < len(self.queues) else None
+            groups.append([
+                asyncio.create_task(self._worker(stage, self.queues[i], outq))
+                for _ in range(stage.concurrency)
+            ])
+        try:
+            await loop.run_in_executor(None, self._feed, loop, first)
+            # Items handed over with call_soon_threadsafe land on the next tick
+            await asyncio.sleep(0)
+            # Drain front to back: once a stage's queue is joined every item
+            # it produced is already queued downstream
+            for q, workers in zip(self.queues, groups):
+                await q.join()
+                for w in workers:
+                    w.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            self._stop.set()
+            for workers in groups:
+                for w in workers:
+                    w.cancel()
+
+    def stats(self):
+        """{stage name: queue depth/drop counters + processed/errors/busy_ms}."""
+        out = {"source": {"pulled": self.source_count}}
+        for stage, q in zip(self.stages, self.queues):
+            st = q.stats()
+            st.update(processed=stage.processed, errors=stage.errors,
+                      busy_ms=round(stage.busy_ns / 1e6, 3))
+            out[stage.name] = st
+        return out
+
+
+def run_staged(source, stages):
+    """Run a StagedPipeline to completion and return its stats()."""
+    pipe = StagedPipeline(source, stages)
+    asyncio.run(pipe.run())
+    return pipe.stats()
@@ -0,0 +1,453 @@
+# src/pipeline/stages.py
+"""
+Stock pipeline stages. Each works on a FrameContext (pipeline.core):
+
+  DecodeStage      endpoints, wall time, exception / registers / coils, --fc gate
+  TagStage         typed engineering values from a tag map -> ctx.tags
+  SessionLogStage  start/stop session files on a register edge, log all traffic
+  StateStage       per-device register/coil image, watched deltas -> ctx.printable
+  TriggerStage     publish-on-change edge trigger -> ctx.emit(payload)
+  MqttStage        publish everything emitted for the frame
+  ConsoleStage     print exceptions and ctx.printable
+
+Output callables (log, log_err, publish) are passed in rather than
+imported here, so each entry point decides where text and payloads go.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+
+from modbus.decoders import BIT_FCS, EXCEPTION_CODES, REGISTER_FCS
+from modbus.frame import (
+    frame_coils, frame_exception, frame_register_block, frame_values, frame_wall_time, ip_str,
+)
+from modbus.image import ImageStore
+from modbus.watchset import WatchSet
+from pipeline.core import Stage
+from pipeline.session_writer import SessionWriter
+from pipeline.throttle import TokenBucket
+
+__all__ = [
+    "DecodeStage",
+    "TagStage",
+    "SessionLogStage",
+    "StateStage",
+    "TriggerStage",
+    "MqttStage",
+    "ConsoleStage",
+]
+
+
+def _pairs(items):
+    return ", ".join(f"{a}={v}" for a, v in items)
+
+
+def _value(v):
+    if isinstance(v, float):
+        return f"{v:.6g}"
+    if isinstance(v, list):
+        return "[" + ", ".join(_value(x) for x in v) + "]"
+    return str(v)
+
+
+def _tag_pairs(tags):
+    return ", ".join(f"{n}={_value(v)}" for n, v in sorted(tags.items()))
+
+
+class DecodeStage(Stage):
+    """fc: the one function code to watch, or None to watch them all."""
+
+    name = "decode"
+
+    def __init__(self, fc=None):
+        self.fc = fc
+
+    def __call__(self, ctx):
+        frame = ctx.frame
+        fc = frame.fc
+        ctx.src, ctx.dst = ip_str(frame.src), ip_str(frame.dst)
+        ctx.wall = frame_wall_time(frame)
+        exc = frame_exception(frame)
+        if exc is not None:
+            ctx.exc = exc
+            ctx.exc_text = f"EXCEPTION fc={exc[0]} code={exc[1]} ({EXCEPTION_CODES.get(exc[1], 'UNKNOWN')})"
+        elif fc in REGISTER_FCS:
+            # Native blocks stay a block; ctx.registers builds the dict on demand
+            block = frame_register_block(frame)
+            if block is not None:
+                ctx.block = block
+            else:
+                ctx.registers = frame_values(frame)
+        elif fc in BIT_FCS:
+            ctx.coils = frame_coils(frame)
+        ctx.watched = self.fc is None or (fc & 0x7F) == self.fc
+
+
+class TagStage(Stage):
+    """
+    Decode the frame's registers into tag values (modbus.tags.TagMap) as
+    ctx.tags. ctx.printable_tags is the same dict, or with deltas_only just
+    the tags whose value changed for this (server, unit).
+    """
+
+    name = "tags"
+
+    def __init__(self, tagmap, deltas_only=False):
+        self.tagmap = tagmap
+        self.deltas_only = deltas_only
+        self._last = {}  # (server ip, unit) -> {tag name: last value}
+
+    def __call__(self, ctx):
+        if not ctx.has_registers():
+            return
+        frame = ctx.frame
+        device = frame.src if frame.is_response else frame.dst
+        block = ctx.block
+        if block is not None:
+            tags = self.tagmap.decode_block(block[0], block[1], device)
+        else:
+            tags = self.tagmap.decode_map(ctx.registers, device)
+        if not tags:
+            return
+        ctx.tags = tags
+        if self.deltas_only:
+            last = self._last.setdefault((device, frame.unit), {})
+            changed = {n: v for n, v in tags.items() if n not in last or last[n] != v}
+            last.update(changed)
+            ctx.printable_tags = changed
+        else:
+            ctx.printable_tags = tags
+
+
+class SessionLogStage(Stage):
+    """
+    Open a new timestamped file in log_dir when start_reg changes to
+    start_val, write every Modbus frame (all FCs, exceptions included)
+    while it is open, and close it when start_reg changes to stop_val.
+    Lines go through a pipeline.session_writer.SessionWriter (buffered,
+    written in the background); writer options (flush_ms, rotate_bytes,
+    rotate_s, compress, ...) are passed on to it.
+    """
+
+    name = "session-log"
+
+    def __init__(self, log_dir, start_reg=100, start_val=3, stop_val=4, log=None, log_err=None,
+                 **writer_opts):
+        self.log_dir = Path(log_dir)
+        self.start_reg = start_reg
+        self.start_val = start_val
+        self.stop_val = stop_val
+        self.log = log or (lambda _msg: None)
+        self.log_err = log_err or self.log
+        self.writer_opts = writer_opts
+        self.active = False
+        self._file = None
+        self._prev = None  # previous start_reg value (edge detection)
+
+    @staticmethod
+    def _now_name():
+        # UTC timestamped filename: YYYY-MM-DD_HH-MM-SS.txt
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d_%H-%M-%S") + ".txt"
+
+    def open(self):
+        try:
+            stem = self._now_name()[:-len(".txt")]
+            self._file = SessionWriter(self.log_dir, stem, on_error=self.log_err, **self.writer_opts)
+            self.active = True
+            self.log(f"[+] Session log started: {self._file.path}")
+        except Exception as e:
+            self.log_err(f"Failed to open session log: {e}")
+
+    def close(self):
+        writer, self._file = self._file, None
+        if writer is not None:
+            writer.close()  # everything buffered reaches the disk here
+            st = writer.stats()
+            if st["dropped"] or st["parts"] > 1:
+                self.log("[+] Session log: " + " ".join(f"{k}={v}" for k, v in st.items()))
+        if self.active:
+            self.log("[+] Session log stopped")
+        self.active = False
+
+    def write(self, line):
+        if self.active and self._file:
+            self._file.write(line)
+
+    def _edge(self, cur):
+        prev = self._prev
+        self._prev = cur
+        # First observation: if it already equals the start value, open now
+        if prev is None:
+            if cur == self.start_val and not self.active:
+                self.open()
+        # Open on not-start -> start, stop on a transition to the stop value
+        elif not self.active and prev != self.start_val and cur == self.start_val:
+            self.open()
+        elif self.active and prev != self.stop_val and cur == self.stop_val:
+            self.close()
+
+    def __call__(self, ctx):
+        cur = ctx.register(self.start_reg)
+        if cur is not None:
+            self._edge(cur)
+        if not self.active:
+            return
+        head = f"[{ctx.wall}] [{ctx.src}->{ctx.dst}] FC={ctx.frame.fc}"
+        if ctx.exc is not None:
+            self.write(f"{head} {ctx.exc_text}")
+        elif ctx.has_registers():
+            block = ctx.block
+            if block is not None:  # ascending already: no dict, no sort
+                start, values = block
+                self.write(f"{head} {_pairs(zip(range(start, start + len(values)), values))}")
+            else:
+                self.write(f"{head} {_pairs(sorted(ctx.registers.items()))}")
+            if ctx.tags:
+                self.write(f"{head} TAGS {_tag_pairs(ctx.tags)}")
+        elif ctx.coils is not None:
+            self.write(f"{head} {_pairs(ctx.coils.items())}")
+
+
+class StateStage(Stage):
+    """
+    Keeps the per-device image (modbus.image) of every register and coil
+    seen, which drives --deltas-only and the trigger context; ends the
+    frame here unless it passed the --fc gate. watch is a WatchSet or
+    anything WatchSet() takes.
+    """
+
+    name = "state"
+
+    def __init__(self, watch, deltas_only=False, images=None):
+        self.watch = watch if isinstance(watch, WatchSet) else WatchSet(watch)
+        self.deltas_only = deltas_only
+        self.images = images if images is not None else ImageStore()
+
+    def __call__(self, ctx):
+        if not ctx.watched:
+            return False
+        watch = self.watch
+        frame = ctx.frame
+        block = ctx.block
+        coils = ctx.coils
+        if block is not None:
+            device = ctx.image = self.images.for_frame(frame)
+            image = device.registers_for(frame.fc)
+            start, values = block
+            key = (frame.fc, start, len(values))
+            payload = frame.payload
+            if image.same_payload(key, payload):
+                # Same bytes as this block's last poll: no deltas, image current
+                image.touch(start, start + len(values), frame.ts_ns)
+                if not self.deltas_only:
+                    ctx.printable = watch.select_block(start, values)
+                return
+            changed = image.update(start, values, frame.ts_ns)
+            image.remember(key, payload, start, len(values))
+            if self.deltas_only:
+                ctx.printable = {a: values[a - start] for a in changed if a in watch}
+            else:
+                ctx.printable = watch.select_block(start, values)
+            return
+        regs = ctx.registers
+        if regs is not None:
+            device = ctx.image = self.images.for_frame(frame)
+            image = device.registers_for(frame.fc)
+            matched = watch.select(regs)
+            if matched and self.deltas_only:
+                get = image.get
+                ctx.printable = {r: v for r, v in matched.items() if get(r) != v}
+            else:
+                ctx.printable = matched
+            image.update_map(regs, frame.ts_ns)
+            return
+        if coils is not None:
+            device = ctx.image = self.images.for_frame(frame)
+            changed = device.bits_for(frame.fc).update(coils)
+            if self.deltas_only:
+                ctx.printable = {a: coils[a] for a in changed if a in watch}
+            else:
+                ctx.printable = watch.select(coils)
+
+
+class TriggerStage(Stage):
+    """
+    Emit a payload when register `reg` changes value (the first observation
+    only initialises). build_payload(ctx, reg, value, context) makes the
+    payload; context is {str(addr): last value} for include_regs, read
+    from the image of the frame's device.
+
+    Throttling, all on frame capture time and off by default:
+      debounce_ms : publish a change only once the value has held for this
+                    long; changes inside the window replace each other
+      deadband    : ignore values closer than this to the last published one
+      max_rate    : at most this many publishes per second (token bucket of
+                    burst); a change arriving without a token waits for one
+    A held value goes out with the first frame after its window closes, or
+    through release(payload) at close(), so the settled value is always
+    published. Every change that was never published is counted in stats().
+    """
+
+    name = "trigger"
+
+    def __init__(self, state, reg, build_payload, include_regs=(), once=False, trace=False, log=None,
+                 debounce_ms=0, deadband=0, max_rate=0, burst=1, release=None):
+        self.state = state
+        self.reg = reg
+        self.build_payload = build_payload
+        self.include_regs = list(include_regs)
+        self.once = once
+        self.trace = trace
+        self.log = log or (lambda _msg: None)
+        self.fired = False
+        self.published = {}  # reg -> last value actually published
+        self.debounce_ns = int(debounce_ms * 1e6)
+        self.deadband = deadband
+        self.bucket = TokenBucket(max_rate, burst) if max_rate and max_rate > 0 else None
+        self.release = release
+        self._held = None    # (value, ctx of that value, "debounce" | "rate") waiting for _due
+        self._due = 0
+        self.publishes = 0
+        self.suppressed = {"debounce": 0, "deadband": 0, "rate": 0}
+
+    def context(self, ctx):
+        device = ctx.image if ctx.image is not None else self.state.images.for_frame(ctx.frame)
+        get = device.registers_for(ctx.frame.fc).get
+        return {str(r): get(r) for r in self.include_regs}
+
+    def __call__(self, ctx):
+        if self._held is not None and ctx.frame.ts_ns >= self._due:
+            self._release_held(ctx, ctx.frame.ts_ns)
+        reg = self.reg
+        cur = ctx.register(reg)
+        if cur is None:
+            return
+        prev = self.published.get(reg)
+        if prev is None:
+            self.published[reg] = cur
+            if self.trace:
+                self.log(f"[trace] init change-reg {reg}={cur}")
+            return
+        held = self._held
+        if cur == (held[0] if held is not None else prev):
+            if self.trace:
+                self.log(f"[trace] no change reg={reg} stays {cur}")
+            return
+        if self.once and self.fired:
+            if self.trace:
+                self.log("[trace] trigger-once already fired; skipping publish")
+            return
+        if held is not None:
+            # A newer value replaces the held one, which is never published
+            self.suppressed[held[2]] += 1
+            self._held = None
+            if cur == prev:
+                if self.trace:
+                    self.log(f"[trace] reg={reg} back to {cur}; held {held[0]} dropped")
+                return
+        if self.deadband and abs(cur - prev) < self.deadband:
+            self.suppressed["deadband"] += 1
+            if self.trace:
+                self.log(f"[trace] reg={reg} {prev}->{cur} inside deadband {self.deadband}; skipping publish")
+            return
+        now = ctx.frame.ts_ns
+        if self.debounce_ns:
+            self._hold(cur, ctx, "debounce", now + self.debounce_ns)
+        else:
+            wait = self.bucket.take(now) if self.bucket is not None else 0
+            if wait:
+                self._hold(cur, ctx, "rate", now + wait)
+            else:
+                self._publish(ctx, ctx, cur)
+
+    def _hold(self, value, ctx, reason, due):
+        self._held = (value, ctx, reason)
+        self._due = due
+        if self.trace:
+            prev = self.published.get(self.reg)
+            self.log(f"[trace] CHANGE reg={self.reg} {prev}->{value} -> HOLD ({reason}, "
+                     f"{(due - ctx.frame.ts_ns) / 1e6:.3f} ms)")
+
+    def _release_held(self, out, now):
+        value, ctx, _reason = self._held
+        if self.bucket is not None and out is not None:
+            # take() spends nothing when it returns a wait, so a rate-held value pays here too
+            wait = self.bucket.take(now)
+            if wait:
+                self._held = (value, ctx, "rate")
+                self._due = now + wait
+                return
+        self._held = None
+        self._publish(out, ctx, value)
+
+    def _publish(self, out, ctx, value):
+        """Build value's payload from the frame that carried it; emit on out (or release it)."""
+        reg = self.reg
+        context = self.context(ctx)
+        if self.trace:
+            ctx_str = _pairs(sorted(context.items()))
+            self.log(f"[trace] CHANGE reg={reg} {self.published.get(reg)}->{value} ctx[{ctx_str}] -> PUBLISH")
+        payload = self.build_payload(ctx, reg, value, context)
+        if out is not None:
+            out.emit(payload)
+        elif self.release is not None:
+            self.release(payload)
+        self.published[reg] = value
+        self.publishes += 1
+        if self.once:
+            self.fired = True
+
+    def stats(self):
+        out = {"published": self.publishes}
+        out.update((f"suppressed_{k}", v) for k, v in self.suppressed.items())
+        return out
+
+    def close(self):
+        # No frame left to close the window: the settled value goes out now
+        if self._held is not None:
+            self._release_held(None, None)
+
+
+class MqttStage(Stage):
+    """Publish every payload emitted for the frame via publish(payload) -> bool."""
+
+    name = "mqtt"
+
+    def __init__(self, publish):
+        self.publish = publish
+        self.published = 0
+        self.failed = 0
+
+    def __call__(self, ctx):
+        if not ctx.outbox:
+            return
+        for payload in ctx.outbox:
+            self.send(payload)
+
+    def send(self, payload):
+        """Publish one payload outside of a frame (e.g. released by a stage at close)."""
+        if self.publish(payload) is False:
+            self.failed += 1
+        else:
+            self.published += 1
+
+
+class ConsoleStage(Stage):
+    """Print watched exceptions and ctx.printable (plus a tags line), per frame."""
+
+    name = "console"
+
+    def __init__(self, log):
+        self.log = log
+
+    def __call__(self, ctx):
+        if not ctx.watched:
+            return
+        if ctx.exc is not None:
+            self.log(f"[{ctx.wall}] [{ctx.src}->{ctx.dst}] FC={ctx.frame.fc} {ctx.exc_text}")
+            return
+        if ctx.printable:
+            self.log(f"[{ctx.wall}] [{ctx.src}->{ctx.dst}] FC={ctx.frame.fc} "
+                     f"{_pairs(sorted(ctx.printable.items()))}")
+        if ctx.printable_tags:
+            self.log(f"[{ctx.wall}] [{ctx.src}->{ctx.dst}] FC={ctx.frame.fc} "
+                     f"TAGS {_tag_pairs(ctx.printable_tags)}")
@@ -0,0 +1,33 @@
+# src/pipeline/throttle.py
+"""
+Rate limiting on the caller's nanosecond clock. The trigger stage uses
+frame capture time, so a PCAP replay is throttled exactly as the live
+capture would have been.
+"""
+
+__all__ = ["TokenBucket"]
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst; starts full."""
+
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.last = None
+
+    def take(self, now_ns):
+        """Spend a token: 0 if one was available, else ns until one is (nothing spent)."""
+        if self.last is not None and now_ns > self.last:
+            self.tokens = min(self.burst, self.tokens + (now_ns - self.last) * self.rate / 1e9)
+        if self.last is None or now_ns > self.last:
+            self.last = now_ns
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0
+        return int((1.0 - self.tokens) / self.rate * 1e9) + 1
@@ -0,0 +1,125 @@
+import socket
+import struct
+
+from capture.af_packet import AfPacketSource, compile_bpf, iter_ring_block
+
+
+def _eth_tcp(src, dst, sport, dport, payload=b"", frag=0):
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, 1, 0, 5 << 4, 0x18, 8192, 0, 0)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 40 + len(payload), 0, frag, 64, 6, 0,
+                     bytes(src), bytes(dst))
+    return b"\x00" * 12 + b"\x08\x00" + ip + tcp + payload
+
+
+def _run_bpf(prog, pkt):
+    """Tiny classic-BPF interpreter covering the opcodes compile_bpf emits."""
+    a = x = pc = 0
+    while True:
+        code, jt, jf, k = prog[pc]
+        if code == 0x06:  # ret #k
+            return k
+        if code == 0x20:
+            a = struct.unpack_from(">I", pkt, k)[0]
+        elif code == 0x28:
+            a = struct.unpack_from(">H", pkt, k)[0]
+        elif code == 0x30:
+            a = pkt[k]
+        elif code == 0x48:
+            a = struct.unpack_from(">H", pkt, x + k)[0]
+        elif code == 0xB1:
+            x = (pkt[k] & 0x0F) * 4
+        elif code == 0x15:
+            pc += jt if a == k else jf
+        elif code == 0x45:
+            pc += jt if a & k else jf
+        else:
+            raise AssertionError(f"unexpected opcode {code:#x}")
+        pc += 1
+
+
+M, S, OTHER = (10, 0, 0, 1), (10, 0, 0, 71), (10, 0, 0, 9)
+
+
+def test_bpf_accepts_modbus_either_direction():
+    prog = compile_bpf()
+    assert _run_bpf(prog, _eth_tcp(M, S, 40000, 502)) > 0
+    assert _run_bpf(prog, _eth_tcp(S, M, 502, 40000)) > 0
+    assert _run_bpf(prog, _eth_tcp(M, S, 40000, 80)) == 0
+
+
+def test_bpf_rejects_non_tcp_and_fragments():
+    prog = compile_bpf()
+    udp = bytearray(_eth_tcp(M, S, 40000, 502))
+    udp[23] = 17
+    assert _run_bpf(prog, bytes(udp)) == 0
+    assert _run_bpf(prog, _eth_tcp(M, S, 40000, 502, frag=0x0010)) == 0
+
+
+def test_bpf_src_dst_host_filters():
+    prog = compile_bpf(src="10.0.0.71", dst="10.0.0.1")
+    assert _run_bpf(prog, _eth_tcp(S, M, 502, 40000)) > 0
+    assert _run_bpf(prog, _eth_tcp(M, S, 40000, 502)) == 0
+    assert _run_bpf(prog, _eth_tcp(OTHER, M, 502, 40000)) == 0
+
+
+def test_iter_ring_block_walks_tpacket_v3_block():
+    frames = [_eth_tcp(M, S, 40000, 502, b"\x01"), _eth_tcp(S, M, 502, 40000, b"\x02\x03")]
+    block = bytearray(4096)
+    first = 48
+    struct.pack_into("IIIII", block, 0, 1, 0, 1, len(frames), first)
+    off = first
+    for i, frame in enumerate(frames):
+        mac = 80
+        nxt = (mac + len(frame) + 15) & ~15 if i < len(frames) - 1 else 0
+        struct.pack_into("IIIIIIHH", block, off, nxt, 100 + i, 5, len(frame), len(frame), 1, mac, mac + 14)
+        struct.pack_into("HB", block, off + 56, 1, 0)  # ARPHRD_ETHER, PACKET_HOST
+        block[off + mac : off + mac + len(frame)] = frame
+        off += nxt
+    out = [(ts, bytes(f)) for ts, f in iter_ring_block(block, 0)]
+    assert out == [(100_000_000_005, frames[0]), (101_000_000_005, frames[1])]
+
+
+def test_iter_ring_block_skips_truncated_packets():
+    whole, cut = _eth_tcp(M, S, 40000, 502, b"\x01"), _eth_tcp(S, M, 502, 40000, b"\x02" * 64)
+    block = bytearray(4096)
+    first, mac = 48, 80
+    struct.pack_into("IIIII", block, 0, 1, 0, 1, 2, first)
+    struct.pack_into("IIIIIIHH", block, first, 256, 100, 0, 40, len(cut), 1, mac, mac + 14)  # tp_snaplen < tp_len
+    struct.pack_into("IIIIIIHH", block, first + 256, 0, 101, 0, len(whole), len(whole), 1, mac, mac + 14)
+    block[first + mac : first + mac + 40] = cut[:40]
+    block[first + 256 + mac : first + 256 + mac + len(whole)] = whole
+    dropped = []
+    out = [bytes(f) for _ts, f in iter_ring_block(block, 0, lambda: dropped.append(1))]
+    assert out == [whole] and dropped == [1]
+
+
+class _FakeSocket:
+    """recvfrom_into() as AF_PACKET does it with MSG_TRUNC: returns the frame's real length."""
+
+    def __init__(self, source, frames):
+        self.source = source
+        self.frames = list(frames)
+        self.flags = []
+
+    def settimeout(self, _t):
+        pass
+
+    def recvfrom_into(self, buf, nbytes, flags):
+        self.flags.append(flags)
+        if not self.frames:
+            self.source.stop()
+            raise socket.timeout
+        frame = self.frames.pop(0)
+        n = min(len(buf), len(frame))
+        buf[:n] = frame[:n]
+        return len(frame), ("eth0", 0x0800, 0, 1, b"")
+
+
+def test_recv_frames_drops_and_counts_frames_longer_than_a_slot():
+    small, jumbo = _eth_tcp(M, S, 40000, 502, b"\x01"), _eth_tcp(S, M, 502, 40000, b"\x02" * 200)
+    src = AfPacketSource("eth0", use_ring=False, frame_size=128, batch=4)
+    src._sock = _FakeSocket(src, [small, jumbo, small])
+    out = [bytes(f) for _ts, f in src.raw_frames()]
+    assert out == [small, small]
+    assert src.truncated == 1 and src.received == 2
+    assert all(f & socket.MSG_TRUNC for f in src._sock.flags)
@@ -0,0 +1,45 @@
+from modbus.bitmap import CoilBitmap, CoilState, bit_positions
+from modbus.coils import check_coil_rules
+
+
+def test_bitmap_masks_padding_and_reads_bits():
+    bm = CoilBitmap(500, 10, b"\xff\xff")
+    assert bytes(bm.bits) == b"\xff\x03"
+    assert len(bm) == 10 and 509 in bm and 510 not in bm
+    assert bm[500] == 1 and bm.get(510) is None
+
+
+def test_bitmap_dict_roundtrip():
+    coils = {10: 1, 11: 0, 12: 1, 13: 1}
+    bm = CoilBitmap.from_dict(coils)
+    assert (bm.base, bm.count, bytes(bm.bits)) == (10, 4, b"\x0d")
+    assert bm.to_dict() == coils
+    assert CoilBitmap.from_dict({}).to_dict() == {}
+
+
+def test_bitmap_truncates_short_payload():
+    assert CoilBitmap(0, 20, b"\x01").count == 8
+
+
+def test_coil_state_reports_changes_with_xor():
+    state = CoilState()
+    assert state.update(CoilBitmap(100, 4, b"\x05")) == [100, 101, 102, 103]  # first sight
+    assert state.update(CoilBitmap(100, 4, b"\x05")) == []
+    assert state.update(CoilBitmap(101, 3, b"\x03")) == [101]
+    assert [state.get(a) for a in range(100, 104)] == [1, 1, 1, 0]
+    assert state.get(99) is None
+
+
+def test_check_coil_rules_on_bitmap_matches_dict_path():
+    bm = CoilBitmap(500, 16, b"\xa5\x0f")
+    rules = {500: 1, 501: 1, 502: 1, 511: 1, 515: 1, 600: 1}
+    assert check_coil_rules(bm, rules) == check_coil_rules(bm.to_dict(), rules)
+    assert check_coil_rules(bm, rules) == [
+        {"coil": 500, "value": 1},
+        {"coil": 502, "value": 1},
+        {"coil": 511, "value": 1},
+    ]
+
+
+def test_bit_positions():
+    assert bit_positions(0) == [] and bit_positions(0b1010_0001) == [0, 5, 7]
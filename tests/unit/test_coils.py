@@ -42,3 +42,21 @@ def test_parse_fc15_from_pdu_three_bits():
     m = _modbus_layer()
     coils = parse_fc15(pkt, m)
     assert coils == {500: 1, 501: 0, 502: 1}
+
+def test_parse_fc15_from_raw_bytes_payload():
+    # Native backends hand over raw bytes instead of tshark's hex string
+    full = bytes([0x00,0x01, 0x00,0x00, 0x00,0x08, 0x01, 0x0F, 0x01, 0xF4, 0x00, 0x03, 0x01, 0b110])
+    pkt = types.SimpleNamespace(tcp=types.SimpleNamespace(payload=full))
+    assert parse_fc15(pkt, _modbus_layer()) == {500: 0, 501: 1, 502: 1}
+
+def test_decode_pdu_helpers_on_memoryview():
+    from modbus.coils import decode_fc5_pdu, decode_fc15_pdu
+    assert decode_fc5_pdu(memoryview(bytes([0x05, 0x00, 0x0A, 0xFF, 0x00]))) == (10, 1)
+    assert decode_fc5_pdu(bytes([0x06, 0x00, 0x0A, 0xFF, 0x00])) is None
+    addr, qty, packed = decode_fc15_pdu(bytes([0x0F, 0x00, 0x0A, 0x00, 0x09, 0x02, 0xFF, 0x01]))
+    assert (addr, qty, bytes(packed)) == (10, 9, b"\xff\x01")
+
+def test_parse_fc15_packed_bitmap():
+    pdu = [0x0F, 0x01, 0xF4, 0x00, 0x0A, 0x02, 0xFF, 0xFF]
+    bm = parse_fc15(_pkt_with_pdu(pdu), _modbus_layer(), packed=True)
+    assert (bm.base, bm.count, bytes(bm.bits)) == (500, 10, b"\xff\x03")
@@ -0,0 +1,59 @@
+from modbus.correlation import TransactionTable, resolve_span
+
+FLOW = ("10.0.0.1", 40000, "10.0.0.71", 502)
+MS = 1_000_000
+
+
+def test_response_gets_request_address_and_latency():
+    t = TransactionTable()
+    t.add_request(FLOW, 1, 7, 3, 100, 2, ts_ns=0)
+    req, latency = t.match_response(FLOW, 1, 7, 3, ts_ns=12 * MS)
+    assert (req.address, req.quantity, latency) == (100, 2, 12 * MS)
+    assert len(t) == 0
+    st = t.stats()
+    assert st["matched"] == 1 and st["latency_max_ms"] == 12.0
+    assert st["latency_hist"][20] == 1
+
+
+def test_same_transaction_id_on_other_unit_or_flow_does_not_match():
+    t = TransactionTable()
+    t.add_request(FLOW, 1, 7, 3, 100, 2, ts_ns=0)
+    other = ("10.0.0.2", 40000, "10.0.0.71", 502)
+    assert t.match_response(other, 1, 7, 3, ts_ns=MS) == (None, None)
+    assert t.match_response(FLOW, 2, 7, 3, ts_ns=MS) == (None, None)
+    assert t.unmatched == 2 and len(t) == 1
+
+
+def test_exception_response_matches_request():
+    t = TransactionTable()
+    t.add_request(FLOW, 1, 7, 3, 100, 2, ts_ns=0)
+    req, _ = t.match_response(FLOW, 1, 7, 0x83, ts_ns=MS)
+    assert req is not None and req.address == 100
+
+
+def test_ttl_expires_old_requests():
+    t = TransactionTable(ttl=1.0)
+    t.add_request(FLOW, 1, 1, 3, 100, 2, ts_ns=0)
+    t.add_request(FLOW, 1, 2, 3, 200, 2, ts_ns=2_000_000_000)
+    assert len(t) == 1 and t.expired == 1
+    assert t.match_response(FLOW, 1, 1, 3, ts_ns=2_000_000_001) == (None, None)
+
+
+def test_size_bound_evicts_oldest_and_reuse_supersedes():
+    t = TransactionTable(max_pending=2)
+    for tid in range(3):
+        t.add_request(FLOW, 1, tid, 3, tid * 10, 1, ts_ns=tid)
+    assert len(t) == 2 and t.evicted == 1
+    t.add_request(FLOW, 1, 2, 3, 999, 1, ts_ns=5)
+    assert t.superseded == 1
+    req, _ = t.match_response(FLOW, 1, 2, 3, ts_ns=6)
+    assert req.address == 999
+
+
+def test_resolve_span_pairs_read_response():
+    table = TransactionTable()
+    assert resolve_span(table, FLOW, 1, 9, bytes([0x01, 0x00, 0x0A, 0x00, 0x03]), False, 0) == (10, 3)
+    assert resolve_span(table, FLOW, 1, 9, bytes([0x01, 0x01, 0x06]), True, 1000) == (10, 3)
+    # FC6 echo: second field is the value, not a quantity
+    assert resolve_span(table, FLOW, 1, 10, bytes([0x06, 0x00, 0x64, 0x00, 0x03]), True, 0) == (100, 1)
+    assert resolve_span(table, FLOW, 1, 11, b"", False, 0) == (-1, 0)
@@ -0,0 +1,44 @@
+import struct
+
+from modbus.decoders import (
+    decode_exception_pdu,
+    decode_fc6_pdu,
+    decode_fc16_request,
+    decode_fc23_request,
+    decode_read_bits_response,
+    is_exception,
+)
+
+
+def test_exception_pdu():
+    assert decode_exception_pdu(bytes([0x83, 0x02])) == (3, 2)
+    assert decode_exception_pdu(bytes([0x03, 0x02])) is None
+    assert decode_exception_pdu(b"\x90") is None
+    assert is_exception(0x90) and not is_exception(0x10)
+
+
+def test_read_bits_response_needs_request_span():
+    pdu = bytes([0x01, 0x02, 0b1010_0101, 0xFF])
+    bm = decode_read_bits_response(pdu, 20, 10)
+    assert bm.to_dict() == {20: 1, 21: 0, 22: 1, 23: 0, 24: 0, 25: 1, 26: 0, 27: 1, 28: 1, 29: 1}
+    assert decode_read_bits_response(pdu, -1, 10) is None
+
+
+def test_fc6_request_and_echo():
+    assert decode_fc6_pdu(bytes([0x06, 0x00, 0x64, 0x12, 0x34])) == (100, 0x1234)
+    assert decode_fc6_pdu(bytes([0x06, 0x00])) is None
+
+
+def test_fc16_request():
+    pdu = bytes([0x10, 0x00, 0xC8, 0x00, 0x03, 0x06]) + struct.pack(">HHH", 1, 2, 65535)
+    addr, regs = decode_fc16_request(pdu)
+    assert (addr, list(regs)) == (200, [1, 2, 65535])
+    # Truncated payload: only the registers actually present
+    assert list(decode_fc16_request(pdu[:-2])[1]) == [1, 2]
+
+
+def test_fc23_request():
+    pdu = bytes([0x17]) + struct.pack(">HHHHB", 100, 2, 300, 2, 4) + struct.pack(">HH", 7, 8)
+    raddr, rqty, waddr, regs = decode_fc23_request(pdu)
+    assert (raddr, rqty, waddr, list(regs)) == (100, 2, 300, [7, 8])
+    assert decode_fc23_request(pdu[:8]) is None
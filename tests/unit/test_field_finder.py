@@ -0,0 +1,73 @@
+import types
+
+import pytest
+
+from modbus import field_finder
+from modbus.field_finder import find_field, field_cache_stats, FIELD_CACHE
+
+
+class FakeLayer:
+    """pyshark-like layer: fields only via get_field(), counts lookups."""
+    layer_name = "modbus"
+
+    def __init__(self, fields):
+        self._fields = fields
+        self.field_names = list(fields)
+        self.lookups = 0
+
+    def get_field(self, name):
+        self.lookups += 1
+        if name not in self._fields:
+            return None
+        return types.SimpleNamespace(showname_value=self._fields[name])
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    FIELD_CACHE.clear()
+    yield
+    FIELD_CACHE.clear()
+
+
+CANDS = ["ref_num", "reference_number", "address"]
+
+
+def test_find_field_caches_winning_name():
+    layer = FakeLayer({"func_code": "5", "bit_addr": "500"})
+    # Resolved by the substring fallback over all fields on the first call
+    assert find_field(layer, ["ref_num", "addr"], as_int=True) == (500, "bit_addr")
+    first = layer.lookups
+    assert find_field(layer, ["ref_num", "addr"], as_int=True) == (500, "bit_addr")
+    assert layer.lookups - first == 1  # straight to the remembered field
+    assert field_cache_stats()["hits"] == 1 and field_cache_stats()["misses"] == 1
+
+
+def test_find_field_caches_negative_result():
+    layer = FakeLayer({"func_code": "5"})
+    assert find_field(layer, CANDS) == (None, None)
+    before = layer.lookups
+    assert find_field(layer, CANDS) == (None, None)
+    assert layer.lookups == before
+
+
+def test_schema_change_is_a_new_entry():
+    a = FakeLayer({"ref_num": "10"})
+    b = FakeLayer({"reference_number": "20"})
+    assert find_field(a, CANDS, as_int=True) == (10, "ref_num")
+    assert find_field(b, CANDS, as_int=True) == (20, "reference_number")
+    assert field_cache_stats()["entries"] == 2
+
+
+def test_stale_entry_is_invalidated():
+    layer = FakeLayer({"ref_num": "10"})
+    find_field(layer, CANDS)
+    key = FIELD_CACHE.key(layer, CANDS)
+    FIELD_CACHE.put(key, field_finder._FIELD, "gone")
+    assert find_field(layer, CANDS, as_int=True) == (10, "ref_num")
+    assert field_cache_stats()["invalidations"] == 1
+
+
+def test_layers_without_field_names_are_not_cached():
+    layer = types.SimpleNamespace(address="0x10")
+    assert find_field(layer, CANDS, as_int=True) == (16, "address")
+    assert field_cache_stats()["entries"] == 0
@@ -0,0 +1,37 @@
+import struct
+
+from modbus.frame import ModbusFrame, pack_ip, ip_str, frame_wall_time, frame_values
+
+
+def _frame(fc, pdu, address=-1, quantity=0, is_response=False, values=None):
+    return ModbusFrame(1_769_185_481_137_000_000, pack_ip("10.0.0.1"), pack_ip("10.0.0.71"),
+                       40000, 502, 1, 0, fc, address, quantity, memoryview(bytes(pdu)),
+                       is_response, values)
+
+
+def test_pack_ip_roundtrip():
+    assert ip_str(pack_ip("10.2.13.53")) == "10.2.13.53"
+    assert ip_str(pack_ip("fe80::1")) == "fe80::1"
+    assert pack_ip("not-an-ip") == b"" and pack_ip(None) == b""
+    assert ip_str(b"") is None
+
+
+def test_frame_wall_time_milliseconds():
+    assert frame_wall_time(_frame(3, b"")) == "2026-01-23T16:24:41.137Z"
+
+
+def test_frame_values_fc3_response_uses_correlated_address():
+    pdu = bytes([3, 4]) + struct.pack(">HH", 5, 42)
+    assert frame_values(_frame(3, pdu, address=100, quantity=2, is_response=True)) == {100: 5, 101: 42}
+    # Unknown start address (no matching request seen): nothing to report
+    assert frame_values(_frame(3, pdu, is_response=True)) == {}
+
+
+def test_frame_values_coils():
+    assert frame_values(_frame(5, [0x05, 0x01, 0xF4, 0xFF, 0x00])) == {500: 1}
+    fc15 = _frame(15, [0x0F, 0x00, 0x0A, 0x00, 0x03, 0x01, 0b101])
+    assert frame_values(fc15) == {10: 1, 11: 0, 12: 1}
+
+
+def test_frame_values_prefers_dissected_values():
+    assert frame_values(_frame(3, b"", values={7: 1})) == {7: 1}
@@ -0,0 +1,110 @@
+from array import array
+
+from modbus.bitmap import CoilBitmap
+from modbus.frame import ModbusFrame, pack_ip
+from modbus.image import BLOCK_SIZE, ImageStore, RegisterImage
+
+
+def test_update_reports_first_seen_then_only_changes():
+    img = RegisterImage()
+    assert img.get(100) is None and img.last(100) is None
+    assert img.update(100, [1, 2, 3], ts_ns=10) == [100, 101, 102]
+    assert img.update(100, array("H", [1, 2, 3]), ts_ns=20) == []
+    assert img.update(101, (2, 9, 4), ts_ns=30) == [102, 103]
+    assert [img.get(a) for a in range(99, 105)] == [None, 1, 2, 9, 4, None]
+    assert img.last(103) == (4, 30)
+
+
+def test_dirty_blocks_and_timestamps():
+    img = RegisterImage()
+    img.update(BLOCK_SIZE - 1, [1, 1], ts_ns=5)        # straddles blocks 0 and 1
+    assert img.take_dirty() == [0, 1]
+    assert img.take_dirty() == []
+    img.update(BLOCK_SIZE - 1, [1, 1], ts_ns=6)        # unchanged: touched, not dirty
+    assert img.take_dirty() == [] and img.updated_ns[0] == img.updated_ns[1] == 6
+    img.update_map({3 * BLOCK_SIZE: 7}, ts_ns=8)
+    assert img.take_dirty() == [3]
+
+
+def test_block_past_end_of_address_space_is_clipped():
+    img = RegisterImage()
+    assert img.update(65534, [1, 2, 3]) == [65534, 65535]
+    assert img.update_map({70000: 1}) == []
+
+
+def test_store_keys_by_server_and_unit():
+    store = ImageStore()
+    plc, hmi = pack_ip("10.0.0.71"), pack_ip("10.0.0.1")
+    resp = ModbusFrame(0, plc, hmi, 502, 40000, 1, 0, 3, 0, 1, memoryview(b""), True)
+    req = ModbusFrame(0, hmi, plc, 40000, 502, 1, 0, 16, 0, 1, memoryview(b""), False)
+    other = ModbusFrame(0, plc, hmi, 502, 40000, 2, 0, 3, 0, 1, memoryview(b""), True)
+    assert store.for_frame(resp) is store.for_frame(req)
+    assert store.for_frame(other) is not store.for_frame(resp)
+    assert len(store) == 2
+
+
+def test_input_registers_and_discrete_inputs_are_separate_tables():
+    dev = ImageStore().device(pack_ip("10.0.0.71"), 1)
+    dev.registers_for(3).update(0, [1])
+    assert dev.registers_for(4).get(0) is None
+    assert dev.registers_for(16) is dev.holding
+    assert dev.bits_for(1).update(CoilBitmap(0, 1, b"\x01")) == [0]
+    assert dev.bits_for(2).get(0) is None
+
+
+def test_memory_is_fixed_per_device():
+    store = ImageStore()
+    dev = store.device(pack_ip("10.0.0.71"), 1)
+    before = store.stats()["bytes"]
+    for i in range(0, 65536, 125):
+        dev.holding.update(i, list(range(125)), ts_ns=i)
+    assert store.stats() == {"devices": 1, "bytes": before}
+
+
+def test_changed_words_xor_fold():
+    from modbus.image import changed_words
+    old = array("H", range(200))
+    new = array("H", old)
+    assert changed_words(old.tobytes(), new.tobytes()) == []
+    for i in (0, 7, 8, 199):
+        new[i] ^= 0x8000 if i == 7 else 1
+    assert changed_words(old.tobytes(), new.tobytes()) == [0, 7, 8, 199]
+
+
+def test_same_payload_requires_its_blocks_unchanged():
+    img = RegisterImage()
+    pdu = memoryview(b"\x03\x02\x00\x01")
+    assert not img.same_payload("k", pdu)
+    img.update(0, [1])
+    img.remember("k", pdu, 0, 1)
+    assert img.same_payload("k", pdu)
+    assert not img.same_payload("k", b"\x03\x02\x00\x02")
+    img.update(5, [9])                  # another register of the same block changing
+    assert not img.same_payload("k", pdu)
+
+
+def test_same_payload_survives_changes_in_other_blocks():
+    img = RegisterImage()
+    counters = [0] * 10
+    img.update(0, counters)
+    analog = bytes([3, 20]) + bytes(20)
+    img.update(BLOCK_SIZE * 2, [0] * 10)
+    img.remember("analog", analog, BLOCK_SIZE * 2, 10)
+    for i in range(1, 5):               # one block keeps changing on every poll
+        counters[0] = i
+        img.update(0, counters)
+        img.update_map({1: i})
+        assert img.same_payload("analog", analog)
+    img.update_map({BLOCK_SIZE * 2 + 9: 1})
+    assert not img.same_payload("analog", analog)
+
+
+def test_same_payload_checks_every_block_it_covers():
+    img = RegisterImage()
+    pdu = b"\x03\x04\x00\x00\x00\x00"
+    start = BLOCK_SIZE - 1              # straddles blocks 0 and 1
+    img.update(start, [0, 0])
+    img.remember("k", pdu, start, 2)
+    assert img.same_payload("k", pdu)
+    img.update(BLOCK_SIZE + 5, [7])
+    assert not img.same_payload("k", pdu)
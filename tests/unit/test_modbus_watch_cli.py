@@ -8,6 +8,14 @@ import pytest
 
 # We import the module under test after monkeypatching to ensure our stubs are used
 MODULE_PATH = "cli.modbus_watch"
+# The pyshark -> ModbusFrame adapter binds the modbus helpers at import, so it
+# is re-imported together with the CLI to pick up the fakes below.
+ADAPTER_PATH = "capture.pyshark_frames"
+
+import modbus.frame  # noqa: E402,F401  (real modules, imported before any fakes)
+import capture.pyshark_frames  # noqa: E402,F401
+import pipeline.sources  # noqa: E402,F401
+import pipeline.stages  # noqa: E402,F401
 
 
 class FakePkt:
@@ -98,6 +106,7 @@ def _import_under_test(monkeypatch):
     # Ensure a clean import (module reload), in case prior tests imported it
     if MODULE_PATH in sys.modules:
         del sys.modules[MODULE_PATH]
+    monkeypatch.delitem(sys.modules, ADAPTER_PATH, raising=False)
     mod = __import__(MODULE_PATH, fromlist=["*"])
     return mod
 
@@ -188,3 +197,55 @@ def test_replay_fc3_deltas_only(monkeypatch):
     # (There may be other log lines; we count lines that contain the watched reg)
     watched_lines = [line for line in catcher.infos if "FC=3" in line and "100=" in line]
     assert printed_5 and printed_6 and len(watched_lines) == 2
+
+
+def test_binary_payload_fits_precompiled_trigger_layout(monkeypatch):
+    catcher = LogCatcher()
+    _install_fake_logging(monkeypatch, catcher)
+    _install_fake_pyshark(monkeypatch, [])
+    _install_fake_modbus_helpers(monkeypatch)
+
+    mod = _import_under_test(monkeypatch)
+    from mqtt.encoders import BinaryEncoder, decode_trigger
+
+    args = mod._build_args(["--pcap", "x.pcapng", "--payload-format", "binary",
+                            "--trigger-change-reg", "100", "--include-regs", "200", "205"])
+    layout = mod._trigger_layout(args)
+    assert layout.context == ("200", "205") and layout.tags == ()
+    payload = mod._build_payload(args, 1769185481137000000, "10.1.2.3", "10.2.3.4", 3,
+                                 trigger_reg=100, trigger_val=3, context_regs={"200": 7, "205": None},
+                                 unit=1)
+    data = BinaryEncoder([layout]).encode(payload)
+    assert data[0] == 0xB1
+    assert decode_trigger(data, [layout]) == payload
+
+
+def test_workers_without_native_replay_are_rejected(monkeypatch):
+    catcher = LogCatcher()
+    _install_fake_logging(monkeypatch, catcher)
+    _install_fake_pyshark(monkeypatch, [])
+    _install_fake_modbus_helpers(monkeypatch)
+
+    mod = _import_under_test(monkeypatch)
+    assert mod.main(["--pcap", "x.pcapng", "--workers", "4"]) == 2
+    assert mod.main(["--iface", "eth0", "--backend", "native", "--workers", "4"]) == 2
+    assert catcher.errs == ["--workers needs --backend native and --pcap"] * 2
+
+
+def test_tshark_failure_exits_with_an_error(monkeypatch):
+    catcher = LogCatcher()
+    _install_fake_logging(monkeypatch, catcher)
+    _install_fake_pyshark(monkeypatch, [])
+    _install_fake_modbus_helpers(monkeypatch)
+
+    mod = _import_under_test(monkeypatch)
+    from capture.tshark_fields import TsharkError
+    from pipeline.sources import FrameSource
+
+    def failing():
+        raise TsharkError("tshark exited with 2: bad capture")
+        yield
+
+    monkeypatch.setattr(mod, "open_source", lambda *a, **kw: FrameSource(failing(), None, "x"))
+    assert mod.main(["--pcap", "x.pcapng", "--backend", "tshark-fields"]) == 1
+    assert catcher.errs == ["tshark exited with 2: bad capture"]
@@ -0,0 +1,101 @@
+import threading
+
+from mqtt.batch import BatchPublisher, payload_key
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _publisher(**kw):
+    sent = []
+    clock = Clock()
+    bp = BatchPublisher(lambda topic, payloads: sent.append((topic, payloads)) or True,
+                        clock=clock, start=False, **kw)
+    return bp, sent, clock
+
+
+def test_batches_by_size_and_by_window_per_topic():
+    bp, sent, clock = _publisher(window_ms=50, max_events=3)
+    for i in range(4):
+        bp.publish({"n": i}, "a")
+    bp.publish({"n": 9}, "b")
+    assert sent == [("a", [{"n": 0}, {"n": 1}, {"n": 2}])]
+    clock.t = 0.03
+    assert abs(bp.flush_due() - 0.02) < 1e-9 and len(sent) == 1
+    clock.t = 0.06
+    assert bp.flush_due() is None
+    assert sent[1:] == [("a", [{"n": 3}]), ("b", [{"n": 9}])]
+    st = bp.stats()
+    assert st["events"] == 5 and st["batches"] == 3 and st["max_batch"] == 3
+    assert st["max_latency_ms"] == 60.0
+
+
+def test_coalescing_keeps_latest_value_in_first_position():
+    bp, sent, _clock = _publisher(max_events=10, coalesce=True)
+    bp.publish({"src": "a", "reg": 100, "value": 1})
+    bp.publish({"src": "a", "reg": 101, "value": 5})
+    bp.publish({"src": "a", "reg": 100, "value": 2})
+    bp.publish({"src": "b", "reg": 100, "value": 3})
+    bp.publish("text payloads are never coalesced")
+    bp.flush()
+    assert [p if isinstance(p, str) else (p["src"], p["reg"], p["value"]) for p in sent[0][1]] == [
+        ("a", 100, 2), ("a", 101, 5), ("b", 100, 3), "text payloads are never coalesced",
+    ]
+    assert bp.stats()["coalesced"] == 1
+
+
+def test_failed_batches_are_counted():
+    bp = BatchPublisher(lambda topic, payloads: False, start=False)
+    bp.publish({"x": 1})
+    bp.flush()
+    st = bp.stats()
+    assert st["failed_batches"] == 1 and st["avg_batch"] == 0.0
+
+
+def test_payload_key():
+    assert payload_key({"src": "1.2.3.4", "unit": 1, "reg": 7, "value": 1}) == ("reg", "1.2.3.4", 1, 7)
+    assert payload_key({"type": "coil", "ip": "1.2.3.4", "unit": 2, "coils": {12: True}}) == (
+        "coil", "1.2.3.4", 2, (12,))
+    assert payload_key({"type": "register", "ip": "1.2.3.4", "unit": 1,
+                        "matches": [{"register": 100, "value": 1, "rule": "started"}]}) == (
+        "register", "1.2.3.4", 1, ((100, "started"),))
+    assert payload_key({"type": "exception", "ip": "1.2.3.4", "unit": 1, "fc": 3, "code": 2}) == (
+        "exception", "1.2.3.4", 1, (3, 2))
+    assert payload_key({"type": "register", "ip": "1.2.3.4"}) is None
+    assert payload_key({"other": 1}) is None
+
+
+def test_coalescing_keeps_separate_rules_registers_and_units():
+    bp, sent, _clock = _publisher(max_events=10, coalesce=True)
+
+    def rule(reg, name, value, unit=1):
+        return {"type": "register", "ip": "10.0.0.71", "unit": unit,
+                "matches": [{"register": reg, "value": value, "rule": name}]}
+
+    bp.publish(rule(100, "pulse_box_started", 1))
+    bp.publish(rule(200, "pulse_box_started", 1))            # other register: kept
+    bp.publish(rule(100, "pulse_box_stopped", 0))            # other rule: kept
+    bp.publish(rule(100, "pulse_box_started", 1, unit=2))    # other unit behind the gateway: kept
+    bp.publish(rule(100, "pulse_box_started", 3))            # repeat of the first: replaces it
+    bp.publish({"src": "10.0.0.71", "unit": 2, "reg": 100, "value": 1})
+    bp.publish({"src": "10.0.0.71", "unit": 1, "reg": 100, "value": 1})
+    bp.flush()
+    batch = sent[0][1]
+    assert len(batch) == 6 and bp.stats()["coalesced"] == 1
+    assert batch[0]["matches"][0]["value"] == 3
+
+
+def test_background_flusher_sends_after_window_and_close_flushes():
+    got = threading.Event()
+    sent = []
+    bp = BatchPublisher(lambda t, p: sent.append(p) or got.set(), window_ms=10, max_events=100)
+    bp.publish({"n": 1})
+    assert got.wait(2.0)
+    bp.publish({"n": 2})
+    bp.close()
+    assert sent == [[{"n": 1}], [{"n": 2}]]
@@ -0,0 +1,113 @@
+import importlib
+import json
+import sys
+import time
+import types
+
+
+class _Info:
+    def __init__(self, rc=0):
+        self.rc = rc
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return True
+
+
+class FakeClient:
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        self.rc = 0
+
+    def __getattr__(self, name):  # reconnect_delay_set, connect_async, loop_start...
+        return lambda *a, **k: None
+
+    def publish(self, topic, data, qos=0):
+        self.sent.append((topic, data))
+        return _Info(self.rc)
+
+
+def _client_module(monkeypatch):
+    paho_client = types.ModuleType("paho.mqtt.client")
+    paho_client.Client = FakeClient
+    paho_client.CallbackAPIVersion = types.SimpleNamespace(VERSION2=2)
+    paho_client.MQTT_ERR_SUCCESS = 0
+    paho_client.MQTT_ERR_NOMEM = 1
+    paho_client.MQTT_ERR_NO_CONN = 4
+    paho_client.MQTT_ERR_QUEUE_SIZE = 15
+    paho_mqtt = types.ModuleType("paho.mqtt")
+    paho_mqtt.client = paho_client
+    paho = types.ModuleType("paho")
+    paho.mqtt = paho_mqtt
+    monkeypatch.setitem(sys.modules, "paho", paho)
+    monkeypatch.setitem(sys.modules, "paho.mqtt", paho_mqtt)
+    monkeypatch.setitem(sys.modules, "paho.mqtt.client", paho_client)
+    monkeypatch.delitem(sys.modules, "mqtt.client", raising=False)
+    return importlib.import_module("mqtt.client")
+
+
+def test_outage_is_spooled_and_replayed_in_order(monkeypatch, tmp_path):
+    client = _client_module(monkeypatch)
+    try:
+        client.init_mqtt(batch_ms=0, spool_dir=str(tmp_path), drain_rate=1000)
+        c = client._client
+        conn = client._pool["default"]
+        conn.connected = False
+        for i in range(3):
+            assert client.mqtt_publish({"n": i}) is True
+        assert c.sent == [] and client.mqtt_stats()["spool_pending"] == 3
+
+        conn.connected = True
+        client.mqtt_publish({"n": 3})           # backlog first: this one queues behind it
+        deadline = time.monotonic() + 5
+        while len(c.sent) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [json.loads(d) for _t, d in c.sent] == [{"n": 0}, {"n": 1}, {"n": 2}, {"n": 3}]
+        client.mqtt_publish({"n": 4})           # drained: straight to the broker
+        assert json.loads(c.sent[-1][1]) == {"n": 4}
+        assert client.close_mqtt()["spool_replayed"] == 4
+    finally:
+        client.close_mqtt()
+        sys.modules.pop("mqtt.client", None)
+
+
+def test_only_messages_paho_refused_are_spooled(monkeypatch, tmp_path):
+    client = _client_module(monkeypatch)
+    try:
+        client.init_mqtt(batch_ms=0, spool_dir=str(tmp_path))
+        conn = client._pool["default"]
+        conn.connected = True
+        conn.forwarder.stop()               # keep what is spooled in place
+        c = client._client
+        c.rc = 4                            # NO_CONN: paho queued it and resends after reconnect
+        assert conn.deliver("t", b"a") is True and len(conn.spool) == 0
+        c.rc = 15                           # QUEUE_SIZE: paho dropped it
+        assert conn.deliver("t", b"b") is True and len(conn.spool) == 1
+    finally:
+        client.close_mqtt()
+        sys.modules.pop("mqtt.client", None)
+
+
+def test_routes_fan_out_over_one_connection_per_broker(monkeypatch):
+    client = _client_module(monkeypatch)
+    try:
+        client.init_mqtt(
+            batch_ms=0, spool_dir="", topic="plant/{src}/{unit}/reg/{reg}",
+            brokers={"hist": {"host": "h", "port": 1884}, "nohost": {"port": 1885}},
+            routes=[{"broker": "hist", "topic": "hist/{src}", "match": {"reg": 100}},
+                    {"broker": "nowhere", "topic": "x"},
+                    {"broker": "nohost", "topic": "y"}],      # rejected like an unknown broker
+        )
+        assert set(client._pool) == {"default", "hist"}
+        default, hist = client._pool["default"].client, client._pool["hist"].client
+        assert client._client is default and hist is not default
+        assert client.mqtt_publish({"src": "10.0.0.71", "unit": 1, "reg": 100}) is True
+        assert client.mqtt_publish({"src": "10.0.0.71", "unit": 1, "reg": 7}) is True
+        assert [(t, json.loads(d)) for t, d in hist.sent] == [
+            ("hist/10.0.0.71", {"src": "10.0.0.71", "unit": 1, "reg": 100})]
+        assert [t for t, _d in default.sent] == ["plant/10.0.0.71/1/reg/7"]
+    finally:
+        client.close_mqtt()
+        sys.modules.pop("mqtt.client", None)
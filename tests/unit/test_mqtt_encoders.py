@@ -0,0 +1,63 @@
+import json
+import math
+
+import pytest
+
+from mqtt.encoders import BinaryEncoder, JsonEncoder, TriggerLayout, decode_trigger, get_encoder
+
+TRIGGER = {"ts": 1735689600123456789, "src": "10.0.0.71", "dst": "10.0.0.1", "fc": 3, "reg": 100,
+           "value": 3, "context": {"200": 1234, "205": None}, "unit": 1,
+           "tags": {"flow": 12.5, "temps": [1.0, 2.0]}}
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_json_encoder_matches_stdlib_semantics(fast):
+    enc = JsonEncoder(fast=fast)
+    payload = {"a": 1, "context": {200: 5}, "s": "x"}
+    assert json.loads(enc.encode(payload)) == {"a": 1, "context": {"200": 5}, "s": "x"}
+    assert json.loads(enc.encode_batch([payload, "text"]))[1] == "text"
+    assert json.loads(enc.encode({"big": 1 << 70}))["big"] == 1 << 70
+
+
+def test_binary_trigger_round_trip_and_size():
+    layout = TriggerLayout(["200", "205"], [("flow", 1), ("temps", 2), ("level", 1)])
+    compiled = []
+    enc = BinaryEncoder([layout], on_layout=compiled.append)
+    data = enc.encode(TRIGGER)
+    assert data[0] == 0xB1 and len(data) == layout.size and compiled == []   # declared: not re-announced
+    assert len(data) * 3 < len(json.dumps(dict(TRIGGER, ts="2025-01-01T00:00:00.123456+00:00")))
+    # absent tags come back absent, unseen context registers as None
+    assert decode_trigger(data, [layout.describe()]) == TRIGGER
+
+
+def test_binary_layout_is_compiled_once_per_shape():
+    compiled = []
+    enc = BinaryEncoder(on_layout=compiled.append)
+    plain = dict(TRIGGER, tags={})
+    a, b = enc.encode(plain), enc.encode(dict(plain, value=4, context={"200": 1, "205": 2}))
+    (layout,) = set(enc._by_shape.values())
+    assert compiled == [layout]                 # announced once, when compiled
+    assert a[1:5] == b[1:5] == layout.id.to_bytes(4, "big")
+    out = decode_trigger(b, [layout])
+    assert out["value"] == 4 and out["context"] == {"200": 1, "205": 2} and "tags" not in out
+
+
+def test_binary_falls_back_to_json_and_batches():
+    enc = get_encoder("binary")
+    rule = {"type": "register", "ip": "10.0.0.71", "matches": [{"register": 100, "value": 3}]}
+    wall_ts = dict(TRIGGER, ts="2025-01-01T00:00:00")          # not ns: does not fit
+    ipv6 = dict(TRIGGER, src="::1")
+    for payload in (rule, "text", wall_ts, ipv6):
+        assert json.loads(enc.encode(payload)) == payload
+    batch = enc.encode_batch([TRIGGER, rule])
+    assert batch[0] == 0xB2
+    assert decode_trigger(batch, enc._by_shape.values()) == [TRIGGER, rule]
+    with pytest.raises(ValueError):
+        decode_trigger(enc.encode(TRIGGER), [])
+
+
+def test_nan_marks_missing_tags_only():
+    layout = TriggerLayout([], [("x", 1)])
+    out = layout.decode(layout.encode(dict(TRIGGER, context={}, tags={"x": math.inf})))
+    assert out["tags"] == {"x": math.inf}
+    assert get_encoder("text").name == "json"
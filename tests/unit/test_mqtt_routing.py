@@ -0,0 +1,49 @@
+import pytest
+
+from mqtt.routing import Route, Router, TopicTemplate
+
+TRIGGER = {"ts": "t", "src": "10.0.0.71", "dst": "10.0.0.1", "fc": 3, "unit": 1, "reg": 100,
+           "value": 3, "context": {}}
+RULE = {"type": "register", "ip": "10.0.0.71", "unit": 2,
+        "matches": [{"register": 100, "value": 3, "rule": "pulse_box_started"}]}
+
+
+def test_template_renders_payload_fields_and_caches_per_key():
+    t = TopicTemplate("plant/{src}/{unit}/reg/{reg}")
+    assert t.fields == ("src", "unit", "reg")
+    assert t.render(TRIGGER) == "plant/10.0.0.71/1/reg/100"
+    # rule payloads: src is the ip, reg/rule come from the first match
+    assert t.render(RULE) == "plant/10.0.0.71/2/reg/100"
+    assert TopicTemplate("x/{rule}").render(RULE) == "x/pulse_box_started"
+    assert t.render(TRIGGER) is t.render(dict(TRIGGER, value=4))
+    assert len(t._cache) == 2
+
+
+def test_template_missing_and_unsafe_values_stay_one_level():
+    t = TopicTemplate("a/{src}/{reg}")
+    assert t.render("text payload") == "a/_/_"
+    assert t.render({"src": "x/+#", "reg": ""}) == "a/x___/_"
+    assert TopicTemplate("plain/{{literal}}").render(TRIGGER) == "plain/{literal}"
+    with pytest.raises(ValueError):
+        TopicTemplate("a/{}")
+
+
+def test_routes_by_rule_name_and_fields_with_fallback():
+    router = Router([
+        {"broker": "hist", "topic": "hist/{src}/{rule}", "rules": ["pulse_box_started"]},
+        {"topic": "alarms/{ip}", "match": {"type": ["exception", "coil"]}},
+        {"broker": "hist", "topic": "fc/{fc}", "match": {"fc": 3}},
+    ], fallback="base/{src}")
+    assert router.brokers == {"default", "hist"}
+    assert router.resolve(RULE) == [("hist", "hist/10.0.0.71/pulse_box_started")]
+    assert router.resolve({"type": "exception", "ip": "1.2.3.4"}) == [("default", "alarms/1.2.3.4")]
+    assert router.resolve(TRIGGER) == [("hist", "fc/3")]
+    assert router.resolve(dict(TRIGGER, fc=16)) == [("default", "base/10.0.0.71")]
+    assert router.resolve("text") == [("default", "base/_")]
+
+
+def test_route_fans_out_to_every_match():
+    router = Router([Route("a"), Route("b/{unit}", broker="other")], fallback="never")
+    assert router.resolve(TRIGGER) == [("default", "a"), ("other", "b/1")]
+    with pytest.raises(ValueError):
+        Router([{"broker": "x"}])
@@ -0,0 +1,97 @@
+from mqtt.spool import DiskSpool, SpoolForwarder
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1_000_000_000
+
+    def __call__(self):
+        return self.t
+
+
+def _payloads(items):
+    return [p.decode() for _t, p in items]
+
+
+def test_append_peek_ack_in_order_across_segments(tmp_path):
+    sp = DiskSpool(tmp_path, segment_bytes=4096, batch=4)
+    for i in range(300):
+        sp.append("t/a" if i % 2 else "t/b", f"m{i:03d}-" + "x" * 20)
+    assert len(sp) == 300 and sp.stats()["segments"] > 1
+    got = []
+    while len(sp):
+        items = sp.peek(64)
+        got += _payloads(items)
+        sp.ack(len(items))
+    assert [g[:4] for g in got] == [f"m{i:03d}" for i in range(300)]
+    st = sp.stats()
+    assert st["replayed"] == 300 and st["pending"] == 0 and st["segments"] == 1
+
+
+def test_partial_ack_and_restart_resume(tmp_path):
+    sp = DiskSpool(tmp_path, batch=100)
+    for i in range(10):
+        sp.append("t", str(i))
+    items = sp.peek(5)
+    assert [t for t, _p in items] == ["t"] * 5
+    sp.ack(3)
+    sp.close()
+    sp = DiskSpool(tmp_path)
+    assert len(sp) == 7
+    assert _payloads(sp.peek(100)) == [str(i) for i in range(3, 10)]
+
+
+def test_torn_tail_is_cut_on_open(tmp_path):
+    sp = DiskSpool(tmp_path, batch=1)
+    sp.append("t", "one")
+    sp.append("t", "two")
+    sp.close()
+    seg = next(tmp_path.glob("seg-*.log"))
+    seg.write_bytes(seg.read_bytes()[:-2])
+    sp = DiskSpool(tmp_path)
+    assert _payloads(sp.peek(10)) == ["one"]
+    assert sp.stats()["corrupt"] == 1
+
+
+def test_size_cap_drops_oldest_segments_and_counts(tmp_path):
+    sp = DiskSpool(tmp_path, segment_bytes=4096, max_bytes=16384, batch=1)
+    for i in range(1000):
+        sp.append("t", f"{i:04d}" + "y" * 60)
+    st = sp.stats()
+    assert st["bytes"] <= 16384 + 4096 + 100
+    assert st["dropped_size"] + st["pending"] == 1000
+    first = int(sp.peek(1)[0][1][:4])
+    assert first == st["dropped_size"]
+
+
+def test_age_cap_skips_old_records(tmp_path):
+    clock = Clock()
+    sp = DiskSpool(tmp_path, max_age_s=60, batch=1, clock=clock)
+    sp.append("t", "old")
+    clock.t += 61 * 10**9
+    sp.append("t", "new")
+    assert _payloads(sp.peek(10)) == ["new"]
+    assert sp.stats()["dropped_age"] == 1
+    assert _payloads(sp.peek(10)) == ["new"] and sp.stats()["dropped_age"] == 1
+
+
+def test_forwarder_stops_at_first_failure_and_resumes(tmp_path):
+    sp = DiskSpool(tmp_path, batch=1)
+    for i in range(5):
+        sp.append("t", str(i))
+    sent, fail_on = [], {"2"}
+    online = [False]
+
+    def send(topic, payload):
+        if payload.decode() in fail_on:
+            return False
+        sent.append(payload.decode())
+        return True
+
+    fw = SpoolForwarder(sp, send, lambda: online[0], batch=10)
+    assert fw.drain_once() == 0
+    online[0] = True
+    assert fw.drain_once() == 2 and len(sp) == 3
+    fail_on.clear()
+    assert fw.drain_once() == 3
+    assert sent == ["0", "1", "2", "3", "4"] and len(sp) == 0
@@ -0,0 +1,137 @@
+import struct
+
+from capture.native_packet import LINKTYPE_ETHERNET
+from capture.parallel_replay import (
+    ParallelPcapSource, _decode_chunk, merge_chunks, plan_chunks, resolve_chunks,
+)
+from capture.pcap_native import NativePcapPacketSource
+from modbus.frame import ModbusFrame, frame_values
+
+MASTER, SLAVE = bytes((10, 0, 0, 1)), bytes((10, 0, 0, 71))
+
+
+def _eth_tcp(src, dst, sport, dport, seq, payload):
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, seq, 0, 5 << 4, 0x18, 8192, 0, 0)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 40 + len(payload), 0, 0x4000, 64, 6, 0, src, dst)
+    return b"\x00" * 12 + b"\x08\x00" + ip + tcp + payload
+
+
+def _adu(tid, pdu):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, 1) + bytes(pdu)
+
+
+def _polls(n):
+    """n FC3 polls of register 100; every 7th response is split over two segments."""
+    seq = {40000: 1, 502: 1}
+    out = []
+    ts = 1_700_000_000_000_000_000
+
+    def seg(src, dst, sport, dport, data):
+        nonlocal ts
+        ts += 1_000_000
+        out.append((ts, _eth_tcp(src, dst, sport, dport, seq[sport], data)))
+        seq[sport] += len(data)
+
+    for i in range(n):
+        tid = i & 0xFFFF
+        seg(MASTER, SLAVE, 40000, 502, _adu(tid, [0x03, 0x00, 0x64, 0x00, 0x02]))
+        rsp = _adu(tid, [0x03, 0x04, 0x00, i & 0xFF, 0x00, 0x2A])
+        if i % 7 == 0:
+            seg(SLAVE, MASTER, 502, 40000, rsp[:5])
+            seg(SLAVE, MASTER, 502, 40000, rsp[5:])
+        else:
+            seg(SLAVE, MASTER, 502, 40000, rsp)
+    return out
+
+
+def _write_pcap(path, frames):
+    out = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET)
+    for ts_ns, frame in frames:
+        sec, usec = divmod(ts_ns // 1000, 1_000_000)
+        out += struct.pack("<IIII", sec, usec, len(frame), len(frame)) + frame
+    path.write_bytes(out)
+
+
+def _block(btype, body):
+    body += b"\x00" * (-len(body) % 4)
+    return struct.pack("<II", btype, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+
+def _write_pcapng(path, frames):
+    out = _block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    out += _block(1, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, 65535))
+    for ts_ns, frame in frames:
+        ts = ts_ns // 1000
+        out += _block(6, struct.pack("<IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(frame), len(frame)) + frame)
+    path.write_bytes(out)
+
+
+def _key(frame):
+    return frame.ts_ns, frame.fc, frame.is_response, frame.address, frame_values(frame)
+
+
+def _sharded(path, chunks, warmup):
+    kind, section, ranges = plan_chunks(path, chunks, warmup)
+    assert len(ranges) > 1
+    results = [_decode_chunk((path, kind, section, w, s, e, None, None, 502)) for w, s, e in ranges]
+    return list(merge_chunks(resolve_chunks(results)))
+
+
+def test_sharded_pcap_matches_serial(tmp_path):
+    path = str(tmp_path / "big.pcap")
+    _write_pcap(tmp_path / "big.pcap", _polls(400))
+    serial = [_key(f) for f in NativePcapPacketSource(path).frames()]
+    assert len(serial) == 800
+    assert [_key(f) for f in _sharded(path, 8, 2048)] == serial
+
+
+def test_sharded_pcapng_matches_serial(tmp_path):
+    path = str(tmp_path / "big.pcapng")
+    _write_pcapng(tmp_path / "big.pcapng", _polls(400))
+    serial = [_key(f) for f in NativePcapPacketSource(path).frames()]
+    assert [_key(f) for f in _sharded(path, 8, 2048)] == serial
+
+
+def test_response_far_from_its_request_is_correlated(tmp_path):
+    # Non-Modbus traffic between request and response, far beyond the warm-up
+    path = str(tmp_path / "gap.pcap")
+    polls = _polls(3)
+    noise = [(polls[0][0] + i, _eth_tcp(MASTER, SLAVE, 51800, 443, 1 + i * 1000, b"x" * 1000))
+             for i in range(1, 60)]
+    _write_pcap(tmp_path / "gap.pcap", polls[:1] + noise + polls[1:])
+    serial = [_key(f) for f in NativePcapPacketSource(path).frames()]
+    assert serial[1][3] == 100  # the response got its start address
+    assert [_key(f) for f in _sharded(path, 8, 64)] == serial
+
+
+def test_chunk_ranges_are_contiguous(tmp_path):
+    _write_pcap(tmp_path / "c.pcap", _polls(100))
+    _kind, _section, ranges = plan_chunks(str(tmp_path / "c.pcap"), 5, 512)
+    assert ranges[0][:2] == (24, 24)
+    for (_, _, stop), (warm, start, _) in zip(ranges, ranges[1:]):
+        assert stop == start and warm <= start
+
+
+def test_merge_chunks_keeps_packet_order():
+    def f(ts):
+        return ModbusFrame(ts, b"", b"", 0, 0, 0, 0, 3, -1, 0, b"", False)
+    merged = merge_chunks([[f(1), f(5)], [f(3), f(6)], [f(7)]])
+    assert [x.ts_ns for x in merged] == [1, 5, 3, 6, 7]
+
+
+def test_sharded_replay_keeps_backwards_timestamps_in_file_order(tmp_path):
+    path = str(tmp_path / "skew.pcap")
+    polls = _polls(200)
+    # A clock step back half-way through the capture
+    polls = polls[:200] + [(ts - 10_000_000_000, frame) for ts, frame in polls[200:]]
+    _write_pcap(tmp_path / "skew.pcap", polls)
+    serial = [_key(f) for f in NativePcapPacketSource(path).frames()]
+    assert [_key(f) for f in _sharded(path, 8, 2048)] == serial
+
+
+def test_parallel_source_with_process_pool(tmp_path):
+    path = str(tmp_path / "p.pcap")
+    _write_pcap(tmp_path / "p.pcap", _polls(200))
+    serial = [_key(f) for f in NativePcapPacketSource(path).frames()]
+    source = ParallelPcapSource(path, workers=2, chunks_per_worker=4, warmup_bytes=2048)
+    assert [_key(f) for f in source.frames()] == serial
@@ -0,0 +1,154 @@
+import struct
+from pathlib import Path
+
+from capture.native_packet import parse_l2_frame, LINKTYPE_ETHERNET
+from capture.pcap_native import iter_pcap_records, NativePcapPacketSource
+from modbus.frame import frame_values, frame_wall_time, frame_exception, ip_str
+
+SAMPLE = Path(__file__).resolve().parents[1] / "pcaps" / "sample.pcapng"
+
+
+def _eth_tcp(src, dst, sport, dport, payload, vlan=False, seq=1):
+    """Ethernet + IPv4 + TCP frame around payload (checksums left at zero)."""
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, seq, 0, 5 << 4, 0x18, 8192, 0, 0)
+    ip_len = 20 + len(tcp) + len(payload)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, ip_len, 0, 0x4000, 64, 6, 0,
+                     bytes(src), bytes(dst))
+    eth = b"\x00" * 12
+    if vlan:
+        eth += struct.pack(">HH", 0x8100, 7)
+    eth += struct.pack(">H", 0x0800)
+    return eth + ip + tcp + payload + b"\x00" * 4  # trailing padding
+
+
+def _adu(tid, pdu, unit=1):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + bytes(pdu)
+
+
+MASTER, SLAVE = (10, 0, 0, 1), (10, 0, 0, 71)
+
+
+def _conversation():
+    req = _eth_tcp(MASTER, SLAVE, 40000, 502, _adu(7, [0x03, 0x00, 0x64, 0x00, 0x02]))
+    rsp = _eth_tcp(SLAVE, MASTER, 502, 40000, _adu(7, [0x03, 0x04, 0x00, 0x03, 0x00, 0x2A]), vlan=True)
+    return [(1_700_000_000_000_000_000, req), (1_700_000_000_500_000_000, rsp)]
+
+
+def _write_pcap(path, frames):
+    out = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET)
+    for ts_ns, frame in frames:
+        sec, usec = divmod(ts_ns // 1000, 1_000_000)
+        out += struct.pack("<IIII", sec, usec, len(frame), len(frame)) + frame
+    path.write_bytes(out)
+
+
+def _block(btype, body):
+    body += b"\x00" * (-len(body) % 4)
+    blen = len(body) + 12
+    return struct.pack("<II", btype, blen) + body + struct.pack("<I", blen)
+
+
+def _write_pcapng(path, frames):
+    out = _block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    # IDB with if_tsresol = 9 (nanoseconds)
+    opts = struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0)
+    out += _block(1, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, 65535) + opts)
+    for ts_ns, frame in frames:
+        hdr = struct.pack("<IIIII", 0, ts_ns >> 32, ts_ns & 0xFFFFFFFF, len(frame), len(frame))
+        out += _block(6, hdr + frame)
+    path.write_bytes(out)
+
+
+def test_parse_l2_frame_strips_padding_and_vlan():
+    frame = _eth_tcp(MASTER, SLAVE, 40000, 502, b"\x01\x02\x03", vlan=True)
+    src, dst, sport, dport, _seq, payload = parse_l2_frame(LINKTYPE_ETHERNET, frame)
+    assert (src, dst, sport, dport) == (bytes(MASTER), bytes(SLAVE), 40000, 502)
+    assert bytes(payload) == b"\x01\x02\x03"
+
+
+def test_parse_l2_frame_rejects_non_ip():
+    frame = b"\x00" * 12 + b"\x08\x06" + b"\x00" * 28  # ARP
+    assert parse_l2_frame(LINKTYPE_ETHERNET, frame) is None
+
+
+def test_pcap_and_pcapng_records_match(tmp_path):
+    frames = _conversation()
+    _write_pcap(tmp_path / "a.pcap", frames)
+    _write_pcapng(tmp_path / "a.pcapng", frames)
+    a = [(ts, lt, bytes(f)) for ts, lt, f in iter_pcap_records(tmp_path / "a.pcap")]
+    b = [(ts, lt, bytes(f)) for ts, lt, f in iter_pcap_records(tmp_path / "a.pcapng")]
+    assert a == b
+    assert [ts for ts, _, _ in a] == [ts for ts, _ in frames]
+
+
+def test_native_source_pairs_fc3_request_and_response(tmp_path):
+    _write_pcapng(tmp_path / "c.pcapng", _conversation())
+    req, rsp = NativePcapPacketSource(str(tmp_path / "c.pcapng")).frames()
+    assert (req.fc, req.is_response, req.address, req.quantity) == (3, False, 100, 2)
+    assert (rsp.fc, rsp.is_response, rsp.address, rsp.quantity) == (3, True, 100, 2)
+    assert (ip_str(rsp.src), ip_str(rsp.dst)) == ("10.0.0.71", "10.0.0.1")
+    assert (rsp.unit, rsp.tid) == (1, 7)
+    assert frame_values(rsp) == {100: 3, 101: 42}
+    assert frame_wall_time(rsp) == "2023-11-14T22:13:20.500Z"
+
+
+def test_native_source_src_filter(tmp_path):
+    _write_pcap(tmp_path / "c.pcap", _conversation())
+    frames = list(NativePcapPacketSource(str(tmp_path / "c.pcap"), src="10.0.0.71").frames())
+    assert len(frames) == 1 and ip_str(frames[0].src) == "10.0.0.71"
+
+
+def test_native_source_on_sample_capture():
+    frames = list(NativePcapPacketSource(str(SAMPLE)).frames())
+    fcs = {f.fc for f in frames}
+    assert {3, 5} <= fcs
+    regs = {}
+    for f in frames:
+        if f.fc == 3:
+            regs.update(frame_values(f))
+    assert 100 in regs
+    fc5 = next(f for f in frames if f.fc == 5)
+    assert frame_values(fc5) == {500: 1}
+
+
+def test_native_source_splits_pipelined_requests(tmp_path):
+    two = _adu(1, [0x03, 0x00, 0x64, 0x00, 0x01]) + _adu(2, [0x05, 0x01, 0xF4, 0xFF, 0x00])
+    _write_pcap(tmp_path / "p.pcap", [(0, _eth_tcp(MASTER, SLAVE, 40000, 502, two))])
+    frames = list(NativePcapPacketSource(str(tmp_path / "p.pcap")).frames())
+    assert [f.fc for f in frames] == [3, 5]
+    assert [f.tid for f in frames] == [1, 2]
+    assert frame_values(frames[1]) == {500: 1}
+
+
+def test_native_source_decodes_other_function_codes(tmp_path):
+    seq = {502: 1, 40000: 1}
+
+    def segment(src, dst, sport, dport, adu):
+        frame = _eth_tcp(src, dst, sport, dport, adu, seq=seq[sport])
+        seq[sport] += len(adu)
+        return frame
+
+    def req(tid, pdu):
+        return segment(MASTER, SLAVE, 40000, 502, _adu(tid, pdu))
+
+    def rsp(tid, pdu):
+        return segment(SLAVE, MASTER, 502, 40000, _adu(tid, pdu))
+
+    conv = [
+        req(1, [0x01, 0x00, 0x0A, 0x00, 0x03]),                       # read 3 coils @10
+        rsp(1, [0x01, 0x01, 0b110]),
+        req(2, [0x10, 0x00, 0xC8, 0x00, 0x02, 0x04, 0, 5, 0, 6]),     # write 200..201
+        req(3, [0x06, 0x00, 0x64, 0x00, 0x03]),                       # write 100=3
+        req(4, [0x17, 0, 50, 0, 1, 0, 60, 0, 1, 2, 0, 9]),            # read 50, write 60=9
+        rsp(4, [0x17, 0x02, 0x00, 0x2A]),
+        req(5, [0x02, 0x00, 0x00, 0x00, 0x01]),
+        rsp(5, [0x82, 0x02]),                                         # illegal data address
+    ]
+    _write_pcap(tmp_path / "x.pcap", [(i * 1000, f) for i, f in enumerate(conv)])
+    frames = list(NativePcapPacketSource(str(tmp_path / "x.pcap")).frames())
+    values = [frame_values(f) for f in frames]
+    assert values[1] == {10: 0, 11: 1, 12: 1}
+    assert values[2] == {200: 5, 201: 6}
+    assert values[3] == {100: 3}
+    assert values[4] == {60: 9} and values[5] == {50: 42}
+    assert frame_exception(frames[7]) == (2, 2) and values[7] == {}
@@ -0,0 +1,30 @@
+import types
+from modbus.pdu import payload_bytes, pdu_from_adu, get_modbus_pdu_bytes, decode_registers, unpack_bits_from_bytes
+
+ADU = bytes([0x00,0x01, 0x00,0x00, 0x00,0x06, 0x01, 0x03, 0x00,0x64, 0x00,0x02])
+
+def test_payload_bytes_accepts_hex_and_bytes():
+    assert payload_bytes(ADU.hex(":")) == ADU
+    assert payload_bytes(ADU.hex(":").upper()) == ADU
+    assert payload_bytes(ADU) is ADU
+
+def test_pdu_from_adu_cuts_pipelined_adu():
+    two = ADU + ADU
+    assert bytes(pdu_from_adu(two)) == ADU[7:]
+    assert bytes(pdu_from_adu(ADU)) == ADU[7:]
+
+def test_get_modbus_pdu_bytes_is_zero_copy_view():
+    pkt = types.SimpleNamespace(tcp=types.SimpleNamespace(payload=ADU))
+    pdu = get_modbus_pdu_bytes(pkt)
+    assert isinstance(pdu, memoryview) and pdu.obj is ADU
+    assert pdu[0] == 0x03
+
+def test_decode_registers_big_endian_block():
+    regs = decode_registers(bytes([0x02, 0x12, 0x34, 0xFF, 0xFE, 0x00]), offset=1, count=2)
+    assert list(regs) == [0x1234, 0xFFFE]
+
+
+def test_unpack_bits_from_bytes_table():
+    assert unpack_bits_from_bytes(b"\x05\x80", 16) == [1, 0, 1, 0, 0, 0, 0, 0] + [0] * 7 + [1]
+    assert unpack_bits_from_bytes([0xFF, 0xFF], 3) == [1, 1, 1]
+    assert unpack_bits_from_bytes(memoryview(b"\x01"), 10) == [1, 0, 0, 0, 0, 0, 0, 0]
@@ -0,0 +1,214 @@
+import struct
+
+from modbus.frame import ModbusFrame, pack_ip
+from pipeline.core import Pipeline
+from pipeline.packet_handler import build_rules_pipeline
+from modbus.tags import TagMap
+from pipeline.stages import (
+    ConsoleStage, DecodeStage, MqttStage, SessionLogStage, StateStage, TagStage, TriggerStage,
+)
+
+TS = 1_769_185_481_137_000_000
+
+
+def _frame(fc, pdu, address=-1, quantity=0, is_response=True, values=None, ts=TS):
+    return ModbusFrame(ts, pack_ip("10.0.0.71"), pack_ip("10.0.0.1"), 502, 40000, 1, 0, fc,
+                       address, quantity, memoryview(bytes(pdu)), is_response, values)
+
+
+def _fc3(*regs, address=100, ms=0):
+    pdu = bytes([3, 2 * len(regs)]) + struct.pack(f">{len(regs)}H", *regs)
+    return _frame(3, pdu, address=address, quantity=len(regs), ts=TS + ms * 1_000_000)
+
+
+def _watch_pipeline(watch, fc=3, deltas_only=False, extra=()):
+    lines = []
+    state = StateStage(watch, deltas_only=deltas_only)
+    stages = [DecodeStage(fc=fc), state, *extra, ConsoleStage(lines.append)]
+    return Pipeline(stages), state, lines
+
+
+def test_console_prints_watched_registers():
+    pipe, _state, lines = _watch_pipeline({100})
+    pipe.process(_fc3(5, 9))
+    assert lines == ["[2026-01-23T16:24:41.137Z] [10.0.0.71->10.0.0.1] FC=3 100=5"]
+
+
+def test_deltas_only_and_fc_gate():
+    pipe, state, lines = _watch_pipeline({100}, deltas_only=True)
+    for v in (5, 5, 6):
+        pipe.process(_fc3(v))
+    pipe.process(_frame(5, [0x05, 0x00, 0x64, 0xFF, 0x00], is_response=False))  # not --fc 3
+    assert [ln.rsplit(" ", 1)[1] for ln in lines] == ["100=5", "100=6"]
+    assert len(state.images) == 1
+    assert state.images.device(pack_ip("10.0.0.71"), 1).holding.get(100) == 6
+    st = pipe.stats()
+    assert st["decode"]["frames"] == 4 and st["console"]["frames"] == 3
+
+
+def test_deltas_are_tracked_per_device():
+    pipe, _state, lines = _watch_pipeline({100}, deltas_only=True)
+    other = pack_ip("10.0.0.72")
+    for v in (5, 6):
+        pipe.process(_fc3(v))
+        pipe.process(_fc3(v)._replace(src=other))
+    assert [ln.split("] ", 1)[1] for ln in lines] == [
+        "[10.0.0.71->10.0.0.1] FC=3 100=5", "[10.0.0.72->10.0.0.1] FC=3 100=5",
+        "[10.0.0.71->10.0.0.1] FC=3 100=6", "[10.0.0.72->10.0.0.1] FC=3 100=6",
+    ]
+
+
+def test_unchanged_block_is_skipped_unless_an_overlapping_block_changed_it():
+    pipe, _state, lines = _watch_pipeline({101}, deltas_only=True)
+    pipe.process(_fc3(1, 1))                  # 100..101
+    pipe.process(_fc3(1, 1))                  # identical payload: fast path
+    pipe.process(_fc3(2, 3, address=101))     # 101..102 changes 101
+    pipe.process(_fc3(1, 1))                  # same bytes as before, but 101 moved back
+    assert [ln.rsplit(" ", 1)[1] for ln in lines] == ["101=1", "101=2", "101=1"]
+
+
+def test_tag_values_are_printed_on_change():
+    tags = TagMap([{"name": "level", "address": 100, "type": "uint32", "scale": 0.5}])
+    lines = []
+    pipe = Pipeline([DecodeStage(fc=3), TagStage(tags, deltas_only=True),
+                     StateStage(set(), deltas_only=True), ConsoleStage(lines.append)])
+    for hi, lo in ((0, 10), (0, 10), (1, 0)):
+        pipe.process(_fc3(hi, lo))
+    assert [ln.split("FC=3 ", 1)[1] for ln in lines] == ["TAGS level=5", "TAGS level=32768"]
+
+
+def test_exception_frames_are_printed_when_watched():
+    pipe, _state, lines = _watch_pipeline({100}, fc=None)
+    pipe.process(_frame(0x83, [0x83, 0x02]))
+    assert lines and lines[0].endswith("FC=131 EXCEPTION fc=3 code=2 (ILLEGAL DATA ADDRESS)")
+
+
+def test_trigger_emits_on_change_and_mqtt_publishes():
+    published = []
+    state = StateStage({100})
+    trigger = TriggerStage(state, 100, lambda ctx, reg, val, context: {"reg": reg, "value": val, **context},
+                           include_regs=[101])
+    mqtt = MqttStage(lambda p: published.append(p) or True)
+    pipe = Pipeline([DecodeStage(fc=3), state, trigger, mqtt])
+    for v in (1, 1, 2, 3):
+        pipe.process(_fc3(v, 40 + v))
+    assert published == [{"reg": 100, "value": 2, "101": 42}, {"reg": 100, "value": 3, "101": 43}]
+    assert mqtt.published == 2
+
+
+def test_trigger_once():
+    state = StateStage({100})
+    out = []
+    pipe = Pipeline([DecodeStage(), state,
+                     TriggerStage(state, 100, lambda *a: a[2], once=True), MqttStage(out.append)])
+    for v in (1, 2, 3):
+        pipe.process(_fc3(v))
+    assert out == [2]
+
+
+def _throttled(**kw):
+    state = StateStage({100})
+    out, late = [], []
+    trigger = TriggerStage(state, 100, lambda ctx, reg, val, context: (val, ctx.frame.ts_ns // 1_000_000 % 100_000),
+                           release=late.append, **kw)
+    pipe = Pipeline([DecodeStage(), state, trigger, MqttStage(out.append)])
+    return pipe, trigger, out, late
+
+
+def test_trigger_debounce_publishes_the_settled_value_once():
+    pipe, trigger, out, late = _throttled(debounce_ms=50)
+    base = TS // 1_000_000 % 100_000
+    for ms, v in [(0, 1), (10, 2), (20, 1), (30, 2), (40, 3), (60, 3), (89, 3), (95, 3)]:
+        pipe.process(_fc3(v, ms=ms))
+    # 2 (held) -> back to 1 (dropped) -> 2 -> 3 held at 40 ms, released by the 95 ms frame
+    assert out == [(3, base + 40)]
+    assert trigger.stats() == {"published": 1, "suppressed_debounce": 2, "suppressed_deadband": 0,
+                               "suppressed_rate": 0}
+    pipe.process(_fc3(7, ms=100))
+    pipe.close()                     # no frame closes the window: released at close
+    assert late == [(7, base + 100)] and trigger.stats()["published"] == 2
+
+
+def test_trigger_deadband_is_relative_to_the_last_published_value():
+    pipe, trigger, out, _late = _throttled(deadband=5)
+    for ms, v in enumerate([100, 103, 97, 105, 108, 111, 95]):
+        pipe.process(_fc3(v, ms=ms))
+    assert [v for v, _ms in out] == [105, 111, 95]
+    assert trigger.stats()["suppressed_deadband"] == 3
+
+
+def test_trigger_rate_limit_holds_the_latest_value_for_the_next_token():
+    pipe, trigger, out, late = _throttled(max_rate=10, burst=2)   # one token per 100 ms
+    for ms, v in enumerate([0, 1, 2, 3, 4, 5]):
+        pipe.process(_fc3(v, ms=ms * 10))
+    # 1 and 2 use the burst, 3 is held then replaced by 4 and 5
+    assert [v for v, _ms in out] == [1, 2]
+    pipe.process(_fc3(5, ms=80))
+    assert len(out) == 2             # next token at ~120 ms
+    pipe.process(_fc3(5, ms=130))
+    assert [v for v, _ms in out] == [1, 2, 5]
+    assert trigger.stats()["suppressed_rate"] == 2
+    pipe.close()
+    assert late == []
+
+
+def test_trigger_rate_held_release_spends_its_token():
+    pipe, _trigger, out, _late = _throttled(max_rate=1, burst=1)   # one token per second
+    sent_at = []                     # capture time of the frame each publish went out with
+    for ms, v in [(0, 0), (0, 1), (10, 2), (1001, 3), (1002, 4), (2001, 4), (2002, 4)]:
+        before = len(out)
+        pipe.process(_fc3(v, ms=ms))
+        sent_at += [ms] * (len(out) - before)
+    # 2 is held for the token due at ~1000 ms and released by the 1001 ms frame;
+    # 3 and 4 right after it must wait for the following token
+    assert [v for v, _ms in out] == [1, 2, 4]
+    assert sent_at == [0, 1001, 2002]
+
+
+def test_session_log_start_all_traffic_stop(tmp_path):
+    session = SessionLogStage(tmp_path, start_reg=100, start_val=3, stop_val=4)
+    pipe = Pipeline([DecodeStage(fc=3), session])
+    pipe.process(_fc3(1))
+    pipe.process(_fc3(3, 7))
+    pipe.process(_frame(5, [0x05, 0x00, 0x0A, 0xFF, 0x00], is_response=False))
+    pipe.process(_fc3(4))
+    pipe.process(_fc3(1))
+    pipe.close()
+    files = list(tmp_path.glob("*.txt"))
+    assert len(files) == 1
+    text = files[0].read_text(encoding="utf-8")
+    assert "FC=3 100=3, 101=7" in text and "FC=5 10=1" in text
+    assert "100=1" not in text and "100=4" not in text  # the stop frame closes the file first
+    assert not session.active
+
+
+def test_rules_pipeline_publishes_config_matches():
+    published = []
+    pipe = build_rules_pipeline(watch_registers={100: {"eq": 3}}, watch_coils={},
+                                publish=published.append)
+    pipe.process(_fc3(2))
+    pipe.process(_fc3(3))
+    pipe.process(_frame(0x83, [0x83, 0x04]))
+    assert published == [
+        {"type": "register", "ip": "10.0.0.71", "unit": 1, "matches": [{"register": 100, "value": 3}]},
+        {"type": "exception", "ip": "10.0.0.71", "unit": 1, "fc": 3, "code": 4},
+    ]
+
+
+def test_pipeline_run_over_a_source_and_close():
+    class Source:
+        closed = 0
+
+        def frames(self):
+            return iter([_fc3(1), _fc3(2)])
+
+        def close(self):
+            self.closed += 1
+
+    src = Source()
+    pipe, _state, lines = _watch_pipeline({100})
+    pipe.source = src
+    assert pipe.run() == 2 and len(lines) == 2
+    pipe.close()
+    pipe.close()                     # e.g. SIGINT handler, then the CLI's finally
+    assert src.closed == 1
@@ -0,0 +1,78 @@
+import struct
+
+from modbus.reassembly import AduReassembler
+
+KEY = (b"\x0a\x00\x00\x01", 40000, b"\x0a\x00\x00\x47", 502)
+
+
+def _adu(tid, pdu, unit=1):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + bytes(pdu)
+
+
+REQ1 = _adu(1, [0x03, 0x00, 0x64, 0x00, 0x02])
+REQ2 = _adu(2, [0x03, 0x00, 0xC8, 0x00, 0x0B])
+RSP = _adu(1, [0x03, 0x14] + [0x00, 0x07] * 10)
+
+
+def test_single_adu_passes_through():
+    r = AduReassembler()
+    out = r.feed(KEY, REQ1, seq=100)
+    assert [bytes(a) for a in out] == [REQ1]
+
+
+def test_coalesced_adus_are_split():
+    r = AduReassembler()
+    out = r.feed(KEY, REQ1 + REQ2, seq=100)
+    assert [bytes(a) for a in out] == [REQ1, REQ2]
+    assert r.adus == 2
+
+
+def test_split_adu_is_joined():
+    r = AduReassembler()
+    assert r.feed(KEY, RSP[:10], seq=100) == []
+    out = r.feed(KEY, RSP[10:] + REQ1[:3], seq=110)
+    assert [bytes(a) for a in out] == [RSP]
+    out = r.feed(KEY, REQ1[3:], seq=110 + len(RSP) - 10 + 3)
+    assert [bytes(a) for a in out] == [REQ1]
+
+
+def test_garbage_prefix_resyncs():
+    r = AduReassembler()
+    out = r.feed(KEY, b"\xde\xad\xbe\xef\xff\xff\xff\xff" + REQ1)
+    assert [bytes(a) for a in out] == [REQ1]
+    assert r.resyncs == 1
+
+
+def test_sequence_gap_drops_partial_adu():
+    r = AduReassembler()
+    r.feed(KEY, RSP[:10], seq=100)
+    out = r.feed(KEY, REQ1, seq=500)  # segment(s) lost in between
+    assert [bytes(a) for a in out] == [REQ1]
+    assert r.gaps == 1 and r.resyncs == 1
+
+
+def test_retransmission_is_ignored():
+    r = AduReassembler()
+    r.feed(KEY, REQ1, seq=100)
+    assert r.feed(KEY, REQ1, seq=100) == []
+    assert r.retransmits == 1
+
+
+def test_idle_flows_are_evicted_and_flow_count_bounded():
+    r = AduReassembler(max_flows=2, idle_timeout=1.0)
+    r.feed(("a", 1, "b", 502), REQ1[:3], ts_ns=0)
+    r.feed(("c", 1, "b", 502), REQ1[:3], ts_ns=0)
+    r.feed(("d", 1, "b", 502), REQ1[:3], ts_ns=0)
+    assert r.stats()["flows"] == 2 and r.evicted == 1
+    r.feed(("e", 1, "b", 502), REQ1, ts_ns=5_000_000_000)
+    assert r.stats()["flows"] == 1 and r.evicted == 3
+
+
+def test_buffer_is_bounded():
+    r = AduReassembler(max_buffer=16)
+    # Valid header announcing a 250-byte body that never fully arrives
+    hdr = struct.pack(">HHHB", 1, 0, 250, 1)
+    r.feed(KEY, hdr + b"\x00" * 20, seq=0)
+    assert r.overflows == 1
+    out = r.feed(KEY, REQ1, seq=27)
+    assert [bytes(a) for a in out] == [REQ1]
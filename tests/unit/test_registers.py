@@ -26,3 +26,9 @@ def test_check_register_rules_eq_match():
     rules = {100: {"eq": 3}, 101: {"eq": 8}}
     matches = check_register_rules(regs, rules)
     assert matches == [{"register": 100, "value": 3}]
+
+def test_parse_register_map_uses_native_block():
+    from modbus.registers import decode_read_response
+    pdu = bytes([0x03, 0x04, 0x00, 0x03, 0x01, 0x00])
+    m = types.SimpleNamespace(register_block=decode_read_response(pdu, 100, 2))
+    assert parse_register_map(m, fc=3) == {100: 3, 101: 256}
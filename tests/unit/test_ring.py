@@ -0,0 +1,136 @@
+import struct
+import threading
+
+import pytest
+
+from capture.native_packet import LINKTYPE_ETHERNET, NativeModbusDecoder
+from capture.ring import FrameRing, ThreadedCaptureSource
+from modbus.frame import frame_values
+
+MASTER, SLAVE = bytes((10, 0, 0, 1)), bytes((10, 0, 0, 71))
+
+
+def _eth_tcp(src, dst, sport, dport, seq, payload):
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, seq, 0, 5 << 4, 0x18, 8192, 0, 0)
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 40 + len(payload), 0, 0x4000, 64, 6, 0, src, dst)
+    return b"\x00" * 12 + b"\x08\x00" + ip + tcp + payload
+
+
+def _adu(tid, pdu):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, 1) + bytes(pdu)
+
+
+def _polls(n):
+    out = []
+    seq = {40000: 1, 502: 1}
+    ts = 1_700_000_000_000_000_000
+    for i in range(n):
+        for src, dst, sport, dport, pdu in (
+            (MASTER, SLAVE, 40000, 502, [0x03, 0x00, 0x64, 0x00, 0x01]),
+            (SLAVE, MASTER, 502, 40000, [0x03, 0x02, 0x00, i & 0xFF]),
+        ):
+            adu = _adu(i, pdu)
+            ts += 1_000_000
+            out.append((ts, _eth_tcp(src, dst, sport, dport, seq[sport], adu)))
+            seq[sport] += len(adu)
+    return out
+
+
+class _RawSource:
+    """Stands in for AfPacketSource: raw_frames()/stop()/close()/stats()."""
+
+    def __init__(self, frames, gate=None):
+        self._frames = frames
+        self._gate = gate
+        self.closed = False
+
+    def raw_frames(self):
+        yield from self._frames
+        if self._gate is not None:
+            self._gate.set()
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def stats(self):
+        return {"received": len(self._frames), "processed": 0, "kernel_packets": 7, "kernel_drops": 0}
+
+
+def test_ring_push_drain_in_order():
+    ring = FrameRing(slots=4, slot_size=16)
+    for i in range(3):
+        assert ring.push(i, bytes([i]) * (i + 1))
+    assert len(ring) == 3
+    assert ring.drain(2) == [(0, b"\x00"), (1, b"\x01\x01")]
+    assert ring.push(3, b"abc") and ring.push(4, b"de")  # wraps around
+    assert ring.drain() == [(2, b"\x02" * 3), (3, b"abc"), (4, b"de")]
+    assert ring.drain() == []
+    assert ring.pushed == ring.drained == 5
+
+
+def test_ring_drops_when_full_and_truncates_oversize():
+    ring = FrameRing(slots=2, slot_size=4)
+    assert ring.push(1, b"123456")
+    assert ring.push(2, b"ab")
+    assert not ring.push(3, b"cd")
+    assert ring.dropped == 1 and ring.truncated == 1 and ring.high_water == 2
+    assert ring.drain() == [(1, b"1234"), (2, b"ab")]
+
+
+def test_ring_rejects_bad_sizes():
+    with pytest.raises(ValueError):
+        FrameRing(slots=0)
+
+
+def test_close_mid_stream_keeps_accounting():
+    src = ThreadedCaptureSource(_RawSource(_polls(50)), slots=16, batch=8)
+    for _frame in src.frames():
+        break
+    src.close()
+    st = src.stats()
+    assert st["received"] == st["drained"] + st["ring_dropped"] + st["ring_depth"]
+    assert st["kernel_packets"] == 7
+    assert src.raw_source.closed
+
+
+def test_threaded_source_lossless_when_consumer_keeps_up():
+    raw = _polls(20)
+    decoder = NativeModbusDecoder()
+    expected = [frame_values(f) for ts, b in raw for f in decoder.decode(ts, LINKTYPE_ETHERNET, b)]
+
+    src = ThreadedCaptureSource(_RawSource(raw), slots=len(raw))
+    got = [frame_values(f) for f in src.frames()]
+    st = src.stats()
+    assert got == expected
+    assert st["received"] == st["drained"] == len(raw)
+    assert st["ring_dropped"] == 0 and st["processed"] == len(expected)
+
+
+def test_stalled_consumer_drops_are_counted_exactly():
+    raw = _polls(30)
+    done = threading.Event()
+    src = ThreadedCaptureSource(_RawSource(raw, gate=done), slots=8, batch=4)
+    it = src.frames()
+    first = next(it)  # capture thread now running; consumer stalls here
+    assert done.wait(2)
+    rest = list(it)
+    st = src.stats()
+    assert first.tid == 0
+    assert st["received"] == len(raw)
+    assert st["ring_dropped"] > 0
+    assert st["received"] == st["drained"] + st["ring_dropped"]
+    assert st["processed"] == 1 + len(rest)
+
+
+def test_capture_thread_errors_reach_consumer():
+    class _Broken(_RawSource):
+        def raw_frames(self):
+            raise PermissionError("no CAP_NET_RAW")
+            yield
+
+    src = ThreadedCaptureSource(_Broken([]))
+    with pytest.raises(PermissionError):
+        list(src.frames())
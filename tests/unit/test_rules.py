@@ -0,0 +1,137 @@
+import pytest
+
+from modbus.bitmap import CoilBitmap
+from modbus.coils import check_coil_rules
+from modbus.frame import pack_ip
+from modbus.registers import check_register_rules
+from modbus.rules import Rule, compile_rules
+
+PLC1, PLC2 = pack_ip("10.0.0.71"), pack_ip("10.0.0.72")
+
+
+def test_two_rules_on_one_register():
+    rs = compile_rules([
+        {"register": 100, "eq": 3, "name": "start"},
+        {"register": 100, "eq": 4, "name": "stop"},
+    ])
+    assert rs.match_registers({100: 3, 101: 0}) == [{"register": 100, "value": 3, "rule": "start"}]
+    assert rs.match_registers({100: 4}) == [{"register": 100, "value": 4, "rule": "stop"}]
+    assert rs.match_registers({100: 5}) == []
+
+
+@pytest.mark.parametrize("spec,hits,misses", [
+    ({"ne": 0}, [1, 7], [0]),
+    ({"in": [2, 4]}, [2, 4], [3]),
+    ({"range": [10, 20]}, [10, 15, 20], [9, 21]),
+    ({"bitmask": 0x0C}, [0x04, 0x0F], [0x03]),
+    ({"bitmask": [0x0C, 0x04]}, [0x04, 0x05], [0x0C, 0x08]),
+    ({"eq": 5, "ne": 6}, [5], [6, 4]),
+])
+def test_stateless_predicates(spec, hits, misses):
+    rule = Rule(dict(spec, register=1))
+    assert all(rule.test(v) for v in hits)
+    assert not any(rule.test(v) for v in misses)
+
+
+def test_edges_and_change_use_previous_value_per_device():
+    rs = compile_rules([
+        {"register": 7, "rising": 10, "name": "up"},
+        {"register": 7, "falling": 5, "name": "down"},
+        {"register": 7, "changed": True, "name": "chg"},
+    ])
+
+    def names(dev, v):
+        return [m["rule"] for m in rs.match_registers({7: v}, dev)]
+
+    assert names(PLC1, 12) == []          # first observation never fires
+    assert names(PLC2, 3) == []           # separate history per device
+    assert names(PLC1, 4) == ["down", "chg"]
+    assert names(PLC1, 4) == []
+    assert names(PLC1, 10) == ["up", "chg"]
+    assert names(PLC2, 11) == ["up", "chg"]
+
+
+def test_rate_of_change_per_second():
+    rs = compile_rules([{"register": 9, "rate": 50}])
+    s = 1_000_000_000
+    assert rs.match_registers({9: 0}, PLC1, 0) == []
+    assert rs.match_registers({9: 40}, PLC1, 1 * s) == []       # 40/s
+    assert rs.match_registers({9: 100}, PLC1, 2 * s) == [{"register": 9, "value": 100}]  # 60/s
+
+
+def test_device_specific_and_wildcard_rules():
+    rs = compile_rules([
+        {"register": 1, "eq": 1, "device": "10.0.0.71", "name": "plc1"},
+        {"register": 1, "eq": 1, "name": "any"},
+    ])
+    assert [m["rule"] for m in rs.match_registers({1: 1}, PLC1)] == ["plc1", "any"]
+    assert [m["rule"] for m in rs.match_registers({1: 1}, PLC2)] == ["any"]
+    assert [m["rule"] for m in rs.match_registers({1: 1})] == ["any"]
+    assert rs.devices() == ["10.0.0.71"]
+
+
+def test_coil_rules_on_bitmap_only_visit_covered_addresses():
+    rs = compile_rules(coils=[{"coil": a, "eq": 1} for a in range(0, 100000, 10)] +
+                       [{"coil": 13, "rising": 1}])
+    bm = CoilBitmap(10, 8, bytes([0b00001001]))  # coils 10 and 13 set
+    assert rs.match_coils(bm, PLC1) == [{"coil": 10, "value": 1}]
+    assert rs.match_coils(CoilBitmap(10, 8, bytes([0])), PLC1) == []
+    assert rs.match_coils(bm, PLC1) == [{"coil": 10, "value": 1}, {"coil": 13, "value": 1}]
+
+
+def test_many_devices_and_rules():
+    rules = [{"register": a, "eq": d, "device": f"10.1.{d}.1"} for d in range(200) for a in range(0, 20000, 100)]
+    rs = compile_rules(rules)
+    assert len(rs) == 40000
+    regs = {a: 42 for a in range(0, 125)}
+    assert rs.match_registers(regs, pack_ip("10.1.42.1")) == [
+        {"register": 0, "value": 42}, {"register": 100, "value": 42},
+    ]
+
+
+def test_legacy_forms_still_work():
+    assert check_register_rules({100: 3}, {100: {"eq": 3}}) == [{"register": 100, "value": 3}]
+    assert check_register_rules({100: 3}, [{"register": 100, "in": [3, 4]}]) == [{"register": 100, "value": 3}]
+    assert check_coil_rules({5: 1}, [{"coil": 5, "eq": 1}]) == [{"coil": 5, "value": 1}]
+    rs = compile_rules(registers={100: {"eq": 3}}, coils={5: 1})
+    assert check_coil_rules(CoilBitmap(5, 1, b"\x01"), rs) == [{"coil": 5, "value": 1}]
+
+
+def test_bad_rules_are_rejected():
+    with pytest.raises(ValueError):
+        Rule({"eq": 1})
+    with pytest.raises(ValueError):
+        Rule({"register": 1})
+    with pytest.raises(ValueError):
+        Rule({"register": 1, "approx": 3})
+    with pytest.raises(ValueError):
+        Rule({"register": 1, "eq": 1, "device": "plc-1"})
+
+
+def test_stateful_rules_can_read_previous_values_from_an_image():
+    from modbus.image import RegisterImage
+    rules = compile_rules([{"register": 7, "rising": 10}], [])
+    image = RegisterImage()
+    image.update(7, [5], ts_ns=0)
+    assert rules.match_registers({7: 12}, ts_ns=1, prev=image.last) == [{"register": 7, "value": 12}]
+    assert rules._prev == {}
+    image.update(7, [12], ts_ns=1)
+    assert rules.match_registers({7: 15}, ts_ns=2, prev=image.last) == []
+
+
+def test_rate_uses_the_registers_own_time_not_its_image_block():
+    from modbus.image import RegisterImage
+    rules = compile_rules([{"register": 5, "rate": 15}], [])
+    image = RegisterImage()
+    s = 1_000_000_000
+
+    def poll(start, values, ts_ns):
+        regs = {start + i: v for i, v in enumerate(values)}
+        hits = rules.match_registers(regs, PLC1, ts_ns, prev=image.last)
+        image.update(start, values, ts_ns)
+        return hits
+
+    assert poll(0, [0] * 10, 0) == []
+    assert poll(10, [0] * 10, s * 9 // 10) == []        # same image block, polled later
+    assert poll(0, [0] * 5 + [10] + [0] * 4, s) == []   # 10 in 1 s: 10/s, not 100/s
+    assert poll(0, [0] * 5 + [30] + [0] * 4, 2 * s) == [{"register": 5, "value": 30}]   # 20/s
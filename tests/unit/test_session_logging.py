@@ -11,6 +11,14 @@ SRC_DIR = REPO_ROOT / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 MODULE_PATH = "cli.modbus_watch"
+# The pyshark -> ModbusFrame adapter binds the modbus helpers at import, so it
+# is re-imported together with the CLI to pick up the fakes below.
+ADAPTER_PATH = "capture.pyshark_frames"
+
+import modbus.frame  # noqa: E402,F401  (real modules, imported before any fakes)
+import capture.pyshark_frames  # noqa: E402,F401
+import pipeline.sources  # noqa: E402,F401
+import pipeline.stages  # noqa: E402,F401
 
 
 class FakePkt:
@@ -94,6 +102,7 @@ def _import_under_test(monkeypatch):
     # Ensure a clean import (module reload), in case prior tests imported it
     if MODULE_PATH in sys.modules:
         del sys.modules[MODULE_PATH]
+    monkeypatch.delitem(sys.modules, ADAPTER_PATH, raising=False)
     mod = __import__(MODULE_PATH, fromlist=["*"])
     return mod
 
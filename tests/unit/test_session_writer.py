@@ -0,0 +1,94 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from pipeline import session_writer
+from pipeline.session_writer import SessionWriter
+
+NL = os.linesep
+
+
+def _lines(n, width=20):
+    return [f"line {i:06d} ".ljust(width, "x") for i in range(n)]
+
+
+def _read(paths, opener=open):
+    out = []
+    for p in paths:
+        with opener(p, "rb") as f:
+            out.append(f.read().decode("utf-8"))
+    return "".join(out)
+
+
+def test_background_writer_flushes_on_time_and_on_close(tmp_path):
+    w = SessionWriter(tmp_path, "s", flush_ms=20)
+    w.write("first")
+    deadline = time.monotonic() + 5
+    while w.path.read_bytes() == b"" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert w.path.read_bytes() == f"first{NL}".encode()
+    for line in _lines(1000):
+        w.write(line)
+    w.close()
+    w.close()
+    assert w.path.name == "s.txt"
+    assert w.path.read_text(encoding="utf-8").splitlines() == ["first"] + _lines(1000)
+    assert w.stats() == {"lines": 1001, "bytes": len(w.path.read_bytes()), "parts": 1,
+                         "dropped": 0, "errors": 0}
+
+
+def test_zero_flush_interval_does_not_spin(tmp_path):
+    w = SessionWriter(tmp_path, "s", flush_ms=0)
+    try:
+        assert w.flush_s == 0.001
+        cpu = time.process_time()
+        time.sleep(0.3)
+        assert time.process_time() - cpu < 0.15     # a spinning writer burns ~0.3 s here
+        w.write("x")
+    finally:
+        w.close()
+    assert w.path.read_text(encoding="utf-8") == f"x{NL}"
+
+
+def test_size_rotation_cuts_at_line_boundaries(tmp_path):
+    lines = _lines(100)
+    line_bytes = len(lines[0]) + len(NL)
+    w = SessionWriter(tmp_path, "s", rotate_bytes=10 * line_bytes, background=False, flush_bytes=1 << 30)
+    for line in lines:
+        w.write(line)
+    w.close()
+    assert [p.name for p in w.paths[:3]] == ["s.txt", "s.001.txt", "s.002.txt"]
+    assert len(w.paths) == 10
+    assert all(p.stat().st_size == 10 * line_bytes for p in w.paths)
+    assert _read(w.paths).splitlines() == lines
+
+
+def test_time_rotation_and_gzip(tmp_path):
+    now = [0.0]
+    w = SessionWriter(tmp_path, "s", rotate_s=60, compress="gzip", background=False, flush_bytes=1,
+                      clock=lambda: now[0])
+    w.write("a")
+    w.write("b")
+    now[0] = 61.0
+    w.write("c")
+    w.close()
+    assert [p.name for p in w.paths] == ["s.txt.gz", "s.001.txt.gz"]
+    assert _read(w.paths, gzip.open).splitlines() == ["a", "b", "c"]
+
+
+def test_lines_beyond_the_buffer_cap_are_dropped_and_counted(tmp_path):
+    w = SessionWriter(tmp_path, "s", max_buffer_bytes=50, flush_bytes=1 << 30, background=False)
+    for line in _lines(10):
+        w.write(line)
+    w.close()
+    assert w.stats()["lines"] + w.stats()["dropped"] == 10 and w.stats()["dropped"] > 0
+
+
+def test_bad_compression_is_rejected(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        SessionWriter(tmp_path, "s", compress="lz4")
+    monkeypatch.setattr(session_writer, "zstandard", None)
+    with pytest.raises(RuntimeError):
+        SessionWriter(tmp_path, "s", compress="zstd")
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pipeline.staged import Stage, StagedPipeline, StageQueue, run_staged
+
+
+def test_stages_chain_in_order_and_filter():
+    seen = []
+    stats = run_staged(range(10), [
+        Stage("double", lambda x: x * 2),
+        Stage("odd_out", lambda x: x if x % 4 else None),
+        Stage("sink", seen.append),
+    ])
+    assert seen == [2, 6, 10, 14, 18]
+    assert stats["source"]["pulled"] == 10
+    assert stats["double"]["processed"] == 10
+    assert stats["sink"]["put"] == 5
+    assert all(st["depth"] == 0 for name, st in stats.items() if name != "source")
+
+
+def test_async_and_blocking_stages():
+    seen = []
+    lock = threading.Lock()
+
+    async def add_one(x):
+        await asyncio.sleep(0)
+        return x + 1
+
+    def slow_sink(x):
+        time.sleep(0.001)
+        with lock:
+            seen.append(x)
+
+    stats = run_staged(range(20), [
+        Stage("add", add_one),
+        Stage("sink", slow_sink, concurrency=4, blocking=True),
+    ])
+    assert sorted(seen) == list(range(1, 21))
+    assert stats["sink"]["processed"] == 20
+
+
+def test_errors_are_counted_not_fatal():
+    seen = []
+
+    def picky(x):
+        if x == 3:
+            raise ValueError("bad frame")
+        return x
+
+    stats = run_staged(range(5), [Stage("picky", picky), Stage("sink", seen.append)])
+    assert seen == [0, 1, 2, 4]
+    assert stats["picky"]["errors"] == 1
+
+
+def test_block_policy_backpressures_source():
+    # Sink holds everything until the source is exhausted; with "block" the
+    # source cannot run ahead of the bounded queues, so nothing is dropped.
+    seen = []
+
+    def sink(x):
+        time.sleep(0.0005)
+        seen.append(x)
+
+    stats = run_staged(range(200), [
+        Stage("pass", lambda x: x, maxsize=4),
+        Stage("sink", sink, maxsize=4, blocking=True),
+    ])
+    assert seen == list(range(200))
+    assert stats["pass"]["max_depth"] <= 4
+    assert stats["sink"]["max_depth"] <= 4
+    assert stats["pass"]["dropped"] == stats["sink"]["dropped"] == 0
+
+
+@pytest.mark.parametrize("policy,expected", [
+    ("drop-newest", [0, 1, 2]),
+    ("drop-oldest", [3, 4, 5]),
+])
+def test_drop_policies(policy, expected):
+    async def go():
+        q = StageQueue(maxsize=3, overflow=policy)
+        for i in range(6):
+            await q.put(i)
+        return [q._q.get_nowait() for _ in range(q.depth())], q.stats()
+
+    items, stats = asyncio.run(go())
+    assert items == expected
+    assert stats["dropped"] == 3
+    assert stats["max_depth"] == 3
+
+
+def test_slow_stage_drops_at_its_own_queue():
+    gate = threading.Event()
+    seen = []
+
+    def sink(x):
+        gate.wait(1)
+        seen.append(x)
+
+    def source():
+        for i in range(50):
+            yield i
+        gate.set()
+
+    stats = run_staged(source(), [
+        Stage("fast", lambda x: x),
+        Stage("sink", sink, maxsize=5, overflow="drop-oldest", blocking=True),
+    ])
+    assert stats["fast"]["processed"] == 50
+    assert stats["sink"]["dropped"] > 0
+    assert len(seen) + stats["sink"]["dropped"] == 50
+    assert seen[-1] == 49
+
+
+def test_stop_ends_run():
+    def endless():
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    pipe = None
+
+    def sink(x):
+        if x == 100:
+            pipe.stop()
+
+    pipe = StagedPipeline(endless(), [Stage("sink", sink)])
+    asyncio.run(pipe.run())
+    assert pipe.stats()["sink"]["processed"] >= 101
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        Stage("x", print, overflow="spill")
+    with pytest.raises(ValueError):
+        Stage("x", print, concurrency=0)
+    with pytest.raises(ValueError):
+        StagedPipeline([], [])
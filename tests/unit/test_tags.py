@@ -0,0 +1,76 @@
+import math
+import struct
+from array import array
+
+import pytest
+
+from modbus.constants import ByteOrder, WordOrder
+from modbus.frame import pack_ip
+from modbus.tags import Tag, TagMap, load_tags
+from modbus.utils import decode_ieee_float32_from_regs
+
+
+def _regs(fmt, *values):
+    raw = struct.pack(">" + fmt, *values)
+    return list(struct.unpack(f">{len(raw) // 2}H", raw))
+
+
+@pytest.mark.parametrize("bo", list(ByteOrder))
+@pytest.mark.parametrize("wo", list(WordOrder))
+def test_float32_orders_match_the_single_value_helper(bo, wo):
+    hi, lo = _regs("f", 12.5)
+    regs = [hi, lo]
+    if wo is WordOrder.LITTLE:
+        regs.reverse()
+    if bo is ByteOrder.LITTLE:
+        regs = [((r & 0xFF) << 8) | (r >> 8) for r in regs]
+    tm = TagMap([{"name": "x", "address": 10, "type": "float32", "byteorder": bo.value, "wordorder": wo.value}])
+    got = tm.decode_block(10, regs)["x"]
+    assert got == 12.5 == decode_ieee_float32_from_regs(regs[0], regs[1], bo, wo)
+
+
+def test_block_of_mixed_types_scales_and_gaps():
+    block = (_regs("H", 7) + _regs("i", -70000) + [0xFFFF] + _regs("d", math.pi)
+             + _regs("h", -5) + _regs("I", 123456)[::-1])
+    tm = TagMap([
+        {"name": "u16", "address": 100, "type": "uint16"},
+        {"name": "i32", "address": 101, "type": "int32", "scale": 0.5},
+        {"name": "f64", "address": 104, "type": "float64"},
+        {"name": "i16", "address": 108, "type": "int16", "offset": 1},
+        {"name": "u32ws", "address": 109, "type": "uint32", "wordorder": "LITTLE"},
+        {"name": "overlap", "address": 101, "type": "uint16"},
+        {"name": "outside", "address": 110, "type": "uint32"},
+    ])
+    assert tm.decode_block(100, array("H", block)) == {
+        "u16": 7, "i32": -35000.0, "f64": math.pi, "i16": -4, "u32ws": 123456, "overlap": 0xFFFE,
+    }
+    assert len(tm.plan(100, len(block)).lanes) == 3  # BIG/BIG split by the overlap, plus CDAB
+
+
+def test_array_tag_and_device_filter():
+    tm = TagMap([
+        Tag("temps", 0, "int16", count=4, scale=0.1, offset=-40),
+        Tag("speed", 4, device="10.0.0.71"),
+    ])
+    block = _regs("4hH", 400, 410, 420, 430, 1500)
+    assert tm.decode_block(0, block)["temps"] == pytest.approx([0.0, 1.0, 2.0, 3.0])
+    assert "speed" not in tm.decode_block(0, block, pack_ip("10.0.0.72"))
+    assert tm.decode_block(0, block, pack_ip("10.0.0.71"))["speed"] == 1500
+
+
+def test_decode_map_needs_every_word():
+    tm = TagMap([{"name": "f", "address": 5, "type": "float32"}, {"name": "u", "address": 9}])
+    hi, lo = _regs("f", -1.5)
+    assert tm.decode_map({5: hi, 6: lo, 7: 1}) == {"f": -1.5}
+
+
+def test_bad_tags_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        TagMap([{"name": "x", "address": 1, "type": "float16"}])
+    with pytest.raises(ValueError):
+        TagMap([{"name": "x", "address": 1}, {"name": "x", "address": 2}])
+    with pytest.raises(ValueError):
+        TagMap([{"name": "x", "address": 1, "colour": "red"}])
+    path = tmp_path / "tags.json"
+    path.write_text('[{"name": "flow", "address": 200, "type": "float32"}]')
+    assert [t.name for t in load_tags(path).tags] == ["flow"]
@@ -0,0 +1,23 @@
+import pytest
+
+from pipeline.throttle import TokenBucket
+
+MS = 1_000_000
+
+
+def test_token_bucket_burst_then_rate():
+    b = TokenBucket(rate=10, burst=3)
+    assert [b.take(0) for _ in range(3)] == [0, 0, 0]
+    wait = b.take(0)
+    assert 99 * MS < wait <= 100 * MS + 1
+    assert b.take(50 * MS) > 0                 # half a token
+    assert b.take(100 * MS) == 0
+    assert b.take(10_000 * MS) == 0 and b.tokens == 2   # refill is capped at burst
+
+
+def test_token_bucket_ignores_clock_going_backwards():
+    b = TokenBucket(rate=1)
+    assert b.take(5_000 * MS) == 0
+    assert b.take(4_000 * MS) > 0 and b.last == 5_000 * MS
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
@@ -0,0 +1,110 @@
+import struct
+import sys
+
+import pytest
+
+from capture.tshark_fields import (
+    FIELDS,
+    TsharkError,
+    TsharkFieldsSource,
+    TsharkNotFoundError,
+    parse_epoch_ns,
+    parse_fields_line,
+)
+from modbus.correlation import TransactionTable
+from modbus.frame import frame_values, ip_str
+
+
+def _adu(tid, pdu, unit=1):
+    return struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + bytes(pdu)
+
+
+def _line(ts, src, dst, sport, dport, payload, regnums="", regvals="", fc="3"):
+    row = {
+        "frame.time_epoch": ts,
+        "ip.src": src,
+        "ip.dst": dst,
+        "tcp.srcport": str(sport),
+        "tcp.dstport": str(dport),
+        "mbtcp.trans_id": "",
+        "mbtcp.unit_id": "",
+        "modbus.func_code": fc,
+        "modbus.regnum16": regnums,
+        "modbus.regval_uint16": regvals,
+        "tcp.payload": payload.hex(),
+    }
+    return "\t".join(row[name] for name in FIELDS) + "\n"
+
+
+RSP = _line("1700000000.500000000", "10.0.0.71", "10.0.0.1", 502, 40000,
+            _adu(7, [0x03, 0x04, 0x00, 0x03, 0x00, 0x2A]), "100,101", "3,42")
+
+
+def test_parse_epoch_ns_is_exact():
+    assert parse_epoch_ns("1700000000.500000001") == 1_700_000_000_500_000_001
+    assert parse_epoch_ns("1700000000.5") == 1_700_000_000_500_000_000
+    assert parse_epoch_ns("1700000000") == 1_700_000_000_000_000_000
+
+
+def test_fc3_uses_tshark_register_numbers():
+    (frame,) = parse_fields_line(RSP, TransactionTable())
+    assert (frame.fc, frame.tid, frame.unit, frame.is_response) == (3, 7, 1, True)
+    assert (ip_str(frame.src), frame.address, frame.quantity) == ("10.0.0.71", 100, 2)
+    assert frame_values(frame) == {100: 3, 101: 42}
+
+
+def test_pipelined_adus_decode_natively():
+    two = _adu(1, [0x06, 0x00, 0x64, 0x00, 0x03]) + _adu(2, [0x05, 0x01, 0xF4, 0xFF, 0x00])
+    line = _line("1.0", "10.0.0.1", "10.0.0.71", 40000, 502, two, fc="6,5")
+    frames = parse_fields_line(line, TransactionTable())
+    assert [f.fc for f in frames] == [6, 5]
+    assert [frame_values(f) for f in frames] == [{100: 3}, {500: 1}]
+
+
+def test_non_modbus_lines_are_skipped():
+    assert parse_fields_line("\t" * (len(FIELDS) - 1) + "\n", TransactionTable()) == []
+    assert parse_fields_line("garbage\n", TransactionTable()) == []
+
+
+def test_partial_adus_are_reported():
+    adu = _adu(7, [0x03, 0x04, 0x00, 0x03, 0x00, 0x2A])
+    partial = []
+    tail = _line("1.0", "10.0.0.71", "10.0.0.1", 502, 40000, adu[5:])   # tshark reassembled the rest
+    assert parse_fields_line(tail, TransactionTable(), lambda: partial.append(1)) == []
+    whole_then_cut = _line("1.0", "10.0.0.71", "10.0.0.1", 502, 40000, adu + adu[:9], "100,101", "3,42")
+    assert len(parse_fields_line(whole_then_cut, TransactionTable(), lambda: partial.append(2))) == 1
+    parse_fields_line(RSP, TransactionTable(), lambda: partial.append(3))
+    assert partial == [1, 2]
+
+
+def test_source_runs_tshark_and_parses_stdout(tmp_path):
+    fake = tmp_path / "tshark"
+    fake.write_text(f"#!{sys.executable}\nimport sys\nsys.stdout.write({RSP!r} * 3)\n")
+    fake.chmod(0o755)
+    src = TsharkFieldsSource(pcap_path="x.pcapng", tshark_path=str(fake))
+    assert "-T" in src.command() and "x.pcapng" in src.command()
+    frames = list(src.frames())
+    assert len(frames) == 3 and frame_values(frames[0]) == {100: 3, 101: 42}
+    assert src.stats() == {"lines": 3, "frames": 3, "partial": 0}
+
+
+def test_tshark_failure_raises_tsharkerror(tmp_path):
+    fake = tmp_path / "tshark"
+    fake.write_text(f"#!{sys.executable}\nimport sys\nsys.stderr.write('bad capture')\nsys.exit(2)\n")
+    fake.chmod(0o755)
+    src = TsharkFieldsSource(pcap_path="x.pcapng", tshark_path=str(fake))
+    with pytest.raises(TsharkError, match="bad capture"):
+        list(src.frames())
+
+
+def test_missing_tshark(tmp_path):
+    src = TsharkFieldsSource(pcap_path="x.pcapng", tshark_path=str(tmp_path / "nope"))
+    with pytest.raises(TsharkNotFoundError):
+        list(src.frames())
+
+
+def test_live_command_uses_capture_filter():
+    cmd = TsharkFieldsSource(iface="eth0", src="10.0.0.71").command()
+    assert cmd[cmd.index("-i") + 1] == "eth0"
+    assert cmd[cmd.index("-f") + 1] == "tcp port 502"
+    assert "ip.src == 10.0.0.71" in cmd[cmd.index("-Y") + 1]
@@ -0,0 +1,56 @@
+import pytest
+
+from modbus.bitmap import CoilBitmap
+from modbus.watchset import WatchSet, watch_range
+
+
+def test_watch_range_tokens():
+    assert watch_range("100") == 100
+    assert watch_range("0-9999") == (0, 9999)
+    assert watch_range("65535") == 65535
+    for bad in ("9-1", "-5", "a-b", "x", "65536", "0-4000000000"):
+        with pytest.raises(ValueError):
+            watch_range(bad)
+    with pytest.raises(ValueError):
+        WatchSet([(0, 4_000_000_000)])
+
+
+def test_ranges_are_merged_and_membership_matches_a_set():
+    ws = WatchSet([100, "200-210", (205, 220), 221, "5-9", 7])
+    assert ws.ranges() == [(5, 9), (100, 100), (200, 221)]
+    expected = {100} | set(range(5, 10)) | set(range(200, 222))
+    assert len(ws) == len(expected)
+    assert ws == expected
+    assert list(ws) == sorted(expected)
+    assert all((a in ws) == (a in expected) for a in range(0, 300))
+    assert -1 not in ws and 10**6 not in ws
+
+
+def test_intersect_block():
+    ws = WatchSet(["0-9", "40001-40100", 40200])
+    assert ws.intersect(0, 5) == [(0, 4)]
+    assert ws.intersect(8, 40000) == [(8, 9), (40001, 40007)]
+    assert ws.intersect(40050, 200) == [(40050, 40100), (40200, 40200)]
+    assert ws.intersect(10, 100) == []
+    assert ws.intersect(0, 0) == []
+
+
+def test_select_block_and_mapping():
+    ws = WatchSet(["102-103", 106])
+    values = list(range(10))  # registers 100..109
+    assert ws.select_block(100, values) == {102: 2, 103: 3, 106: 6}
+    assert ws.select({101: 1, 103: 3, 106: 6}) == {103: 3, 106: 6}
+
+
+def test_select_coil_bitmap_walks_only_watched_ranges():
+    ws = WatchSet(["0-9999"])
+    bm = CoilBitmap(9990, 16, bytes([0b00000101, 0xFF]))
+    picked = ws.select(bm)
+    assert sorted(picked) == list(range(9990, 10000))
+    assert picked[9990] == 1 and picked[9991] == 0 and picked[9999] == 1
+
+
+def test_union_and_empty():
+    assert not WatchSet()
+    assert WatchSet().intersect(0, 10) == []
+    assert WatchSet([1]).union(2, "3-4").ranges() == [(1, 4)]